@@ -0,0 +1,303 @@
+from array import array
+import time
+
+import uasyncio
+
+from pid import FIXED_ONE
+
+# events the control loop posts to the user interface, next to the user interface's own
+EVENT_RECIPE_DONE = 2
+EVENT_AUTOTUNE_DONE = 3
+EVENT_FAULT = 4
+
+class MotorState:
+    """
+    State shared between the control loop and the user interface.
+
+    The control loop may run in its own thread, so every field has a single writer: the user
+    interface sets target_rpm, recipe and autotune, the control loop sets the others. Assigning
+    an attribute is atomic, so no lock is needed as long as that holds. The control loop only
+    reads a recipe or tuner and posts an event when it is done, the user interface drops it.
+    """
+
+    __slots__ = (
+        "target_rpm",
+        "rpm",
+        "throttle",
+        "feedforward",
+        "shown_rpm",
+        "time_left",
+        "faults",
+        "recipe",
+        "autotune",
+    )
+
+    def __init__(self):
+        self.target_rpm = 0
+        self.rpm = 0
+        self.throttle = 0
+        self.feedforward = 0  # part of the throttle from the feed-forward table
+        self.shown_rpm = 0  # RPM at the last display update the control loop asked for
+        self.time_left = 0  # seconds left in the running recipe step, -1 while it waits
+        self.faults = 0  # latched watchdog fault bits, the throttle is cut while not 0
+        self.recipe = None  # recipe playback setting the target instead of target_rpm, if any
+        self.autotune = None  # relay experiment driving the motor instead of the PID, if any
+
+
+class ControlLoop:
+    """
+    Paces a control loop at a fixed rate and keeps statistics on how well it keeps up.
+
+    Deadlines are kept in ticks_us() and compared with ticks_diff(), so they survive the ticks
+    counter wrapping around. When a step runs past the next deadline, or the wait for it returns
+    a whole period late because another task held the CPU, the loop does not try to catch up
+    with a burst of steps, it counts an overrun and starts a new period.
+    """
+
+    def __init__(self, rate=1000, bins=20, spin_us=100):
+        """
+        Args:
+            rate: Loop rate in Hz.
+            bins: Number of bins in the period histogram. The bins evenly cover zero to twice
+                the nominal period, and the last bin also counts anything longer.
+            spin_us: How close to the deadline wait() stops yielding to other tasks and blocks
+                for the rest, so it does not return late behind a task that runs too long.
+        """
+        self.period_us = 1000000 // rate
+        self.spin_us = spin_us
+        self.dt_us = self.period_us  # measured time since the previous step
+        self.steps = 0
+        self.overruns = 0  # steps that started late because the previous one ran too long
+        self.max_period_us = 0
+        self.histogram = array("L", [0] * bins)
+        self._bin_us = max(1, 2 * self.period_us // bins)
+        self._deadline = None
+        self._last = None
+
+    @property
+    def dt(self):
+        """Measured time since the previous step, in seconds."""
+        return self.dt_us * 1e-6
+
+    def reset_stats(self):
+        self.steps = 0
+        self.overruns = 0
+        self.max_period_us = 0
+        for i in range(len(self.histogram)):
+            self.histogram[i] = 0
+
+    async def wait(self):
+        """Wait until the next step is due."""
+        now = time.ticks_us()
+        if self._deadline is None:
+            self._start(now)
+            return
+        remaining = time.ticks_diff(self._deadline, now)
+        # uasyncio sleeps in whole milliseconds, so sleep short of the deadline, or just let the
+        # other tasks run once, then keep letting them run until the deadline is close enough to
+        # block for the rest without holding up the event loop
+        await uasyncio.sleep_ms(max(remaining // 1000 - 1, 0))
+        remaining_now = time.ticks_diff(self._deadline, time.ticks_us())
+        while remaining_now > self.spin_us:
+            await uasyncio.sleep_ms(0)
+            remaining_now = time.ticks_diff(self._deadline, time.ticks_us())
+        if remaining_now > 0:
+            time.sleep_us(remaining_now)
+        self._step(remaining < 0)
+
+    def wait_sync(self):
+        """Block until the next step is due, for a loop running in its own thread."""
+        now = time.ticks_us()
+        if self._deadline is None:
+            self._start(now)
+            return
+        remaining = time.ticks_diff(self._deadline, now)
+        if remaining > 0:
+            time.sleep_us(remaining)
+        self._step(remaining < 0)
+
+    def _start(self, now):
+        self._last = now
+        self._deadline = time.ticks_add(now, self.period_us)
+
+    def _step(self, overrun):
+        # overrun: whether the previous step ran past the deadline
+        now = time.ticks_us()
+        self.dt_us = time.ticks_diff(now, self._last)
+        self._last = now
+        if overrun or time.ticks_diff(now, self._deadline) >= self.period_us:
+            self.overruns += 1
+            self._deadline = time.ticks_add(now, self.period_us)
+        else:
+            self._deadline = time.ticks_add(self._deadline, self.period_us)
+
+        self.steps += 1
+        self.max_period_us = max(self.max_period_us, self.dt_us)
+        self.histogram[min(self.dt_us // self._bin_us, len(self.histogram) - 1)] += 1
+
+
+class SpeedControl:
+    """
+    One step of the motor speed control loop, with everything it drives passed in.
+
+    Each step takes the setpoint from the running recipe or motor.target_rpm, reads the ESC
+    telemetry, checks the watchdog and sends a throttle from the relay autotune or the PID plus
+    the learned feed-forward. It owns the PID, the gain schedule, the feed-forward table, the
+    estimator and the watchdog checks, and reaches the user interface only through the MotorState
+    fields it writes, the redraw flag and the event queue.
+    """
+
+    def __init__(
+        self,
+        motor,
+        dshot,
+        pid,
+        telemetry,
+        watchdog,
+        feedforward,
+        gain_schedule,
+        events,
+        redraw,
+        estimator=None,
+        use_feedforward=True,
+        feedforward_band=0.05,
+        display_rpm_step=10,
+        autotune_rule="tyreus_luyben",
+    ):
+        """
+        Args:
+            motor: MotorState shared with the user interface.
+            dshot: Dshot driver of the ESC.
+            pid: PIDCore correcting what the feed-forward gets wrong.
+            telemetry: KissTelemetry of the ESC.
+            watchdog: Watchdog checked before every throttle is sent.
+            feedforward: FeedForward table of learned steady-state throttles.
+            gain_schedule: GainSchedule the PID gains are looked up in, autotune adds to it.
+            events: EventQueue of the user interface.
+            redraw: ThreadSafeFlag set to request a display update.
+            estimator: RpmEstimator smoothing the telemetry, or None to use it as it comes.
+            use_feedforward: Whether to add the learned feed-forward to the PID output.
+            feedforward_band: Largest error at which the PID still integrates, as a fraction of
+                the setpoint, while the feed-forward table covers it.
+            display_rpm_step: Smallest change of the RPM that requests a display update.
+            autotune_rule: Tuning rule for the gains of a finished autotune run.
+        """
+        self.motor = motor
+        self.dshot = dshot
+        self.pid = pid
+        self.telemetry = telemetry
+        self.watchdog = watchdog
+        self.feedforward = feedforward
+        self.gain_schedule = gain_schedule
+        self.events = events
+        self.redraw = redraw
+        self.estimator = estimator
+        self.use_feedforward = use_feedforward
+        self.feedforward_band = feedforward_band
+        self.display_rpm_step = display_rpm_step
+        self.autotune_rule = autotune_rule
+
+    def step(self, dt, now=None):
+        """
+        Run one step of the loop.
+
+        Args:
+            dt: Time since the previous step in seconds.
+            now: Current ticks_us(), read if not given.
+        """
+        motor = self.motor
+        rpm_pid = self.pid
+        feedforward = self.feedforward
+        telemetry = self.telemetry
+        if now is None:
+            now = time.ticks_us()
+        run = motor.recipe
+        if run is not None and not run.done and not motor.faults:
+            target_rpm = run.sample(now, motor.rpm)
+            time_left = -1 if run.waiting else (run.time_left_ms() + 999) // 1000
+            if time_left != motor.time_left:
+                motor.time_left = time_left
+                self.redraw.set()
+            if run.done:
+                # the motor goes back to motor.target_rpm, the user interface drops the recipe
+                target_rpm = motor.target_rpm
+                self.events.put(EVENT_RECIPE_DONE)
+        else:
+            target_rpm = motor.target_rpm
+        self.gain_schedule.apply(rpm_pid, target_rpm)
+
+        # the PID only corrects what the learned steady-state throttle gets wrong
+        ff = feedforward(target_rpm) if self.use_feedforward else 0
+        if ff != motor.feedforward or target_rpm != rpm_pid.setpoint:
+            rpm_pid.set_limits((-ff, 1.0 - ff))
+            if target_rpm == rpm_pid.setpoint:
+                # the table just learned this target, take the change out of the integral
+                rpm_pid.set_integral(rpm_pid.integral + motor.feedforward - ff)
+            motor.feedforward = ff
+            # starting from a learned throttle, the integral only has to trim near the target
+            if ff and feedforward.covers(target_rpm):
+                rpm_pid.integral_band = self.feedforward_band * target_rpm
+            else:
+                rpm_pid.integral_band = float("inf")
+        rpm_pid.setpoint = target_rpm
+
+        # read ESC telemetry
+        new_frame = telemetry.poll(now)
+        estimator = self.estimator
+        if estimator is not None:
+            # predict from the throttle sent last step, then correct with the new sample if any
+            estimator.predict(now, int(motor.throttle * FIXED_ONE))
+            if new_frame:
+                estimator.update(telemetry.rpm, telemetry.timestamp_us, now)
+            motor.rpm = estimator.rpm
+        elif new_frame:
+            motor.rpm = telemetry.rpm
+        if abs(motor.rpm - motor.shown_rpm) >= self.display_rpm_step:
+            motor.shown_rpm = motor.rpm
+            self.redraw.set()
+
+        # checked before anything else can set a throttle, a fault cuts it in this step
+        faults = self.watchdog.check(now, telemetry, target_rpm, motor.rpm, motor.throttle)
+        if faults != motor.faults:
+            if faults & ~motor.faults:
+                # the throttle stays cut until the user interface clears the fault, and the
+                # user interface drops whatever was driving the motor
+                rpm_pid.reset()
+                self.events.put(EVENT_FAULT)
+            motor.faults = faults
+        if faults:
+            self._send(0)
+            return
+
+        tuner = motor.autotune
+        if tuner is not None:
+            if tuner.done or tuner.failed:
+                # the motor stays off until the user interface drops the tuner
+                throttle = 0
+            else:
+                throttle = tuner.update(motor.rpm, now)
+                if tuner.done or tuner.failed:
+                    self._finish_autotune(tuner)
+                    throttle = 0
+            self._send(throttle)
+            return
+
+        # update on every step, not only when a telemetry frame arrived
+        throttle = ff + rpm_pid.update(motor.rpm, dt)
+        if target_rpm == 0 and motor.rpm < 1000:
+            throttle = 0
+            rpm_pid.reset()
+        else:
+            feedforward.observe(target_rpm, motor.rpm, throttle)
+        self._send(throttle)
+
+    def _send(self, throttle):
+        self.motor.throttle = throttle
+        self.dshot.set_throttle(throttle, telemetry=self.telemetry.request())
+
+    def _finish_autotune(self, tuner):
+        if tuner.done:
+            # picked up by the next step, which looks the gains up again
+            self.gain_schedule.insert(tuner.setpoint, *tuner.gains(self.autotune_rule))
+        self.pid.reset()
+        self.events.put(EVENT_AUTOTUNE_DONE)
@@ -1,27 +1,223 @@
 import time
 
-from esp32 import RMT
+try:
+    from esp32 import RMT
+except ImportError:  # not on an ESP32, e.g. when testing timings on a host
+    RMT = None
+
+DSHOT_RATES = (150, 300, 600, 1200)  # supported speeds, in kbit/s
+
+_APB_CLOCK_HZ = 80000000  # RMT source clock
+_MAX_CLOCK_DIV = 255
+_MAX_PULSES = 32767  # RMT durations are 15 bits
+_MIN_BIT_PULSES = 64  # aim for at least this many pulses per bit
+_MIN_RESOLVED_PULSES = 20  # fewest pulses per bit, keeps T1H and T0H within 2.5% of the bit
+_T1H = 0.75  # high time of an ON bit, as a fraction of the bit duration
+_T0H = 0.375  # high time of an OFF bit, as a fraction of the bit duration
+_PAUSE_NS = 2000  # pause after sending packet
+
+# 5-bit GCR code to 4-bit nibble, 0xFF for codes that are not valid GCR
+_GCR_DECODE = bytes(
+    (
+        0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+        0xFF, 0x09, 0x0A, 0x0B, 0xFF, 0x0D, 0x0E, 0x0F,
+        0xFF, 0xFF, 0x02, 0x03, 0xFF, 0x05, 0x06, 0x07,
+        0xFF, 0x00, 0x08, 0x01, 0xFF, 0x04, 0x0C, 0xFF,
+    )
+)
+
+
+def dshot_timings(rate, period_us=None):
+    """
+    Derive RMT clock divider and pulse counts for a DShot speed.
+
+    The clock divider is the largest one that still gives at least _MIN_BIT_PULSES pulses per
+    bit, which works out to 1 for DShot1200 up to 8 for DShot150. If a period is given, the
+    pause is stretched so a looped packet repeats every period_us, and the clock divider is
+    raised if needed to fit that pause in a single RMT duration. A period so long that a bit is
+    left with fewer than _MIN_RESOLVED_PULSES pulses is rejected rather than sent coarsely.
+
+    Args:
+        rate: DShot speed in kbit/s, one of DSHOT_RATES.
+        period_us: Packet repetition period in microseconds, or None for a minimal pause.
+
+    Returns:
+        Tuple of (clock_div, on_pulses, off_pulses, bit_pulses, pause_pulses).
+    """
+    if rate not in DSHOT_RATES:
+        raise ValueError("unsupported DShot rate {}, must be one of {}".format(rate, DSHOT_RATES))
+
+    clock_div = max(1, _APB_CLOCK_HZ // (1000 * rate * _MIN_BIT_PULSES))
+    if period_us is not None:
+        period_clocks = period_us * (_APB_CLOCK_HZ // 1000000)
+        clock_div = max(clock_div, -(-period_clocks // _MAX_PULSES))  # rounded up
+    pulse_hz = _APB_CLOCK_HZ // clock_div
+    bit_pulses = (2 * pulse_hz + 1000 * rate) // (2000 * rate)  # rounded
+    on_pulses = int(_T1H * bit_pulses + 0.5)
+    off_pulses = int(_T0H * bit_pulses + 0.5)
+    pause_pulses = (pulse_hz // 1000 * _PAUSE_NS + 500000) // 1000000
+    if period_us is not None:
+        min_pause_pulses = pause_pulses
+        pause_pulses = pulse_hz // 1000 * period_us // 1000 - 16 * bit_pulses
+        if pause_pulses < min_pause_pulses:
+            raise ValueError("period of {} us is too short for DShot{}".format(period_us, rate))
+
+    if clock_div > _MAX_CLOCK_DIV:
+        raise ValueError("clock divider {} exceeds RMT limit".format(clock_div))
+    if bit_pulses < _MIN_RESOLVED_PULSES:
+        raise ValueError(
+            "period of {} us is too long for DShot{}, it leaves {} pulses per bit".format(
+                period_us, rate, bit_pulses
+            )
+        )
+    if bit_pulses - off_pulses + pause_pulses > _MAX_PULSES:
+        raise ValueError("pause of {} pulses exceeds RMT limit".format(pause_pulses))
+
+    return clock_div, on_pulses, off_pulses, bit_pulses, pause_pulses
+
+
+def _nibble_pulses(on_pulses, off_pulses, bit_pulses):
+    """
+    Precompute the pulse durations for every 4-bit nibble.
+
+    Returns a tuple of 16 tuples, each holding the 8 high/low durations that encode the nibble,
+    most significant bit first.
+    """
+    table = []
+    for nibble in range(16):
+        pulses = []
+        for i in (3, 2, 1, 0):
+            high = on_pulses if (nibble >> i) & 1 else off_pulses
+            pulses += [high, bit_pulses - high]
+        table.append(tuple(pulses))
+    return tuple(table)
+
+
+def decode_erpm(durations, bit_pulses):
+    """
+    Decode a bidirectional DShot eRPM reply.
+
+    The ESC replies with 21 bits at 5/4 of the DShot rate: a start bit followed by 20 bits of
+    GCR, where each 1 is a level transition. Decoding the GCR gives 16 bits of eeem mmmm mmmm
+    cccc: the period in microseconds as mantissa m shifted left by exponent e, and an inverted
+    4-bit CRC.
+
+    Args:
+        durations: Captured durations of the alternating levels of the reply, starting with the
+            low level of the start bit.
+        bit_pulses: Duration of one reply bit, in the same unit as durations.
+
+    Returns:
+        eRPM, or None if the reply is malformed or fails the CRC check.
+    """
+    value = 0
+    bits = 0
+    for duration in durations:
+        length = (2 * duration + bit_pulses) // (2 * bit_pulses)  # rounded to whole bits
+        if length < 1:
+            return None
+        if bits + length > 21:
+            break
+        value = (value << length) | (1 << (length - 1))
+        bits += length
+    if bits < 21:
+        # the last level is high, so its end merges with the idle line
+        length = 21 - bits
+        value = (value << length) | (1 << (length - 1))
+
+    # drop the start bit and decode each 5-bit group into a nibble
+    packet = 0
+    for shift in (15, 10, 5, 0):
+        nibble = _GCR_DECODE[(value >> shift) & 0x1F]
+        if nibble == 0xFF:
+            return None
+        packet = (packet << 4) | nibble
+
+    crc = packet ^ (packet >> 4) ^ (packet >> 8) ^ (packet >> 12)
+    if crc & 0x0F != 0x0F:
+        return None
+
+    value = packet >> 4
+    if value == 0x0FFF:
+        return 0  # motor stopped
+    period_us = (value & 0x01FF) << (value >> 9)
+    if period_us == 0:
+        return None
+    return (60000000 + period_us // 2) // period_us
 
 
 class Dshot:
-    def __init__(self, pin):
+    def __init__(
+        self,
+        pin,
+        rate=150,
+        hold=False,
+        hold_period_us=1000,
+        rmt=None,
+        bidirectional=False,
+        receiver=None,
+    ):
+        """
+        Args:
+            pin: Pin connected to the ESC signal wire.
+            rate: DShot speed in kbit/s, one of DSHOT_RATES.
+            hold: Whether to let the RMT hardware repeat the last packet in a loop, so the
+                packet is only rewritten when the throttle value changes.
+            hold_period_us: Repetition period of the looped packet in hold mode.
+            rmt: RMT channel to use instead of creating one, e.g. a fake that records writes.
+            bidirectional: Whether to use bidirectional DShot. The signal is inverted and the CRC
+                complemented, which tells the ESC to reply to every packet with its eRPM.
+            receiver: Captures the ESC reply for read_erpm(). Must have a read_pulses() method
+                that returns the durations of the reply levels in RMT pulses, or None if no
+                reply was captured. The esp32 RMT driver in MicroPython can only transmit, so
+                this has to come from elsewhere.
+        """
         # https://brushlesswhoop.com/dshot-and-bidirectional-dshot/
         # clock freq = 80  # Mhz
-        # clock divider = 7
-        # pulse time = 1 / (80 / 7) = 0.0875 us
-        # bit duration = 3.33 us
-        # T1H = 2.50 us
-        # T0H = 1.25 us
-        self._ON_PULSES = 57  # number of pulses for an ON bit
-        self._OFF_PULSES = 29  # number of pulses for an OFF bit
-        self._BIT_PULSES = 76  # total number of pulses per bit
-        self._PAUSE_PULSES = 21  # pause after sending packet
-
-        self.rmt = RMT(0, pin=pin, clock_div=7)
+        # pulse time = clock_div / 80 us
+        # bit duration = 1000 / rate us
+        # T1H = 0.75 * bit duration
+        # T0H = 0.375 * bit duration
+        (
+            clock_div,
+            self._ON_PULSES,  # number of pulses for an ON bit
+            self._OFF_PULSES,  # number of pulses for an OFF bit
+            self._BIT_PULSES,  # total number of pulses per bit
+            self._PAUSE_PULSES,  # pause after sending packet
+        ) = dshot_timings(rate, hold_period_us if hold else None)
+        self.rate = rate
+        self.frame_us = 16 * self._BIT_PULSES * clock_div // 80  # wire time per packet
+
+        # encode packets into a reusable pulse buffer using a per-nibble lookup table, so sending
+        # a packet does not allocate
+        self._nibbles = _nibble_pulses(self._ON_PULSES, self._OFF_PULSES, self._BIT_PULSES)
+        self._duration = [0] * 32
+        self._last_packet = None
+
+        self.bidirectional = bidirectional
+        self.receiver = receiver
+        self._reply_bit_pulses = 4 * self._BIT_PULSES // 5  # reply is sent at 5/4 the rate
+        self.erpm_errors = 0  # replies that could not be decoded
+
+        self.hold = hold
+        self._looping = False
+        self.frames_written = 0  # packets written to the RMT
+        self.frames_held = 0  # packets left to the RMT loop instead of being rewritten
+
+        if rmt is None:
+            # bidirectional DShot idles high and sends inverted bits
+            rmt = RMT(0, pin=pin, clock_div=clock_div, idle_level=bidirectional)
+        self.rmt = rmt
 
         self._arm()
         self._enable_telemetry()
 
+        if hold:
+            # commands above must not repeat, so only start looping once the ESC is set up
+            self.rmt.loop(True)
+            self._looping = True
+            self._last_packet = None  # force the next packet to be written
+
     def _arm(self, duration=2):
         """
         Send arming sequence.
@@ -80,17 +276,26 @@ class Dshot:
     def set_throttle(self, value: float, telemetry=True):
         """
         Set throttle to a value between 0 and 1.
+
+        Args:
+            value: Throttle between 0 and 1.
+            telemetry: Whether to request a telemetry frame from the ESC. In hold mode the
+                request repeats with the looped packet, and changing it rewrites the packet,
+                so keep it constant, see KissTelemetry's scheduled argument.
         """
         value = self._encode_throttle(value)
-        value = self._create_packet(value)
+        value = self._create_packet(value, telemetry)
         self._send(value)
 
     def _create_packet(self, value, telemetry=True):
         # add telemetry bit
         value = (value << 1) | telemetry
 
-        # add CRC (Cyclic Redundancy Check)
-        crc = (value ^ (value >> 4) ^ (value >> 8)) & 0x0F
+        # add CRC (Cyclic Redundancy Check), inverted for bidirectional DShot
+        crc = value ^ (value >> 4) ^ (value >> 8)
+        if self.bidirectional:
+            crc = ~crc
+        crc &= 0x0F
         value = (value << 4) | crc
 
         return value
@@ -99,15 +304,40 @@ class Dshot:
         """
         Send value to ESC.
         """
-        duration = []
+        if value != self._last_packet:
+            self._encode_pulses(value)
+        elif self._looping:
+            # the RMT is already repeating this packet
+            self.frames_held += 1
+            return
+        self.rmt.write_pulses(self._duration, not self.bidirectional)
+        self.frames_written += 1
 
-        for i in reversed(range(16)):
-            bit = (value & (2**i)) == 2**i  # select bit
-            if bit == 1:
-                duration += [self._ON_PULSES, self._BIT_PULSES - self._ON_PULSES]
-            else:
-                duration += [self._OFF_PULSES, self._BIT_PULSES - self._OFF_PULSES]
+    def read_erpm(self):
+        """
+        Read the eRPM the ESC replied with after the last packet in bidirectional mode.
 
-        duration[-1] += self._PAUSE_PULSES
+        Returns:
+            eRPM, or None if no valid reply was captured.
+        """
+        durations = self.receiver.read_pulses()
+        if durations is None:
+            return None
+        erpm = decode_erpm(durations, self._reply_bit_pulses)
+        if erpm is None:
+            self.erpm_errors += 1
+        return erpm
 
-        self.rmt.write_pulses(duration, True)
+    def _encode_pulses(self, value):
+        """
+        Encode a 16-bit packet into the pulse buffer, most significant bit first.
+        """
+        duration = self._duration
+        nibbles = self._nibbles
+        for n in range(4):
+            pulses = nibbles[(value >> (12 - 4 * n)) & 0x0F]
+            offset = 8 * n
+            for i in range(8):
+                duration[offset + i] = pulses[i]
+        duration[-1] += self._PAUSE_PULSES
+        self._last_packet = value
@@ -0,0 +1,113 @@
+import time
+
+_SHIFT = 4  # fractional bits of the RPM state
+_GAIN_SHIFT = 8  # fractional bits of alpha and beta
+_MAX_DT_US = 100000  # longest step the state is extrapolated over at once
+
+
+def _div(n, d):
+    # integer division rounding towards zero, so rounding does not make the estimate drift
+    return n // d if n >= 0 else -(-n // d)
+
+
+class RpmEstimator:
+    """
+    Alpha-beta estimate of RPM and RPM rate between telemetry samples.
+
+    predict() moves the estimate forward to the current time on every control step, and
+    update() corrects it with a telemetry sample. A sample is compared with the estimate at the
+    time the ESC took it rather than when it arrived, so transport latency does not show up as
+    lag. Optionally a first-order motor model driven by the commanded throttle predicts the
+    acceleration, and beta only has to learn what the model gets wrong.
+
+    The state is kept in scaled integers and the throttle is taken in pid.FIXED_ONE units, so
+    with integer inputs neither call allocates.
+    """
+
+    def __init__(self, alpha=0.3, beta=0.02, gain=0, tau_ms=100):
+        """
+        Args:
+            alpha: Fraction of the residual applied to the RPM, between 0 and 1.
+            beta: Fraction of the residual per sample interval applied to the RPM rate.
+            gain: Steady-state RPM at full throttle for the motor model, 0 to leave the model
+                out and extrapolate the rate alone.
+            tau_ms: Time constant of the motor model in milliseconds.
+        """
+        self._alpha = int(alpha * (1 << _GAIN_SHIFT))
+        self._beta = int(beta * (1 << _GAIN_SHIFT))
+        self._gain = int(gain)
+        self._tau_ms = max(1, int(tau_ms))
+        self._x = 0  # RPM << _SHIFT
+        self._v = 0  # RPM per ms << _SHIFT, the full rate without a model, else its correction
+        self._rate = 0  # RPM per ms << _SHIFT, at the last prediction
+        self._last_us = None
+        self._sample_us = None
+        self.updates = 0
+
+    @property
+    def rpm(self):
+        return self._x >> _SHIFT
+
+    @property
+    def rate(self):
+        """RPM rate in RPM per second."""
+        return (self._rate * 1000) >> _SHIFT
+
+    def reset(self, rpm=0):
+        self._x = rpm << _SHIFT
+        self._v = 0
+        self._rate = 0
+        self._last_us = None
+        self._sample_us = None
+        self.updates = 0
+
+    def predict(self, now, throttle=0):
+        """
+        Move the estimate forward to now.
+
+        Args:
+            now: Current ticks_us().
+            throttle: Commanded throttle in pid.FIXED_ONE units, for the motor model.
+
+        Returns:
+            The estimated RPM.
+        """
+        rate = self._v
+        if self._gain:
+            # first-order response towards the steady-state RPM of the throttle
+            target = (self._gain * (throttle >> 6)) >> (10 - _SHIFT)
+            rate += _div(target - self._x, self._tau_ms)
+        self._rate = rate
+        if self._last_us is not None:
+            dt = min(max(time.ticks_diff(now, self._last_us), 0), _MAX_DT_US)
+            self._x += _div(rate * dt, 1000)
+            if self._x < 0:
+                self._x = 0
+        self._last_us = now
+        return self._x >> _SHIFT
+
+    def update(self, rpm, timestamp, now):
+        """
+        Correct the estimate with a telemetry sample.
+
+        Args:
+            rpm: Measured RPM.
+            timestamp: ticks_us() at which the ESC took the sample.
+            now: Current ticks_us(), which the estimate has been predicted up to.
+        """
+        age = min(max(time.ticks_diff(now, timestamp), 0), _MAX_DT_US)
+        if self._sample_us is None:
+            interval = 0
+        else:
+            interval = min(max(time.ticks_diff(timestamp, self._sample_us), 0), _MAX_DT_US)
+        self._sample_us = timestamp
+        self.updates += 1
+
+        if self.updates == 1:
+            self._x = rpm << _SHIFT
+            return
+        # residual against the estimate at the time of the sample
+        residual = (rpm << _SHIFT) - (self._x - _div(self._rate * age, 1000))
+        self._x += _div(self._alpha * residual, 1 << _GAIN_SHIFT)
+        if interval:
+            self._v += _div(_div(self._beta * residual, 1 << _GAIN_SHIFT) * 1000, interval)
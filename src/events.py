@@ -0,0 +1,67 @@
+from array import array
+import time
+
+import uasyncio
+from machine import disable_irq, enable_irq
+
+
+class EventQueue:
+    """
+    Fixed-size queue handing event codes from interrupt handlers to a uasyncio task.
+
+    put() only writes to preallocated storage and sets a ThreadSafeFlag, so it is safe to call
+    from IRQ and timer callbacks. It can have several producers, e.g. an IRQ and the control
+    thread, so the slot update runs with interrupts disabled, which also keeps the other thread
+    out. Events are timestamped when they are queued, so the time from interrupt to handled event
+    can be measured.
+    """
+
+    def __init__(self, size=16):
+        """
+        Args:
+            size: Number of slots. One slot is kept free, so size - 1 events can be pending.
+        """
+        self._size = size
+        self._codes = bytearray(size)
+        self._times = array("L", [0] * size)
+        self._head = 0  # next slot to write
+        self._tail = 0  # next slot to read
+        self._flag = uasyncio.ThreadSafeFlag()
+        self._event_us = 0
+        self.dropped = 0  # events lost because the queue was full
+        self.latency_us = 0  # time from put() to handled() for the latest event
+        self.max_latency_us = 0
+
+    def put(self, code):
+        """Queue an event code between 0 and 255. Safe to call from an interrupt handler."""
+        irq = disable_irq()
+        head = self._head
+        next_head = (head + 1) % self._size
+        if next_head == self._tail:
+            self.dropped += 1
+            enable_irq(irq)
+            return
+        self._codes[head] = code
+        self._times[head] = time.ticks_us()
+        self._head = next_head
+        enable_irq(irq)
+        self._flag.set()
+
+    async def get(self):
+        """Wait for the next event and return its code."""
+        while self._tail == self._head:
+            await self._flag.wait()
+        tail = self._tail
+        code = self._codes[tail]
+        self._event_us = self._times[tail]
+        self._tail = (tail + 1) % self._size
+        return code
+
+    def age_us(self):
+        """Time since the event last returned by get() was queued."""
+        return time.ticks_diff(time.ticks_us(), self._event_us)
+
+    def handled(self):
+        """Record that the event last returned by get() has been handled."""
+        self.latency_us = self.age_us()
+        self.max_latency_us = max(self.max_latency_us, self.latency_us)
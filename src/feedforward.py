@@ -0,0 +1,186 @@
+from array import array
+
+
+class FeedForward:
+    """
+    Steady-state throttle by RPM, learned while the motor runs.
+
+    The table is a pair of sorted arrays, RPM and throttle, interpolated linearly. Below the
+    first point the throttle is interpolated towards zero, above the last point it is scaled up
+    in proportion. Points are learned from telemetry: once the RPM has stayed within a tolerance
+    of an unchanged target for a number of samples, the average throttle over those samples is
+    blended into the point for that target, or inserted as a new point.
+    """
+
+    def __init__(self, size=16, tolerance=0.03, samples=500, merge=0.02, blend=0.5):
+        """
+        Args:
+            size: Maximum number of points.
+            tolerance: How close the RPM has to stay to the target to count as steady, as a
+                fraction of the target.
+            samples: Number of steady samples to average into one observation.
+            merge: Observations within this fraction of an existing point's RPM update that
+                point instead of adding a new one.
+            blend: Weight of a new observation when it updates an existing point.
+        """
+        self.size = size
+        self.tolerance = tolerance
+        self.samples = samples
+        self.merge = merge
+        self.blend = blend
+        self.rpm = array("I", [0] * size)
+        self.throttle = array("f", [0] * size)
+        self.points = 0
+        self.version = 0  # bumped whenever the table changes
+        self._saved_version = 0  # version last loaded or saved
+
+        self._target = 0
+        self._count = 0
+        self._sum = 0.0
+        self._rpm_sum = 0
+        self._cached_rpm = -1
+        self._cached_version = -1
+        self._cached = 0.0
+
+    def __call__(self, rpm):
+        """The learned steady-state throttle for rpm, 0 while the table is empty."""
+        if rpm == self._cached_rpm and self.version == self._cached_version:
+            return self._cached
+        self._cached_rpm = rpm
+        self._cached_version = self.version
+        self._cached = self._lookup(rpm)
+        return self._cached
+
+    @property
+    def dirty(self):
+        """
+        Whether the table changed since it was last loaded or saved.
+
+        The control loop bumps version and save() only records it, so each has one writer.
+        """
+        return self.version != self._saved_version
+
+    def covers(self, rpm):
+        """Whether rpm is interpolated between learned points rather than extrapolated."""
+        points = self.points
+        if not points:
+            return False
+        return (1 - self.merge) * self.rpm[0] <= rpm <= (1 + self.merge) * self.rpm[points - 1]
+
+    def observe(self, target_rpm, rpm, throttle):
+        """
+        Feed one control step, learning a point once the RPM is steady at the target.
+
+        Args:
+            target_rpm: Target RPM of the step.
+            rpm: Measured RPM.
+            throttle: Throttle applied, between 0 and 1.
+        """
+        if target_rpm != self._target or target_rpm <= 0:
+            self._target = target_rpm
+            self._restart()
+            return
+        if abs(rpm - target_rpm) > self.tolerance * target_rpm:
+            self._restart()
+            return
+        self._count += 1
+        self._sum += throttle
+        self._rpm_sum += rpm
+        if self._count >= self.samples:
+            # scale for what is left of the error, throttle is about proportional to RPM
+            if self._rpm_sum > 0:
+                self.learn(target_rpm, self._sum * target_rpm / self._rpm_sum)
+            self._restart()
+
+    def learn(self, rpm, throttle):
+        """Blend a steady-state observation into the table."""
+        rpm = round(rpm)  # a ramp may leave a float target, the RPM array holds integers
+        i = self._search(rpm)
+        # the nearest existing point, if it is close enough to update
+        nearest = -1
+        for j in (i - 1, i):
+            if 0 <= j < self.points and abs(self.rpm[j] - rpm) <= self.merge * rpm:
+                if nearest < 0 or abs(self.rpm[j] - rpm) < abs(self.rpm[nearest] - rpm):
+                    nearest = j
+        if nearest >= 0:
+            self.throttle[nearest] += self.blend * (throttle - self.throttle[nearest])
+        else:
+            if self.points == self.size:
+                # make room by dropping the point closest to its neighbour
+                self._remove(self._most_crowded())
+                i = self._search(rpm)
+            for j in range(self.points, i, -1):
+                self.rpm[j] = self.rpm[j - 1]
+                self.throttle[j] = self.throttle[j - 1]
+            self.rpm[i] = rpm
+            self.throttle[i] = throttle
+            self.points += 1
+        self.version += 1
+
+    def load(self, path):
+        """Load the table saved by save(), keeping it empty if there is no such file."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        points = min(len(data) // 8, self.size)
+        rpm = array("I", data[: 4 * points])
+        throttle = array("f", data[4 * points : 8 * points])
+        for i in range(points):
+            self.rpm[i] = rpm[i]
+            self.throttle[i] = throttle[i]
+        self.points = points
+        self.version += 1
+        self._saved_version = self.version
+
+    def save(self, path):
+        """Save the table as the used part of the RPM array followed by the throttle array."""
+        version = self.version
+        points = self.points
+        with open(path, "wb") as f:
+            f.write(memoryview(self.rpm)[:points])
+            f.write(memoryview(self.throttle)[:points])
+        self._saved_version = version
+
+    def _restart(self):
+        self._count = 0
+        self._sum = 0.0
+        self._rpm_sum = 0
+
+    def _search(self, rpm):
+        # index of the first point at or above rpm
+        lo, hi = 0, self.points
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self.rpm[mid] < rpm:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _lookup(self, rpm):
+        points = self.points
+        if not points or rpm <= 0:
+            return 0.0
+        i = self._search(rpm)
+        if i == 0:
+            return self.throttle[0] * rpm / self.rpm[0]
+        if i == points:
+            return min(self.throttle[points - 1] * rpm / self.rpm[points - 1], 1.0)
+        r0 = self.rpm[i - 1]
+        t0 = self.throttle[i - 1]
+        return t0 + (self.throttle[i] - t0) * (rpm - r0) / (self.rpm[i] - r0)
+
+    def _most_crowded(self):
+        best = 1
+        for i in range(2, self.points):
+            if self.rpm[i] - self.rpm[i - 1] < self.rpm[best] - self.rpm[best - 1]:
+                best = i
+        return best
+
+    def _remove(self, i):
+        self.points -= 1
+        for j in range(i, self.points):
+            self.rpm[j] = self.rpm[j + 1]
+            self.throttle[j] = self.throttle[j + 1]
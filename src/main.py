@@ -1,11 +1,29 @@
-from machine import Pin, I2C, Timer, UART
+from machine import Pin, I2C, UART
 import uasyncio
 import json
+import time
+import _thread
 
 import ssd1306
 from rotary_irq_esp import RotaryIRQ
 from dshot import Dshot
-from pid import PID
+from pid import PIDCore, GainSchedule, RelayAutotune
+from control import (
+    ControlLoop,
+    MotorState,
+    SpeedControl,
+    EVENT_RECIPE_DONE,
+    EVENT_AUTOTUNE_DONE,
+    EVENT_FAULT,
+)
+from feedforward import FeedForward
+from estimator import RpmEstimator
+from recipe import compile_recipe, RecipePlayer
+from telemetry import KissTelemetry
+from watchdog import Watchdog, FAULT_NAMES
+from view import View
+from numfield import NumberField
+from events import EventQueue
 
 
 def splash():
@@ -27,229 +45,464 @@ def splash():
     display.show()
 
 
-def start_view(state, rotary):
-    display.text("SPIN", 34, 4, 1)
-    display.text("COATER", 50, 14, 1)
+def draw_start(fb):
+    fb.text("SPIN", 34, 4, 1)
+    fb.text("COATER", 50, 14, 1)
+    fb.text("Edit", 28, 34, 1)
+    fb.text("Start", 28, 44, 1)
+    fb.text("Tune", 28, 54, 1)
+
+
+def draw_start_cursor(fb, state, rotary):
+    fb.fill_rect(12, 34, 8, 28, 0)
+    fb.text(">", 12, 34 + 10 * rotary.value(), 1)
 
-    before = "> " if rotary.value() == 0 else "  "
-    display.text(before + "Edit", 12, 36, 1)
-    before = "> " if rotary.value() == 1 else "  "
-    display.text(before + "Start", 12, 46, 1)
 
+def draw_edit_menu(fb):
+    fb.text("Deposit speed:", 0, 0, 1)
+    fb.text("RPM", 104, 10, 1)
+    fb.text("Coating speed:", 0, 21, 1)
+    fb.text("RPM", 104, 31, 1)
+    fb.text("Coating time:", 0, 42, 1)
+    fb.text("sec", 104, 52, 1)
 
-def draw_edit_menu(state, rotary):
-    display.text("Deposit speed:", 0, 0, 1)
-    display.text("{: >{w}} RPM".format(config["deposit_rpm"], w=5), 56, 10, 1)
-    display.text("Coating speed:", 0, 21, 1)
-    display.text("{: >{w}} RPM".format(config["coating_rpm"], w=5), 56, 31, 1)
-    display.text("Coating time:", 0, 42, 1)
-    display.text("{: >{w}} sec".format(config["coating_time"], w=5), 56, 52, 1)
 
+def draw_edit_values(fb, cursor_y):
+    for y in (10, 32, 54):
+        fb.fill_rect(40, y, 8, 8, 0)
+    deposit_rpm_field.draw(fb, config["deposit_rpm"])
+    coating_rpm_field.draw(fb, config["coating_rpm"])
+    coating_time_field.draw(fb, config["coating_time"])
+    fb.text(">", 40, cursor_y, 1)
 
-def edit_deposit_view(state, rotary):
+
+def edit_deposit(fb, state, rotary):
     config["deposit_rpm"] = rotary.value() * 100
-    draw_edit_menu(state, rotary)
-    display.text(">", 40, 10, 1)
+    draw_edit_values(fb, 10)
 
 
-def edit_coating_rpm_view(state, rotary):
+def edit_coating_rpm(fb, state, rotary):
     config["coating_rpm"] = rotary.value() * 100
-    draw_edit_menu(state, rotary)
-    display.text(">", 40, 32, 1)
+    draw_edit_values(fb, 32)
 
 
-def edit_coating_time_view(state, rotary):
+def edit_coating_time(fb, state, rotary):
     config["coating_time"] = rotary.value()
-    draw_edit_menu(state, rotary)
-    display.text(">", 40, 54, 1)
+    draw_edit_values(fb, 54)
+
+
+def draw_recipe(fb):
+    fb.text("RPM:", 0, 24, 1)
+
+
+def recipe_status(fb, state, rotary):
+    player = state["recipe"]
+    name = player.recipe.names[player.step]
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text(name, (128 - 8 * len(name)) // 2, 3, 0)
+    rpm_field.draw(fb, motor.rpm)
+    fb.fill_rect(0, 40, 128, 24, 0)
+    if motor.time_left < 0:
+        fb.text("Press to", 32, 42, 1)
+        fb.text("continue", 32, 52, 1)
+    else:
+        timer_field.draw(fb, motor.time_left)
+        fb.text("sec", 70, 48, 1)
+
+
+def draw_recipe_result(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Done", 48, 3, 0)
+    fb.text("Press to", 32, 46, 1)
+    fb.text("continue", 32, 56, 1)
+
+
+def draw_recipe_error(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Bad recipe", 24, 3, 0)
+    fb.text("Press to", 32, 46, 1)
+    fb.text("continue", 32, 56, 1)
+
+
+def run_result(fb, state, rotary):
+    # redrawn on every update, the lines were formatted when the run finished
+    fb.fill_rect(0, 16, 128, 28, 0)
+    for i, line in enumerate(state["result"]):
+        fb.text(line, (128 - 8 * len(line)) // 2, 16 + 10 * i, 1)
+
+
+def draw_autotune(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Autotune", 32, 3, 0)
+    fb.text("RPM:", 0, 24, 1)
+    fb.text("Cycle", 0, 44, 1)
+    fb.text("Press to abort", 8, 56, 1)
+
+
+def autotune_status(fb, state, rotary):
+    rpm_field.draw(fb, motor.rpm)
+    cycle_field.draw(fb, state["autotune"].cycle)
 
 
-def draw_rpm(rpm):
-    display.text("RPM:{: >{w}.0f}".format(rpm, w=5), 30, 27, 1)
+def draw_autotune_result(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Autotune", 32, 3, 0)
+    fb.text("Press to", 32, 46, 1)
+    fb.text("continue", 32, 56, 1)
 
 
-def deposit_view(state, rotary):
-    display.fill_rect(0, 0, 127, 14, 1)
-    display.text("Deposit", 36, 3, 0)
-    draw_rpm(state["rpm"])
-    display.text("Press to", 32, 42, 1)
-    display.text("continue", 32, 52, 1)
+def draw_fault(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Fault", 44, 3, 0)
+    fb.text("Press to clear", 8, 56, 1)
 
 
-def coating_view(state, rotary):
-    display.fill_rect(0, 0, 127, 14, 1)
-    display.text("Coating", 36, 3, 0)
-    draw_rpm(state["rpm"])
-    display.text("{: >{w}} sec".format(state["timer"], w=4), 30, 48, 1)
+def fault_status(fb, state, rotary):
+    fb.fill_rect(0, 16, 128, 32, 0)
+    y = 16
+    for fault, name in FAULT_NAMES:
+        if motor.faults & fault:
+            fb.text(name, 0, y, 1)
+            y += 8
 
 
-def decode_ESC_telemetry(data, motor_poles=14):
-    if len(data) > 10:
-        # use latest telemetry
-        data = data[-10:]
+deposit_rpm_field = NumberField(56, 10, 5)
+coating_rpm_field = NumberField(56, 31, 5)
+coating_time_field = NumberField(56, 52, 5)
+rpm_field = NumberField(40, 20, 5, scale=2)
+timer_field = NumberField(30, 48, 4)
+cycle_field = NumberField(48, 44, 2)
 
-    temperature = int(data[0])  # degrees Celsius
-    voltage = int((data[1] << 8) | data[2]) * 0.01  # Volt
-    current = (
-        int((data[3] << 8) | data[4]) * 0.01
-    )  # Amps, only available if the ESC has a current meter
-    consumption = int(
-        (data[5] << 8) | data[6]
-    )  # mAh, only available if the ESC has a current meter
-    erpm = int((data[7] << 8) | data[8]) * 100
-    rpm = erpm / (motor_poles / 2)
-    crc = data[9]
+start_view = View(draw_start, draw_start_cursor)
+edit_deposit_view = View(draw_edit_menu, edit_deposit)
+edit_coating_rpm_view = View(draw_edit_menu, edit_coating_rpm)
+edit_coating_time_view = View(draw_edit_menu, edit_coating_time)
+recipe_view = View(draw_recipe, recipe_status)
+recipe_result_view = View(draw_recipe_result, run_result)
+recipe_error_view = View(draw_recipe_error, run_result)
+autotune_view = View(draw_autotune, autotune_status)
+autotune_result_view = View(draw_autotune_result, run_result)
+fault_view = View(draw_fault, fault_status)
 
-    # print("         Temp (C):", temperature)
-    # print("      Voltage (V):", voltage)
-    # print("      Current (A):", current)
-    # print("Consumption (mAh):", consumption)
-    # print("             Erpm:", erpm)
-    # print("              RPM:", rpm)
-    # print("              CRC:", crc)
-    # print()
 
-    return temperature, voltage, current, consumption, erpm, rpm
+def request_redraw():
+    redraw.set()
 
 
 async def update_display():
     global state
     global rotary
+    min_frame_ms = 1000 // config.get("display_max_fps", 30)
+    last_view = None
+    last_frame = time.ticks_ms()
     while True:
-        display.fill(0)
-        state["view"](state, rotary)
-        display.show()
-        await uasyncio.sleep_ms(33)
-
-
-async def update_motor():
-    global state
-    dshot = Dshot(pin=Pin(18))
-    rpm_pid = PID(
+        await redraw.wait()
+        # coalesce events arriving faster than the frame rate cap into one frame
+        wait = time.ticks_diff(time.ticks_add(last_frame, min_frame_ms), time.ticks_ms())
+        if wait > 0:
+            await uasyncio.sleep_ms(wait)
+        last_frame = time.ticks_ms()
+
+        view = state["view"]
+        view.render(display, state, rotary, full=view is not last_view)
+        last_view = view
+        await display.show_async()
+
+
+def setup_motor():
+    dshot = Dshot(
+        pin=Pin(18),
+        rate=config.get("dshot_rate", 150),
+        hold=config.get("dshot_hold", False),
+    )
+    rate = config.get("control_rate", 1000)
+    # the loop paces itself, so call the core directly instead of the sampling PID wrapper
+    rpm_pid = PIDCore(
         Kp=config["PID"]["Kp"],
         Ki=config["PID"]["Ki"],
         Kd=config["PID"]["Kd"],
         setpoint=0,
-        sample_time=None,
         output_limits=(0.0, 1.0),
         # proportional_on_measurement=True,
+        # a stale feed-forward point can hold the error out of the band, integrate anyway then
+        integral_hold=config.get("feedforward_hold_ms", 1000) * rate // 1000,
     )
+    control = SpeedControl(
+        motor,
+        dshot,
+        rpm_pid,
+        telemetry,
+        watchdog,
+        feedforward,
+        gain_schedule,
+        events,
+        redraw,
+        estimator=rpm_estimator,
+        # read once here, the step runs a thousand times a second
+        use_feedforward=config.get("feedforward", True),
+        feedforward_band=config.get("feedforward_band", 0.05),
+        display_rpm_step=config.get("display_rpm_step", 10),
+        autotune_rule=autotune_rule(),
+    )
+    loop = ControlLoop(rate=rate)
+    return control, loop
+
+
+async def update_motor():
+    control, loop = setup_motor()
     while True:
-        rpm_pid.setpoint = state["target_rpm"]
-
-        # read ESC telemetry
-        if uart.any() >= 10:
-            telemetry = decode_ESC_telemetry(uart.read())
-            if telemetry is not None:
-                state["rpm"] = telemetry[5]
-                throttle = rpm_pid(state["rpm"])
-                # print(
-                #     "Throttle:",
-                #     throttle,
-                #     "pid components:",
-                #     rpm_pid.components,
-                #     "RPM:",
-                #     state["rpm"],
-                # )
-
-        if state["target_rpm"] == 0 and state["rpm"] < 1000:
-            throttle = 0
-            rpm_pid.reset()
-        dshot.set_throttle(throttle)
-
-        await uasyncio.sleep_ms(1)
-
-
-def debounce_button(p):
-    p.irq(trigger=Pin.IRQ_FALLING, handler=None)  # remove irq
-    timer0 = Timer(0)
-    timer0.init(period=20, mode=Timer.ONE_SHOT, callback=lambda t: on_button_press(p))
-
-
-def on_button_press(p):
-    p.irq(trigger=Pin.IRQ_FALLING, handler=debounce_button)  # restore irq
-    if p.value() == 1:  # debounce
+        await loop.wait()
+        control.step(loop.dt)
+
+
+def motor_thread():
+    # runs on its own so display transfers on the event loop cannot stall it
+    control, loop = setup_motor()
+    while True:
+        loop.wait_sync()
+        control.step(loop.dt)
+
+
+EVENT_BUTTON = 1
+
+
+def on_button_irq(p):
+    # runs in interrupt context, so only queue the press
+    global last_button_ms
+    now = time.ticks_ms()
+    if time.ticks_diff(now, last_button_ms) < 50:  # ignore bounces
         return
+    last_button_ms = now
+    events.put(EVENT_BUTTON)
+
+
+async def handle_events():
     global state
-    global config
-    global rotary
-    if state["view"] == start_view:
-        if rotary.value() == 0:
-            state["view"] = edit_deposit_view
-            rotary.set(
-                min_val=0,
-                max_val=1000,
-                range_mode=RotaryIRQ.RANGE_BOUNDED,
-                value=int(0.01 * config["deposit_rpm"]),
-            )
-            return
-        if rotary.value() == 1:
-            state["view"] = deposit_view
-            state["target_rpm"] = config["deposit_rpm"]
-            return
-    if state["view"] == edit_deposit_view:
-        state["view"] = edit_coating_rpm_view
-        rotary.set(
-            min_val=0,
-            max_val=1000,
-            range_mode=RotaryIRQ.RANGE_BOUNDED,
-            value=int(0.01 * config["coating_rpm"]),
-        )
-        return
-    if state["view"] == edit_coating_rpm_view:
-        state["view"] = edit_coating_time_view
-        rotary.set(
-            min_val=0,
-            max_val=9999,
-            range_mode=RotaryIRQ.RANGE_BOUNDED,
-            value=config["coating_time"],
+    while True:
+        event = await events.get()
+        if event == EVENT_BUTTON:
+            # debounce: only accept the press if the button is still down 20 ms after the edge
+            wait = 20 - events.age_us() // 1000
+            if wait > 0:
+                await uasyncio.sleep_ms(wait)
+            if button.value() == 1:
+                continue
+        action = transitions[state["view"]].get(event)
+        if action is not None:
+            action()
+            redraw.set()
+        events.handled()
+
+
+def select_start_item():
+    item = rotary.value()
+    if item == 0:
+        enter_edit_deposit()
+    elif item == 1:
+        start_recipe()
+    else:
+        start_autotune()
+
+
+# rotary acceleration curves: (max time since previous detent in us, step)
+RPM_ACCEL = ((20000, 10), (50000, 4), (100000, 2))
+TIME_ACCEL = ((20000, 60), (50000, 10), (100000, 3))
+
+
+def enter_edit_deposit():
+    state["view"] = edit_deposit_view
+    rotary.set(
+        min_val=0,
+        max_val=1000,
+        range_mode=RotaryIRQ.RANGE_BOUNDED,
+        value=int(0.01 * config["deposit_rpm"]),
+        accel=RPM_ACCEL,
+    )
+
+
+def enter_edit_coating_rpm():
+    state["view"] = edit_coating_rpm_view
+    rotary.set(
+        min_val=0,
+        max_val=1000,
+        range_mode=RotaryIRQ.RANGE_BOUNDED,
+        value=int(0.01 * config["coating_rpm"]),
+        accel=RPM_ACCEL,
+    )
+
+
+def enter_edit_coating_time():
+    state["view"] = edit_coating_time_view
+    rotary.set(
+        min_val=0,
+        max_val=9999,
+        range_mode=RotaryIRQ.RANGE_BOUNDED,
+        value=config["coating_time"],
+        accel=TIME_ACCEL,
+    )
+
+
+def finish_edit():
+    save_config()
+    rotary.set(
+        min_val=0, max_val=2, range_mode=RotaryIRQ.RANGE_BOUNDED, value=0, accel=()
+    )
+    state["view"] = start_view
+
+
+def recipe_steps():
+    steps = config.get("recipe")
+    if steps:
+        return steps
+    # the classic two-phase process
+    return [
+        {"name": "Deposit", "rpm": config["deposit_rpm"], "wait": True},
+        {"name": "Coating", "rpm": config["coating_rpm"], "hold": config["coating_time"]},
+    ]
+
+
+def wrap(text, width=16):
+    # split text into lines of whole words that fit the display
+    lines = []
+    for word in text.split():
+        if lines and len(lines[-1]) + 1 + len(word) <= width:
+            lines[-1] += " " + word
+        else:
+            lines.append(word[:width])
+    return lines
+
+
+def start_recipe():
+    try:
+        recipe = compile_recipe(
+            recipe_steps(), ramp_rate=config.get("ramp_rate", 0), start_rpm=motor.rpm
         )
+    except (ValueError, KeyError) as e:
+        # a mistake in config.json, show it instead of letting the event task die
+        message = str(e) if isinstance(e, ValueError) else "missing {}".format(e)
+        print("Bad recipe:", message)
+        state["result"] = wrap(message)[:3]
+        state["view"] = recipe_error_view
         return
-    if state["view"] == edit_coating_time_view:
-        save_config()
-        rotary.set(min_val=0, max_val=1, range_mode=RotaryIRQ.RANGE_BOUNDED, value=0)
-        state["view"] = start_view
-        return
-    if state["view"] == deposit_view:
-        state["view"] = coating_view
-        start_coating(state)
-        return
-    if state["view"] == coating_view:
-        stop_coating()
-        return
+    player = RecipePlayer(
+        recipe,
+        tolerance=config.get("settle_tolerance", 0.02),
+        samples=config.get("settle_samples", 100),
+        timeout_ms=config.get("settle_timeout_ms", 10000),
+    )
+    state["recipe"] = player
+    state["view"] = recipe_view
+    motor.target_rpm = 0  # where the motor goes once the recipe is done
+    motor.recipe = player  # hands the setpoint to the recipe until it is done
+
+
+def recipe_button():
+    player = state["recipe"]
+    if player.waiting:
+        player.release()
+    else:
+        stop_recipe()
+
+
+def show_recipe_result():
+    motor.target_rpm = 0
+    player = state["recipe"]
+    held = player.in_band_ms + player.out_of_band_ms
+    lines = ["Settle {:.1f} s".format(player.settle_total_ms / 1000)]
+    if held:
+        lines.append("In band {}%".format(100 * player.in_band_ms // held))
+    if player.settle_timeouts:
+        lines.append("Unsettled {}".format(player.settle_timeouts))
+    state["result"] = lines
+    state["view"] = recipe_result_view
+
+
+def stop_recipe():
+    motor.target_rpm = 0
+    motor.recipe = None
+    rotary.set(min_val=0, max_val=2, range_mode=RotaryIRQ.RANGE_BOUNDED, value=0)
+    state["view"] = start_view
+    if feedforward.dirty:
+        feedforward.save(FEEDFORWARD_FILE)
 
 
-def start_coating(state):
-    global timer1
-    global timer2
+def autotune_rule():
+    return config.get("autotune_rule", "tyreus_luyben")
 
-    state["timer"] = config["coating_time"]
 
-    timer1.init(
-        period=config["coating_time"] * 1000,
-        mode=Timer.ONE_SHOT,
-        callback=lambda t: stop_coating(),
+def start_autotune():
+    rpm = config.get("autotune_rpm", config["coating_rpm"])
+    tuner = RelayAutotune(
+        setpoint=rpm,
+        bias=config.get("autotune_bias", 0.2),
+        amplitude=config.get("autotune_amplitude", 0.1),
+        hysteresis=config.get("autotune_hysteresis", 30),
+        cycles=config.get("autotune_cycles", 4),
     )
+    state["autotune"] = tuner
+    state["view"] = autotune_view
+    motor.target_rpm = rpm
+    motor.autotune = tuner  # hands the motor to the relay until it is done
 
-    def decrement_timer(t):
-        state["timer"] -= 1
 
-    timer2.init(period=1000, mode=Timer.PERIODIC, callback=decrement_timer)
+def stop_autotune():
+    motor.target_rpm = 0
+    motor.autotune = None
+    rotary.set(min_val=0, max_val=2, range_mode=RotaryIRQ.RANGE_BOUNDED, value=0)
+    state["view"] = start_view
 
-    # state["throttle"] = 0.10
-    state["target_rpm"] = config["coating_rpm"]
 
+def show_autotune_result():
+    motor.target_rpm = 0
+    tuner = state["autotune"]
+    if tuner.done:
+        kp, ki, kd = tuner.gains(autotune_rule())
+        config["PID"] = {"Kp": kp, "Ki": ki, "Kd": kd}
+        config["PID_schedule"] = gain_schedule.breakpoints()
+        save_config()
+        state["result"] = (
+            "Kp {:.3g}".format(kp),
+            "Ki {:.3g}".format(ki),
+            "Kd {:.3g}".format(kd),
+        )
+    else:
+        state["result"] = ("", "Failed")
+    state["view"] = autotune_result_view
+
+
+def show_fault():
+    # the control loop ignores both while the fault latches, drop them before it is cleared
+    motor.target_rpm = 0
+    motor.recipe = None
+    motor.autotune = None
+    state["view"] = fault_view
+
+
+def clear_fault():
+    # the motor stays stopped, a fault that still holds latches again
+    watchdog.clear()
+    stop_recipe()
+
+
+# actions to take for each event, by view
+transitions = {
+    start_view: {EVENT_BUTTON: select_start_item},
+    edit_deposit_view: {EVENT_BUTTON: enter_edit_coating_rpm},
+    edit_coating_rpm_view: {EVENT_BUTTON: enter_edit_coating_time},
+    edit_coating_time_view: {EVENT_BUTTON: finish_edit},
+    recipe_view: {EVENT_BUTTON: recipe_button, EVENT_RECIPE_DONE: show_recipe_result},
+    recipe_result_view: {EVENT_BUTTON: stop_recipe},
+    recipe_error_view: {EVENT_BUTTON: stop_recipe},
+    autotune_view: {EVENT_BUTTON: stop_autotune, EVENT_AUTOTUNE_DONE: show_autotune_result},
+    autotune_result_view: {EVENT_BUTTON: stop_autotune},
+    fault_view: {EVENT_BUTTON: clear_fault},
+}
+# a fault takes over from any view
+for actions in transitions.values():
+    actions[EVENT_FAULT] = show_fault
 
-def stop_coating():
-    global state
-    global rotary
-    global timer1
-    global timer2
-    timer1.deinit()
-    timer2.deinit()
-    state["target_rpm"] = 0
-    rotary.set(min_val=0, max_val=1, range_mode=RotaryIRQ.RANGE_BOUNDED, value=0)
-    state["view"] = start_view
+
+FEEDFORWARD_FILE = "feedforward.bin"  # learned feed-forward table, next to config.json
 
 
 def save_config():
@@ -263,8 +516,8 @@ i2c = I2C(1, sda=Pin(21), scl=Pin(22))
 display = ssd1306.SSD1306_I2C(128, 64, i2c)
 display.rotate(0)
 
-timer1 = Timer(1)
-timer2 = Timer(2)
+redraw = uasyncio.ThreadSafeFlag()  # set to request a display update
+redraw.set()
 
 
 splash()
@@ -273,27 +526,71 @@ rotary = RotaryIRQ(
     pin_num_clk=14,
     pin_num_dt=13,
     min_val=0,
-    max_val=1,
+    max_val=2,
     range_mode=RotaryIRQ.RANGE_BOUNDED,
     pull_up=True,
+    native=True,
+    fused_read=True,
 )
+rotary.add_listener(request_redraw)
 
+events = EventQueue()
+last_button_ms = time.ticks_ms()
 button = Pin(19, Pin.IN, Pin.PULL_UP)
-button.irq(trigger=Pin.IRQ_FALLING, handler=on_button_press)
-
-uart = UART(1, baudrate=115200, rx=5)  # to receive ESC telemetry
+button.irq(trigger=Pin.IRQ_FALLING, handler=on_button_irq)
 
 state = {
     "view": start_view,
-    "rpm": 0,
-    "target_rpm": 0,
-    "timer": 0,
+    "recipe": None,  # latest recipe playback, for its view
+    "autotune": None,  # latest relay experiment, for its views
+    "result": (),  # lines of the result view, formatted once when a run finishes
 }
+motor = MotorState()
+feedforward = FeedForward()
+feedforward.load(FEEDFORWARD_FILE)
 
 with open("config.json", "r") as f:
     config = json.load(f)
 
+uart = UART(1, baudrate=115200, rx=5)  # to receive ESC telemetry
+# a held packet repeats its telemetry request with every loop, so the ESC replies once per loop
+telemetry = KissTelemetry(uart, scheduled=not config.get("dshot_hold", False))
+
+# breakpoints of [rpm, Kp, Ki, Kd], each autotune run adds one, config["PID"] is used if empty
+gain_schedule = GainSchedule(config.get("PID_schedule", ()))
+
+# smooths telemetry and fills in between frames, owned by the control loop. The throttle model
+# is off until estimator_gain is set to the RPM the motor reaches at full throttle, which
+# depends on the motor, the propeller and the supply, and a wrong gain biases the prediction.
+# Without it the estimator extrapolates the measured rate, which keeps up at the default
+# telemetry rate, see tests/bench_estimator.py.
+rpm_estimator = None
+if config.get("estimator", True):
+    rpm_estimator = RpmEstimator(
+        alpha=config.get("estimator_alpha", 0.3),
+        beta=config.get("estimator_beta", 0.02),
+        gain=config.get("estimator_gain", 0),
+        tau_ms=config.get("estimator_tau_ms", 100),
+    )
+
+# cuts the throttle on lost telemetry, overheating, low voltage or a runaway RPM
+watchdog = Watchdog(
+    timeout_ms=config.get("fault_timeout_ms", 50),
+    max_temperature=config.get("fault_max_temperature", 90),
+    min_voltage=config.get("fault_min_voltage", 0),
+    filter_ms=config.get("fault_filter_ms", 10),
+    rpm_tolerance=config.get("fault_rpm_tolerance", 0.2),
+    min_rpm_band=config.get("fault_rpm_band", 300),
+    diverge_ms=config.get("fault_diverge_ms", 2000),
+    boot_timeout_ms=config.get("fault_boot_timeout_ms", 3000),
+)
+
 event_loop = uasyncio.get_event_loop()
 event_loop.create_task(update_display())
-event_loop.create_task(update_motor())
+event_loop.create_task(handle_events())
+if config.get("control_thread", False):
+    _thread.stack_size(8 * 1024)
+    _thread.start_new_thread(motor_thread, ())
+else:
+    event_loop.create_task(update_motor())
 event_loop.run_forever()
@@ -0,0 +1,72 @@
+import framebuf
+
+_MINUS = 10  # index of the minus sign in a glyph table
+_glyphs = {}  # glyph tables by scale
+
+
+def _render_glyphs(scale):
+    """Render the digits and a minus sign into one frame buffer each, scaled up by scale."""
+    small = framebuf.FrameBuffer(bytearray(8), 8, 8, framebuf.MONO_VLSB)
+    size = 8 * scale
+    glyphs = []
+    for char in "0123456789-":
+        small.fill(0)
+        small.text(char, 0, 0, 1)
+        glyph = framebuf.FrameBuffer(bytearray(size * size // 8), size, size, framebuf.MONO_VLSB)
+        for x in range(8):
+            for y in range(8):
+                if small.pixel(x, y):
+                    glyph.fill_rect(x * scale, y * scale, scale, scale, 1)
+        glyphs.append(glyph)
+    return tuple(glyphs)
+
+
+def glyphs(scale=1):
+    """The digit glyph table for a scale, rendered on first use."""
+    table = _glyphs.get(scale)
+    if table is None:
+        table = _glyphs[scale] = _render_glyphs(scale)
+    return table
+
+
+class NumberField:
+    """
+    A right-aligned integer drawn straight from a digit glyph table.
+
+    Drawing does not format a string, so with an integer value it does not allocate. Values
+    that do not fit are clamped to the largest or smallest number that does.
+    """
+
+    def __init__(self, x, y, digits, scale=1):
+        """
+        Args:
+            x: Left edge of the field in pixels.
+            y: Top edge of the field in pixels.
+            digits: Width of the field in characters, including a minus sign if any.
+            scale: Font scale, 1 for the regular 8x8 font.
+        """
+        self.x = x
+        self.y = y
+        self.digits = digits
+        self.char_width = 8 * scale
+        self.width = digits * self.char_width
+        self.height = 8 * scale
+        self._glyphs = glyphs(scale)
+        self._max = 10**digits - 1
+        self._min = -(10 ** (digits - 1) - 1)
+
+    def draw(self, fb, value):
+        """Clear the field and draw value into it."""
+        fb.fill_rect(self.x, self.y, self.width, self.height, 0)
+        value = int(value)
+        value = min(max(value, self._min), self._max)
+        n = -value if value < 0 else value
+        x = self.x + self.width
+        while True:
+            x -= self.char_width
+            fb.blit(self._glyphs[n % 10], x, self.y)
+            n //= 10
+            if not n:
+                break
+        if value < 0:
+            fb.blit(self._glyphs[_MINUS], x - self.char_width, self.y)
@@ -1,8 +1,25 @@
 # adapted from https://github.com/m-lundberg/simple-pid
 
 
+from array import array
+import math
 import time
 
+_INF = float("inf")
+FIXED_ONE = 1 << 16  # output value of 1.0 in fixed-point mode
+_FIXED_MAX = (1 << 29) - 1  # stays a small int on 32-bit ports
+_GAIN_BITS = 14  # significant bits of the fixed-point gains
+_DT_BITS = 10  # fractional bits of the integral gain applied after multiplying by dt
+_I_SHIFT = 8  # extra fractional bits of the fixed-point integral, so small errors still add up
+
+
+def _fixed_gain(gain):
+    """Scale a gain to an integer of _GAIN_BITS bits, returning (integer, shift)."""
+    shift = 0
+    while shift < 30 and abs(gain) * (2 << shift) < (1 << _GAIN_BITS):
+        shift += 1
+    return round(gain * (1 << shift)), shift
+
 
 def _clamp(value, limits):
     lower, upper = limits
@@ -15,6 +32,265 @@ def _clamp(value, limits):
     return value
 
 
+class PIDCore:
+    """
+    The update step of a PID controller, kept lean for fast control loops.
+
+    Options are resolved to one of the update methods at construction, output limits are kept as
+    plain bounds, and there are no optional features left to check on every call. In fixed-point
+    mode all arithmetic is done on integers: the setpoint, input and integral are converted to
+    integers where they are set, dt is in microseconds and the output is scaled so FIXED_ONE
+    means 1.0. On ports where floats live on the heap, that update does not allocate as long as
+    intermediate products stay within small int range.
+
+    Prefer PID unless the call overhead matters, it wraps this class with the full API.
+    """
+
+    __slots__ = (
+        "Kp",
+        "Ki",
+        "Kd",
+        "_setpoint",
+        "proportional_on_measurement",
+        "differetial_on_measurement",
+        "error_map",
+        "fixed_point",
+        "integral_band",
+        "integral_hold",
+        "proportional",
+        "integral",
+        "derivative",
+        "update",
+        "_lower",
+        "_upper",
+        "_integral_q",
+        "_lower_q",
+        "_upper_q",
+        "_primed",
+        "_held",
+        "_last_input",
+        "_last_error",
+        "_kp_q",
+        "_kp_shift",
+        "_ki_q",
+        "_ki_pre",
+        "_ki_post",
+        "_kd_q",
+        "_kd_shift",
+        "_kd_post",
+    )
+
+    def __init__(
+        self,
+        Kp=1.0,
+        Ki=0.0,
+        Kd=0.0,
+        setpoint=0,
+        output_limits=(None, None),
+        proportional_on_measurement=False,
+        differetial_on_measurement=True,
+        error_map=None,
+        fixed_point=False,
+        integral_band=None,
+        integral_hold=None,
+    ):
+        """
+        See PID for the parameters. fixed_point selects integer arithmetic, which only supports
+        proportional on error, differential on measurement and no error map. integral_band is
+        the largest error, in input units, at which the integral still integrates. Limiting it
+        keeps the integral from winding up during a large step when something else, like a
+        feed-forward term, already provides the bulk of the output. If that something is wrong,
+        the error can stay out of the band for good, so after integral_hold updates out of the
+        band at the same setpoint the band is lifted until it is set again.
+        """
+        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
+        self.proportional_on_measurement = proportional_on_measurement
+        self.differetial_on_measurement = differetial_on_measurement
+        self.error_map = error_map
+        self.fixed_point = fixed_point
+        self._setpoint = None
+        self.setpoint = setpoint
+        self.integral_band = _INF if integral_band is None else integral_band
+        self.integral_hold = _INF if integral_hold is None else integral_hold
+        self.integral = 0
+        self._integral_q = 0
+        self.set_limits(output_limits)
+        self.configure()
+        self.reset()
+
+    def configure(self):
+        """Pick the update method. Call again after changing gains or options."""
+        simple = (
+            not self.proportional_on_measurement
+            and self.differetial_on_measurement
+            and self.error_map is None
+        )
+        if self.fixed_point:
+            if not simple:
+                raise ValueError(
+                    "fixed point only supports proportional on error, "
+                    "differential on measurement and no error map"
+                )
+            self._kp_q, self._kp_shift = _fixed_gain(self.Kp * FIXED_ONE)
+            # integral gain per microsecond, in units of the finer integral
+            self._ki_q, shift = _fixed_gain(self.Ki * (FIXED_ONE << _I_SHIFT) / 1e6)
+            self._ki_pre = max(shift - _DT_BITS, 0)
+            self._ki_post = shift - self._ki_pre
+            # derivative gain per microsecond, scaled down if needed so the product with the
+            # change of input stays a small int, and scaled back up after dividing by dt
+            kd = self.Kd * FIXED_ONE * 1e6
+            self._kd_q, self._kd_shift = _fixed_gain(kd)
+            self._kd_post = 0
+            while abs(self._kd_q) >= 1 << _GAIN_BITS:
+                self._kd_post += 1
+                self._kd_q = round(kd / (1 << self._kd_post))
+            self.update = self._update_fixed
+        elif simple:
+            self.update = self._update_simple
+        else:
+            self.update = self._update
+
+    @property
+    def setpoint(self):
+        return self._setpoint
+
+    @setpoint.setter
+    def setpoint(self, setpoint):
+        # a ramp or a recipe may give a float, fixed-point mode needs an integer
+        if self.fixed_point:
+            setpoint = round(setpoint)
+        if setpoint != self._setpoint:
+            self._setpoint = setpoint
+            self._held = 0
+
+    def set_limits(self, limits):
+        """
+        Set the output limits as (lower, upper), either of which may be None. The integral is
+        clamped to the new limits.
+        """
+        lower, upper = limits if limits is not None else (None, None)
+        if self.fixed_point:
+            self._lower = -(_FIXED_MAX >> _I_SHIFT) if lower is None else int(lower * FIXED_ONE)
+            self._upper = (_FIXED_MAX >> _I_SHIFT) if upper is None else int(upper * FIXED_ONE)
+            self._lower_q = self._lower << _I_SHIFT
+            self._upper_q = self._upper << _I_SHIFT
+        else:
+            self._lower = -_INF if lower is None else lower
+            self._upper = _INF if upper is None else upper
+        self.set_integral(self.integral)
+
+    def set_integral(self, integral):
+        """Set the integral term, clamped to the output limits."""
+        integral = min(max(integral, self._lower), self._upper)
+        if self.fixed_point:
+            integral = round(integral)
+            self._integral_q = integral << _I_SHIFT
+        self.integral = integral
+
+    def reset(self, integral=0):
+        self.proportional = 0
+        self.derivative = 0
+        self.set_integral(integral)
+        self._primed = False
+        self._held = 0
+        self._last_input = 0
+        self._last_error = 0
+
+    def _lift_band(self):
+        # called for an error out of the integral band, returns whether to integrate anyway
+        self._held += 1
+        if self._held < self.integral_hold:
+            return False
+        self.integral_band = _INF
+        return True
+
+    def _update_simple(self, input_, dt):
+        # proportional on error, differential on measurement
+        error = self._setpoint - input_
+        d_input = input_ - self._last_input if self._primed else 0
+        self._primed = True
+        self._last_input = input_
+
+        self.proportional = self.Kp * error
+        integral = self.integral
+        if -self.integral_band <= error <= self.integral_band or self._lift_band():
+            integral += self.Ki * error * dt
+            if integral > self._upper:
+                integral = self._upper
+            elif integral < self._lower:
+                integral = self._lower
+            self.integral = integral
+        self.derivative = -self.Kd * d_input / dt
+
+        output = self.proportional + integral + self.derivative
+        if output > self._upper:
+            return self._upper
+        if output < self._lower:
+            return self._lower
+        return output
+
+    def _update(self, input_, dt):
+        error = self._setpoint - input_
+        if self._primed:
+            d_input = input_ - self._last_input
+            d_error = error - self._last_error
+        else:
+            d_input = 0
+            d_error = 0
+        self._primed = True
+        self._last_input = input_
+        self._last_error = error
+
+        if self.error_map is not None:
+            error = self.error_map(error)
+
+        if not self.proportional_on_measurement:
+            self.proportional = self.Kp * error
+        else:
+            self.proportional -= self.Kp * d_input
+
+        if -self.integral_band <= error <= self.integral_band or self._lift_band():
+            integral = self.integral + self.Ki * error * dt
+            self.integral = min(max(integral, self._lower), self._upper)  # Avoid integral windup
+
+        if self.differetial_on_measurement:
+            self.derivative = -self.Kd * d_input / dt
+        else:
+            self.derivative = self.Kd * d_error / dt
+
+        output = self.proportional + self.integral + self.derivative
+        return min(max(output, self._lower), self._upper)
+
+    def _update_fixed(self, input_, dt_us):
+        # floats, e.g. from an estimator, are truncated here, ints pass through without allocating
+        input_ = int(input_)
+        dt_us = int(dt_us)
+        error = self._setpoint - input_
+        d_input = input_ - self._last_input if self._primed else 0
+        self._primed = True
+        self._last_input = input_
+
+        self.proportional = (self._kp_q * error) >> self._kp_shift
+        integral = self.integral
+        if -self.integral_band <= error <= self.integral_band or self._lift_band():
+            integral_q = ((self._ki_q * error) >> self._ki_pre) * dt_us
+            integral_q = self._integral_q + (integral_q >> self._ki_post)
+            if integral_q > self._upper_q:
+                integral_q = self._upper_q
+            elif integral_q < self._lower_q:
+                integral_q = self._lower_q
+            self._integral_q = integral_q
+            integral = self.integral = integral_q >> _I_SHIFT
+        self.derivative = -((((self._kd_q * d_input) // dt_us) >> self._kd_shift) << self._kd_post)
+
+        output = self.proportional + integral + self.derivative
+        if output > self._upper:
+            return self._upper
+        if output < self._lower:
+            return self._lower
+        return output
+
+
 class PID(object):
     """A simple PID controller."""
 
@@ -30,6 +306,7 @@ class PID(object):
         proportional_on_measurement=False,
         differetial_on_measurement=True,
         error_map=None,
+        fixed_point=False,
     ):
         """
         Initialize a new PID controller.
@@ -55,25 +332,25 @@ class PID(object):
         :param differetial_on_measurement: Whether the differential term should be calculated on
             the input directly rather than on the error (which is the traditional way).
         :param error_map: Function to transform the error value in another constrained value.
+        :param fixed_point: Whether to compute with scaled integers, see :class:`PIDCore`. Inputs
+            are rounded to integers and the output is converted back to a float.
         """
-        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
-        self.setpoint = setpoint
-        self.sample_time = sample_time
-
         self._min_output, self._max_output = None, None
+        self.core = PIDCore(
+            Kp,
+            Ki,
+            Kd,
+            setpoint,
+            proportional_on_measurement=proportional_on_measurement,
+            differetial_on_measurement=differetial_on_measurement,
+            error_map=error_map,
+            fixed_point=fixed_point,
+        )
+        self.sample_time = sample_time
         self._auto_mode = auto_mode
-        self.proportional_on_measurement = proportional_on_measurement
-        self.differetial_on_measurement = differetial_on_measurement
-        self.error_map = error_map
-
-        self._proportional = 0
-        self._integral = 0
-        self._derivative = 0
 
         self._last_time = None
         self._last_output = None
-        self._last_error = None
-        self._last_input = None
 
         # try:
         #     # Get monotonic time to ensure that time deltas are always positive
@@ -81,7 +358,7 @@ class PID(object):
         # except AttributeError:
         #     # time.monotonic() not available (using python < 3.3), fallback to time.time()
         #     self.time_fn = time.time
-        self.time_fn = lambda: 0.001 * time.ticks_ms()
+        self.time_fn = time.ticks_us
 
         self.output_limits = output_limits
         self.reset()
@@ -102,7 +379,8 @@ class PID(object):
 
         now = self.time_fn()
         if dt is None:
-            dt = now - self._last_time if (now - self._last_time) else 1e-16
+            elapsed = time.ticks_diff(now, self._last_time)
+            dt = elapsed * 1e-6 if elapsed else 1e-16
         elif dt <= 0:
             raise ValueError('dt has negative value {}, must be positive'.format(dt))
 
@@ -110,40 +388,14 @@ class PID(object):
             # Only update every sample_time seconds
             return self._last_output
 
-        # Compute error terms
-        error = self.setpoint - input_
-        d_input = input_ - (self._last_input if (self._last_input is not None) else input_)
-        d_error = error - (self._last_error if (self._last_error is not None) else error)
-
-        # Check if must map the error
-        if self.error_map is not None:
-            error = self.error_map(error)
-
-        # Compute the proportional term
-        if not self.proportional_on_measurement:
-            # Regular proportional-on-error, simply set the proportional term
-            self._proportional = self.Kp * error
-        else:
-            # Add the proportional error on measurement to error_sum
-            self._proportional -= self.Kp * d_input
-
-        # Compute integral and derivative terms
-        self._integral += self.Ki * error * dt
-        self._integral = _clamp(self._integral, self.output_limits)  # Avoid integral windup
-
-        if self.differetial_on_measurement:
-            self._derivative = -self.Kd * d_input / dt
+        core = self.core
+        if core.fixed_point:
+            output = core.update(int(input_), max(1, int(dt * 1e6))) / FIXED_ONE
         else:
-            self._derivative = self.Kd * d_error / dt
-
-        # Compute final output
-        output = self._proportional + self._integral + self._derivative
-        output = _clamp(output, self.output_limits)
+            output = core.update(input_, dt)
 
         # Keep track of state
         self._last_output = output
-        self._last_input = input_
-        self._last_error = error
         self._last_time = now
 
         return output
@@ -160,13 +412,79 @@ class PID(object):
             ')'
         ).format(self=self)
 
+    @property
+    def Kp(self):
+        return self.core.Kp
+
+    @Kp.setter
+    def Kp(self, Kp):
+        self.tunings = (Kp, self.Ki, self.Kd)
+
+    @property
+    def Ki(self):
+        return self.core.Ki
+
+    @Ki.setter
+    def Ki(self, Ki):
+        self.tunings = (self.Kp, Ki, self.Kd)
+
+    @property
+    def Kd(self):
+        return self.core.Kd
+
+    @Kd.setter
+    def Kd(self, Kd):
+        self.tunings = (self.Kp, self.Ki, Kd)
+
+    @property
+    def setpoint(self):
+        return self.core.setpoint
+
+    @setpoint.setter
+    def setpoint(self, setpoint):
+        self.core.setpoint = setpoint
+
+    @property
+    def proportional_on_measurement(self):
+        return self.core.proportional_on_measurement
+
+    @proportional_on_measurement.setter
+    def proportional_on_measurement(self, enabled):
+        self.core.proportional_on_measurement = enabled
+        self.core.configure()
+
+    @property
+    def differetial_on_measurement(self):
+        return self.core.differetial_on_measurement
+
+    @differetial_on_measurement.setter
+    def differetial_on_measurement(self, enabled):
+        self.core.differetial_on_measurement = enabled
+        self.core.configure()
+
+    @property
+    def error_map(self):
+        return self.core.error_map
+
+    @error_map.setter
+    def error_map(self, error_map):
+        self.core.error_map = error_map
+        self.core.configure()
+
     @property
     def components(self):
         """
         The P-, I- and D-terms from the last computation as separate components as a tuple. Useful
         for visualizing what the controller is doing or when tuning hard-to-tune systems.
         """
-        return self._proportional, self._integral, self._derivative
+        core = self.core
+        if core.fixed_point:
+            return (
+                core.proportional / FIXED_ONE,
+                core.integral / FIXED_ONE,
+                core.derivative / FIXED_ONE,
+            )
+        return core.proportional, core.integral, core.derivative
 
     @property
     def tunings(self):
@@ -176,7 +494,9 @@ class PID(object):
     @tunings.setter
     def tunings(self, tunings):
         """Set the PID tunings."""
-        self.Kp, self.Ki, self.Kd = tunings
+        core = self.core
+        core.Kp, core.Ki, core.Kd = tunings
+        core.configure()
 
     @property
     def auto_mode(self):
@@ -206,8 +526,10 @@ class PID(object):
             # Switching from manual mode to auto, reset
             self.reset()
 
-            self._integral = last_output if (last_output is not None) else 0
-            self._integral = _clamp(self._integral, self.output_limits)
+            integral = last_output if (last_output is not None) else 0
+            if self.core.fixed_point:
+                integral = int(integral * FIXED_ONE)
+            self.core.reset(integral)
 
         self._auto_mode = enabled
 
@@ -225,6 +547,7 @@ class PID(object):
         """Set the output limits."""
         if limits is None:
             self._min_output, self._max_output = None, None
+            self.core.set_limits(None)
             return
 
         min_output, max_output = limits
@@ -235,7 +558,7 @@ class PID(object):
         self._min_output = min_output
         self._max_output = max_output
 
-        self._integral = _clamp(self._integral, self.output_limits)
+        self.core.set_limits(limits)
         self._last_output = _clamp(self._last_output, self.output_limits)
 
     def reset(self):
@@ -245,12 +568,278 @@ class PID(object):
         This sets each term to 0 as well as clearing the integral, the last output and the last
         input (derivative calculation).
         """
-        self._proportional = 0
-        self._integral = 0
-        self._derivative = 0
-
-        self._integral = _clamp(self._integral, self.output_limits)
+        self.core.reset()
 
         self._last_time = self.time_fn()
         self._last_output = None
-        self._last_input = None
+
+
+class GainSchedule:
+    """
+    PID gains by setpoint, interpolated linearly between breakpoints.
+
+    The breakpoints are kept in flat arrays, so looking up a new setpoint is a binary search
+    without allocations, and looking up the same setpoint again is a single comparison. Below
+    the first and above the last breakpoint the gains of that breakpoint are used.
+    """
+
+    def __init__(self, breakpoints=()):
+        """
+        Initialize a new gain schedule.
+
+        :param breakpoints: An iterable of (setpoint, Kp, Ki, Kd), in any order, as stored in the
+            config
+        """
+        self._points = sorted(tuple(point) for point in breakpoints)
+        self._build()
+
+    def __len__(self):
+        return len(self._points)
+
+    def breakpoints(self):
+        """The breakpoints as a list of [setpoint, Kp, Ki, Kd] lists, as stored in the config."""
+        return [list(point) for point in self._points]
+
+    def insert(self, setpoint, Kp, Ki, Kd):
+        """Add a breakpoint, replacing any breakpoint at the same setpoint."""
+        points = [point for point in self._points if point[0] != setpoint]
+        points.append((setpoint, Kp, Ki, Kd))
+        self._points = sorted(points)
+        self._build()
+
+    def apply(self, core, setpoint):
+        """
+        Load the gains for a setpoint into a :class:`PIDCore`, before its setpoint is changed.
+
+        When the proportional gain changes, the integral takes up the difference in the
+        proportional term at the current error, so the output does not jump (bumpless
+        transfer). The setpoint change itself still acts through the new gains.
+
+        :return: Whether the gains were changed
+        """
+        if setpoint == self._setpoint or not self._points:
+            return False
+        self._setpoint = setpoint
+        setpoints = self._setpoints
+        n = len(setpoints)
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if setpoints[mid] < setpoint:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            kp, ki, kd = self._kp[0], self._ki[0], self._kd[0]
+        elif lo == n:
+            kp, ki, kd = self._kp[n - 1], self._ki[n - 1], self._kd[n - 1]
+        else:
+            i = lo - 1
+            f = (setpoint - setpoints[i]) / (setpoints[lo] - setpoints[i])
+            kp = self._kp[i] + f * (self._kp[lo] - self._kp[i])
+            ki = self._ki[i] + f * (self._ki[lo] - self._ki[i])
+            kd = self._kd[i] + f * (self._kd[lo] - self._kd[i])
+
+        if core._primed and kp != core.Kp:
+            bump = (core.Kp - kp) * (core.setpoint - core._last_input)
+            if core.fixed_point:
+                bump = int(bump * FIXED_ONE)
+            core.set_integral(core.integral + bump)
+        core.Kp, core.Ki, core.Kd = kp, ki, kd
+        core.configure()
+        return True
+
+    def _build(self):
+        points = self._points
+        self._setpoints = array("f", [point[0] for point in points])
+        self._kp = array("f", [point[1] for point in points])
+        self._ki = array("f", [point[2] for point in points])
+        self._kd = array("f", [point[3] for point in points])
+        self._setpoint = None
+
+
+# gain rules for relay autotuning, as (Kp / Ku, Ti / Pu, Td / Pu)
+TUNING_RULES = {
+    "ziegler_nichols": (0.6, 0.5, 0.125),
+    "ziegler_nichols_pi": (0.45, 1 / 1.2, 0),
+    "tyreus_luyben": (1 / 2.2, 2.2, 1 / 6.3),
+    "tyreus_luyben_pi": (1 / 3.2, 2.2, 0),
+    "some_overshoot": (0.33, 0.5, 0.33),
+    "no_overshoot": (0.2, 0.5, 0.33),
+}
+
+
+def tuning_gains(ku, pu, rule="tyreus_luyben"):
+    """
+    Compute PID gains from the ultimate gain and period of a process.
+
+    :param ku: The ultimate gain, in output units per input unit
+    :param pu: The ultimate period, in seconds
+    :param rule: The name of one of the TUNING_RULES
+    :return: The gains as a tuple: (Kp, Ki, Kd)
+    """
+    try:
+        kp, ti, td = TUNING_RULES[rule]
+    except KeyError:
+        raise ValueError('unknown tuning rule {!r}'.format(rule))
+    kp *= ku
+    return kp, kp / (ti * pu), kp * td * pu
+
+
+class RelayAutotune:
+    """
+    Relay feedback experiment to find the ultimate gain and period of a process.
+
+    Instead of a PID, a relay drives the process: the output is bias + amplitude while the input
+    is below the setpoint and bias - amplitude while it is above, which makes the input oscillate
+    around the setpoint at about the ultimate period (Åström and Hägglund). The ultimate gain
+    follows from the amplitude of that oscillation. After every cycle the bias is moved to even
+    out the time spent on either side of the relay, so the oscillation stays centred on the
+    setpoint even if the bias was a poor guess. The first cycle is a start-up transient and is
+    not used.
+    """
+
+    def __init__(
+        self,
+        setpoint,
+        bias,
+        amplitude,
+        hysteresis=0,
+        cycles=4,
+        max_cycles=20,
+        timeout=10,
+        output_limits=(0, 1),
+        symmetry=0.1,
+    ):
+        """
+        Initialize a new relay experiment.
+
+        :param setpoint: The input value to oscillate around
+        :param bias: The initial guess of the output that holds the input at the setpoint
+        :param amplitude: How far the relay moves the output away from the bias
+        :param hysteresis: How far the input has to cross the setpoint before the relay switches,
+            to keep measurement noise from switching it. Should be a bit larger than the noise.
+        :param cycles: The number of cycles to average the result over
+        :param max_cycles: The number of cycles after which the experiment gives up
+        :param timeout: The time in seconds after which the experiment gives up if the relay has
+            not switched, e.g. because bias + amplitude cannot reach the setpoint
+        :param output_limits: The limits of the output, as (lower, upper)
+        :param symmetry: The largest difference between the two halves of a cycle, as a fraction
+            of its period, for the cycle to be used
+        """
+        self.setpoint = setpoint
+        self.bias = bias
+        self.amplitude = amplitude
+        self.hysteresis = hysteresis
+        self.cycles = cycles
+        self.max_cycles = max_cycles
+        self.symmetry = symmetry
+        self._timeout_us = int(timeout * 1000000)
+        self._min_bias = output_limits[0] + amplitude
+        self._max_bias = output_limits[1] - amplitude
+        if self._max_bias < self._min_bias:
+            raise ValueError('amplitude does not fit between the output limits')
+        self.bias = min(max(bias, self._min_bias), self._max_bias)
+
+        self.ku = None  # ultimate gain, in output units per input unit
+        self.pu = None  # ultimate period, in seconds
+        self.done = False
+        self.failed = False
+        self.cycle = 0  # cycles started
+        self.good_cycles = 0  # cycles symmetric enough to be used
+
+        self._high = True
+        self._started = False
+        self._switch_us = 0  # when the relay last switched
+        self._cycle_us = 0  # when the current cycle started
+        self._high_us = 0  # duration of the high half of the current cycle
+        self._max = -_INF
+        self._min = _INF
+        self._period_sum = 0
+        self._amplitude_sum = 0
+
+    def update(self, input_, now):
+        """
+        Feed the latest input and return the output to apply.
+
+        :param input_: The latest input value
+        :param now: The current time in ticks_us()
+        :return: The output to apply, or the bias once the experiment has finished
+        """
+        if self.done or self.failed:
+            return self.bias
+        if not self._started:
+            self._started = True
+            self._switch_us = self._cycle_us = now
+            self._high = input_ < self.setpoint
+
+        if input_ > self._max:
+            self._max = input_
+        if input_ < self._min:
+            self._min = input_
+
+        if self._high:
+            if input_ > self.setpoint + self.hysteresis:
+                self._high = False
+                self._high_us = time.ticks_diff(now, self._switch_us)
+                self._switch_us = now
+        elif input_ < self.setpoint - self.hysteresis:
+            self._high = True
+            self._switch_us = now
+            self._end_cycle(now)
+        if time.ticks_diff(now, self._switch_us) > self._timeout_us:
+            self.failed = True
+            return self.bias
+
+        if self._high:
+            return self.bias + self.amplitude
+        return self.bias - self.amplitude
+
+    def gains(self, rule="tyreus_luyben"):
+        """
+        PID gains from the result of the experiment, see :func:`tuning_gains`.
+
+        :return: The gains as a tuple: (Kp, Ki, Kd)
+        """
+        if not self.done:
+            raise ValueError('autotuning has not finished')
+        return tuning_gains(self.ku, self.pu, rule)
+
+    def _end_cycle(self, now):
+        # a cycle runs from one switch to high to the next
+        period_us = time.ticks_diff(now, self._cycle_us)
+        high_us = self._high_us
+        amplitude = (self._max - self._min) / 2
+        self._cycle_us = now
+        self._max = -_INF
+        self._min = _INF
+        self.cycle += 1
+        if self.cycle == 1 or period_us <= 0:
+            # start-up transient, or a cycle that started before the first switch
+            return
+
+        # too long a high half means the bias is too low, and the other way around
+        asymmetry = (2 * high_us - period_us) / period_us
+        self.bias += 0.5 * self.amplitude * asymmetry
+        self.bias = min(max(self.bias, self._min_bias), self._max_bias)
+
+        if abs(asymmetry) <= self.symmetry:
+            self.good_cycles += 1
+            self._period_sum += period_us
+            self._amplitude_sum += amplitude
+            if self.good_cycles >= self.cycles:
+                self._finish()
+                return
+        if self.cycle >= self.max_cycles:
+            self.failed = True
+
+    def _finish(self):
+        a = self._amplitude_sum / self.good_cycles
+        # with hysteresis the relay switches late, which the describing function corrects for
+        a = max(a * a - self.hysteresis * self.hysteresis, 0) ** 0.5
+        if not a:
+            self.failed = True
+            return
+        self.ku = 4 * self.amplitude / (math.pi * a)
+        self.pu = self._period_sum / self.good_cycles * 1e-6
+        self.done = True
@@ -0,0 +1,236 @@
+from array import array
+import time
+
+GATE_BUTTON = 1  # playback waits at this breakpoint until release() is called
+GATE_SETTLE = 2  # playback waits at this breakpoint until the RPM has settled at its target
+
+
+def compile_recipe(steps, ramp_rate=0, start_rpm=0):
+    """
+    Compile recipe steps into a setpoint trajectory.
+
+    Each step ramps from the previous RPM to its own, holds it, and optionally waits for the
+    button. A step is a dict with:
+        rpm: Target RPM.
+        ramp_rate: Ramp rate in RPM per second, defaults to the ramp_rate argument. 0 steps
+            straight to the target.
+        ramp_time: Ramp duration in seconds, overrides ramp_rate.
+        hold: Time to hold the target in seconds after the ramp, defaults to 0.
+        wait: Whether to wait for the button after the hold, defaults to False.
+        settle: Whether to wait for the RPM to settle before the hold starts, so the hold is
+            counted from settled speed. Defaults to True for steps with a hold.
+        name: Name to show while the step runs, defaults to "Step <n>".
+
+    Args:
+        steps: List of steps.
+        ramp_rate: Default ramp rate in RPM per second.
+        start_rpm: RPM the first ramp starts from.
+
+    Returns:
+        A Recipe.
+    """
+    if not steps:
+        raise ValueError("a recipe needs at least one step")
+    rpm = int(start_rpm)  # the measured RPM may be a float from the estimator
+    times = [0]
+    rpms = [rpm]
+    gates = [0]
+    step_of = [0]
+    step_end = []
+    names = []
+    t = 0
+    for i, step in enumerate(steps):
+        target = int(step["rpm"])
+        if "ramp_time" in step:
+            ramp = int(step["ramp_time"] * 1000)
+        else:
+            rate = step.get("ramp_rate", ramp_rate)
+            ramp = int(abs(target - rpm) * 1000 // rate) if rate > 0 else 0
+        hold = int(step.get("hold", 0) * 1000)
+        if ramp < 0 or hold < 0:
+            raise ValueError("step {} has a negative duration".format(i + 1))
+
+        # end of the ramp, then end of the hold
+        t += ramp
+        times.append(t)
+        rpms.append(target)
+        gates.append(GATE_SETTLE if step.get("settle", hold > 0) else 0)
+        step_of.append(i)
+        t += hold
+        times.append(t)
+        rpms.append(target)
+        gates.append(GATE_BUTTON if step.get("wait", False) else 0)
+        step_of.append(i)
+
+        step_end.append(t)
+        names.append(step.get("name", "Step {}".format(i + 1)))
+        rpm = target
+    return Recipe(times, rpms, gates, step_of, step_end, names)
+
+
+class Recipe:
+    """
+    A compiled setpoint trajectory: RPM breakpoints by time, interpolated linearly.
+
+    Times are in milliseconds from the start of the recipe. Each breakpoint also records which
+    step it belongs to and whether playback has to wait there.
+    """
+
+    def __init__(self, times, rpms, gates, step_of, step_end, names):
+        self.times = array("L", times)
+        self.rpms = array("L", rpms)
+        self.gates = bytearray(gates)
+        self.step_of = bytearray(step_of)
+        self.step_end = array("L", step_end)  # time at which each step ends
+        self.names = tuple(names)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration_ms(self):
+        """Duration of the recipe, not counting time spent waiting at gates."""
+        return self.times[-1]
+
+
+class RecipePlayer:
+    """
+    Plays a Recipe back in real time.
+
+    Elapsed time is accumulated from ticks_diff() between calls to sample(), so playback
+    survives the ticks counter wrapping around, and it is kept in whole milliseconds so it
+    stays a small int over long recipes. The current segment only moves forward, so sampling
+    is constant time.
+
+    At a settle gate playback waits until the RPM has been within a band around the target
+    for a number of consecutive samples, or until a timeout, after which the hold starts
+    anyway and the timeout is counted. How long settling took is recorded per step, and while
+    a target is held the time spent in and out of the band is recorded too.
+
+    sample() is meant to be called by the control loop and release() by the user interface.
+    Each field has a single writer, so the two can run in different threads.
+    """
+
+    def __init__(self, recipe, tolerance=0.02, min_band=30, samples=100, timeout_ms=0):
+        """
+        Args:
+            recipe: Recipe to play.
+            tolerance: Half width of the band around the target, as a fraction of the target.
+            min_band: Smallest half width of the band in RPM, to allow for telemetry resolution.
+            samples: Number of consecutive samples within the band for the RPM to be settled.
+            timeout_ms: Longest wait at a settle gate, 0 to wait until the RPM settles.
+        """
+        self.recipe = recipe
+        self.tolerance = tolerance
+        self.min_band = min_band
+        self.samples = samples
+        self.timeout_ms = timeout_ms
+        self.done = False
+        self.waiting = False  # held at a gate until release()
+        self.settling = False  # held at a gate until the RPM settles
+        self.step = 0
+        self.elapsed_ms = 0
+        self.settle_ms = array("L", [0] * len(recipe.names))  # time to settle, by step
+        self.in_band_ms = 0  # time within the band while holding a target
+        self.out_of_band_ms = 0  # time outside the band while holding a target
+        self.settle_timeouts = 0  # settle gates passed because the RPM did not settle in time
+        self._index = 0  # breakpoint at the start of the current segment
+        self._last_us = None
+        self._frac_us = 0
+        self._in_band = 0  # consecutive samples within the band
+        self._released = -1  # index of the gate released by the user interface
+
+    def release(self):
+        """Continue past the gate playback is waiting at."""
+        self._released = self._index
+
+    @property
+    def settle_total_ms(self):
+        """Time spent waiting for the RPM to settle over the whole recipe."""
+        return sum(self.settle_ms)
+
+    def time_left_ms(self):
+        """Time until the current step ends, or 0 while waiting at a button gate."""
+        if self.waiting:
+            return 0
+        return max(self.recipe.step_end[self.step] - self.elapsed_ms, 0)
+
+    def sample(self, now, rpm=0):
+        """
+        Advance playback and return the setpoint.
+
+        Args:
+            now: Current ticks_us().
+            rpm: Measured RPM, for settle gates and band statistics.
+        """
+        recipe = self.recipe
+        times = recipe.times
+        rpms = recipe.rpms
+        i = self._index
+        if self._last_us is None:
+            self._last_us = now
+        frac = self._frac_us + time.ticks_diff(now, self._last_us)
+        self._last_us = now
+        step_ms = frac // 1000
+        self._frac_us = frac % 1000
+
+        if self.waiting:
+            if self._released != i:
+                return rpms[i]
+            self.waiting = False
+            step_ms = 0
+        if self.settling:
+            self.settle_ms[self.step] += step_ms
+            if self._within_band(rpm, rpms[i]):
+                self._in_band += 1
+            else:
+                self._in_band = 0
+            if self._in_band < self.samples:
+                if not self.timeout_ms or self.settle_ms[self.step] < self.timeout_ms:
+                    return rpms[i]
+                # e.g. a motor that cannot reach the target, hold it anyway so the run ends
+                self.settle_timeouts += 1
+            self.settling = False
+            step_ms = 0
+        if self.done:
+            return rpms[i]
+
+        self.elapsed_ms += step_ms
+        last = len(times) - 1
+        while i < last and self.elapsed_ms >= times[i + 1]:
+            i += 1
+            self._index = i
+            gate = recipe.gates[i]
+            if gate:
+                # hold the clock at the gate
+                self.elapsed_ms = times[i]
+                self._frac_us = 0
+                self.step = recipe.step_of[i]
+                if gate & GATE_SETTLE:
+                    self.settling = True
+                    self._in_band = 0
+                else:
+                    self.waiting = True
+                return rpms[i]
+        if i == last:
+            self.done = True
+            return rpms[i]
+        self.step = recipe.step_of[i + 1]
+
+        t0 = times[i]
+        r0 = rpms[i]
+        r1 = rpms[i + 1]
+        span = times[i + 1] - t0
+        if r0 == r1:
+            # holding the target
+            if self._within_band(rpm, r0):
+                self.in_band_ms += step_ms
+            else:
+                self.out_of_band_ms += step_ms
+            return r0
+        if not span:
+            return r1
+        return r0 + (r1 - r0) * (self.elapsed_ms - t0) // span
+
+    def _within_band(self, rpm, target):
+        return abs(rpm - target) <= max(self.tolerance * target, self.min_band)
@@ -8,6 +8,7 @@
 #   https://github.com/MikeTeachman/micropython-rotary
 
 import micropython
+import time
 
 _DIR_CW = const(0x10)  # Clockwise step
 _DIR_CCW = const(0x20)  # Counter-clockwise step
@@ -22,29 +23,30 @@ _R_CCW_2 = const(0x5)
 _R_CCW_3 = const(0x6)
 _R_ILLEGAL = const(0x7)
 
-_transition_table = [
+# Flattened to one byte per entry, indexed by (current state << 2) | CLK/DT pins
+_transition_table = bytes((
 
     # |------------- NEXT STATE -------------|            |CURRENT STATE|
     # CLK/DT    CLK/DT     CLK/DT    CLK/DT
     #   00        01         10        11
-    [_R_START, _R_CCW_1, _R_CW_1,  _R_START],             # _R_START
-    [_R_CW_2,  _R_START, _R_CW_1,  _R_START],             # _R_CW_1
-    [_R_CW_2,  _R_CW_3,  _R_CW_1,  _R_START],             # _R_CW_2
-    [_R_CW_2,  _R_CW_3,  _R_START, _R_START | _DIR_CW],   # _R_CW_3
-    [_R_CCW_2, _R_CCW_1, _R_START, _R_START],             # _R_CCW_1
-    [_R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START],             # _R_CCW_2
-    [_R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW],  # _R_CCW_3
-    [_R_START, _R_START, _R_START, _R_START]]             # _R_ILLEGAL
-
-_transition_table_half_step = [
-    [_R_CW_3,            _R_CW_2,  _R_CW_1,  _R_START],
-    [_R_CW_3 | _DIR_CCW, _R_START, _R_CW_1,  _R_START],
-    [_R_CW_3 | _DIR_CW,  _R_CW_2,  _R_START, _R_START],
-    [_R_CW_3,            _R_CCW_2, _R_CCW_1, _R_START],
-    [_R_CW_3,            _R_CW_2,  _R_CCW_1, _R_START | _DIR_CW],
-    [_R_CW_3,            _R_CCW_2, _R_CW_3,  _R_START | _DIR_CCW],
-    [_R_START,           _R_START, _R_START, _R_START],
-    [_R_START,           _R_START, _R_START, _R_START]]
+    _R_START, _R_CCW_1, _R_CW_1,  _R_START,               # _R_START
+    _R_CW_2,  _R_START, _R_CW_1,  _R_START,               # _R_CW_1
+    _R_CW_2,  _R_CW_3,  _R_CW_1,  _R_START,               # _R_CW_2
+    _R_CW_2,  _R_CW_3,  _R_START, _R_START | _DIR_CW,     # _R_CW_3
+    _R_CCW_2, _R_CCW_1, _R_START, _R_START,               # _R_CCW_1
+    _R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START,               # _R_CCW_2
+    _R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW,    # _R_CCW_3
+    _R_START, _R_START, _R_START, _R_START))              # _R_ILLEGAL
+
+_transition_table_half_step = bytes((
+    _R_CW_3,            _R_CW_2,  _R_CW_1,  _R_START,
+    _R_CW_3 | _DIR_CCW, _R_START, _R_CW_1,  _R_START,
+    _R_CW_3 | _DIR_CW,  _R_CW_2,  _R_START, _R_START,
+    _R_CW_3,            _R_CCW_2, _R_CCW_1, _R_START,
+    _R_CW_3,            _R_CW_2,  _R_CCW_1, _R_START | _DIR_CW,
+    _R_CW_3,            _R_CCW_2, _R_CW_3,  _R_START | _DIR_CCW,
+    _R_START,           _R_START, _R_START, _R_START,
+    _R_START,           _R_START, _R_START, _R_START))
 
 _STATE_MASK = const(0x07)
 _DIR_MASK = const(0x30)
@@ -83,11 +85,18 @@ class Rotary(object):
         self._value = min_val
         self._state = _R_START
         self._half_step = half_step
+        self._table = _transition_table_half_step if half_step else _transition_table
         self._invert = invert
         self._listener = []
+        self._accel = ()
+        self._last_step_us = 0
+        self._last_direction = 0
 
     def set(self, value=None, min_val=None,
-            max_val=None, reverse=None, range_mode=None):
+            max_val=None, reverse=None, range_mode=None, accel=None):
+        # accel: acceleration curve as (max_interval_us, step) pairs in order of increasing
+        #   interval. A detent following the previous one in the same direction within
+        #   max_interval_us moves the value by step instead of 1. Pass () to disable.
         # disable DT and CLK pin interrupts
         self._hal_disable_irq()
 
@@ -101,7 +110,11 @@ class Rotary(object):
             self._reverse = -1 if reverse else 1
         if range_mode is not None:
             self._range_mode = range_mode
+        if accel is not None:
+            # flattened so the IRQ path can walk it without unpacking tuples
+            self._accel = tuple(x for pair in accel for x in pair)
         self._state = _R_START
+        self._last_direction = 0
 
         # enable DT and CLK pin interrupts
         self._hal_enable_irq()
@@ -123,30 +136,38 @@ class Rotary(object):
             raise ValueError('{} is not an installed listener'.format(l))
         self._listener.remove(l)
         
+    def _hal_get_clk_dt_value(self):
+        return (self._hal_get_clk_value() << 1) | self._hal_get_dt_value()
+
     def _process_rotary_pins(self, pin):
-        old_value = self._value
-        clk_dt_pins = (self._hal_get_clk_value() <<
-                       1) | self._hal_get_dt_value()
-                       
+        clk_dt_pins = self._hal_get_clk_dt_value()
+
         if self._invert:
             clk_dt_pins = ~clk_dt_pins & 0x03
-            
+
         # Determine next state
-        if self._half_step:
-            self._state = _transition_table_half_step[self._state &
-                                                      _STATE_MASK][clk_dt_pins]
-        else:
-            self._state = _transition_table[self._state &
-                                            _STATE_MASK][clk_dt_pins]
+        self._state = self._table[((self._state & _STATE_MASK) << 2) | clk_dt_pins]
         direction = self._state & _DIR_MASK
 
-        incr = 0
-        if direction == _DIR_CW:
-            incr = 1
-        elif direction == _DIR_CCW:
-            incr = -1
+        # Most edges are intermediate states of a detent
+        if direction:
+            self._step(direction)
 
-        incr *= self._reverse
+    def _step(self, direction):
+        old_value = self._value
+        incr = self._reverse if direction == _DIR_CW else -self._reverse
+
+        if self._accel:
+            now = time.ticks_us()
+            if direction == self._last_direction:
+                interval = time.ticks_diff(now, self._last_step_us)
+                accel = self._accel
+                for i in range(0, len(accel), 2):
+                    if interval < accel[i]:
+                        incr *= accel[i + 1]
+                        break
+            self._last_step_us = now
+            self._last_direction = direction
 
         if self._range_mode == self.RANGE_WRAP:
             self._value = _wrap(
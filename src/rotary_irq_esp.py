@@ -8,17 +8,38 @@
 # Documentation:
 #   https://github.com/MikeTeachman/micropython-rotary
 
-from machine import Pin
+import micropython
+import os
+from machine import Pin, mem8
 from rotary import Rotary
 from sys import platform
 
 _esp8266_deny_pins = [16]
 
+# as in rotary.py, underscore constants are inlined there and cannot be imported
+_STATE_MASK = const(0x07)
+_DIR_MASK = const(0x30)
+
+_ESP32_GPIO_IN_REG = const(0x3FF4403C)  # input levels of GPIO 0-31 on the original ESP32
+
+
+def _gpio_in_reg():
+    # the S2, S3 and C3 also report platform esp32 but have their registers elsewhere, so
+    # check the chip, which os.uname() names last, e.g. "Generic ESP32 module with ESP32"
+    if platform == 'esp32' and os.uname().machine.endswith('with ESP32'):
+        return _ESP32_GPIO_IN_REG
+    return 0
+
 
 class RotaryIRQ(Rotary):
 
     def __init__(self, pin_num_clk, pin_num_dt, min_val=0, max_val=10,
-                 reverse=False, range_mode=Rotary.RANGE_UNBOUNDED, pull_up=False, half_step=False, invert=False):
+                 reverse=False, range_mode=Rotary.RANGE_UNBOUNDED, pull_up=False, half_step=False, invert=False,
+                 native=False, fused_read=False):
+        # native: use the handler compiled by the native code emitter
+        # fused_read: read CLK and DT with a single GPIO register read. Only for the original
+        #   ESP32, with both pins in the same byte of GPIO_IN_REG (e.g. 8-15). Other
+        #   chips and pins fall back to reading each pin.
 
         if platform == 'esp8266':
             if pin_num_clk in _esp8266_deny_pins:
@@ -39,8 +60,31 @@ class RotaryIRQ(Rotary):
             self._pin_clk = Pin(pin_num_clk, Pin.IN)
             self._pin_dt = Pin(pin_num_dt, Pin.IN)
 
-        self._enable_clk_irq(self._process_rotary_pins)
-        self._enable_dt_irq(self._process_rotary_pins)
+        self._in_addr = 0
+        in_reg = _gpio_in_reg() if fused_read else 0
+        if in_reg and pin_num_clk // 8 == pin_num_dt // 8 < 4:
+            self._in_addr = in_reg + pin_num_clk // 8
+            self._clk_shift = pin_num_clk % 8
+            self._dt_shift = pin_num_dt % 8
+
+        if native:
+            self._handler = self._process_rotary_pins_native
+        else:
+            self._handler = self._process_rotary_pins
+
+        self._enable_clk_irq(self._handler)
+        self._enable_dt_irq(self._handler)
+
+    @micropython.native
+    def _process_rotary_pins_native(self, pin):
+        # same as Rotary._process_rotary_pins
+        clk_dt_pins = self._hal_get_clk_dt_value()
+        if self._invert:
+            clk_dt_pins = ~clk_dt_pins & 0x03
+        self._state = self._table[((self._state & _STATE_MASK) << 2) | clk_dt_pins]
+        direction = self._state & _DIR_MASK
+        if direction:
+            self._step(direction)
 
     def _enable_clk_irq(self, callback=None):
         self._pin_clk.irq(
@@ -64,9 +108,15 @@ class RotaryIRQ(Rotary):
     def _hal_get_dt_value(self):
         return self._pin_dt.value()
 
+    def _hal_get_clk_dt_value(self):
+        if self._in_addr:
+            levels = mem8[self._in_addr]
+            return (((levels >> self._clk_shift) & 1) << 1) | ((levels >> self._dt_shift) & 1)
+        return (self._pin_clk.value() << 1) | self._pin_dt.value()
+
     def _hal_enable_irq(self):
-        self._enable_clk_irq(self._process_rotary_pins)
-        self._enable_dt_irq(self._process_rotary_pins)
+        self._enable_clk_irq(self._handler)
+        self._enable_dt_irq(self._handler)
 
     def _hal_disable_irq(self):
         self._disable_clk_irq()
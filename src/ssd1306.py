@@ -1,7 +1,11 @@
 # MicroPython SSD1306 OLED driver, I2C and SPI interfaces
 
 from micropython import const
+from array import array
 import framebuf
+import time
+
+import uasyncio
 
 
 # register definitions
@@ -33,45 +37,63 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        # copy of what was last sent to the display, to only send pages that changed
+        self._shadow = bytearray(self.pages * self.width)
+        buffer = memoryview(self.buffer)
+        shadow = memoryview(self._shadow)
+        self._buffer_pages = [buffer[p * width : (p + 1) * width] for p in range(self.pages)]
+        self._shadow_pages = [shadow[p * width : (p + 1) * width] for p in range(self.pages)]
+        self._stale = True  # display RAM contents unknown
+        self.bytes_sent = 0  # data bytes sent by the last show()
+        self.step_us = array("L", [0] * self.pages)  # duration of each step of show_async()
+        self.steps = 0  # number of steps the last show_async() took
+        # narrow displays use centred columns
+        self._col_offset = (128 - self.width) // 2
+        # preallocated command sequences
+        self._window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        self._cmd_pair = bytearray(2)
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
     def init_display(self):
-        for cmd in (
-            SET_DISP,  # display off
-            # address setting
-            SET_MEM_ADDR,
-            0x00,  # horizontal
-            # resolution and layout
-            SET_DISP_START_LINE,  # start at line 0
-            SET_SEG_REMAP | 0x01,  # column addr 127 mapped to SEG0
-            SET_MUX_RATIO,
-            self.height - 1,
-            SET_COM_OUT_DIR | 0x08,  # scan from COM[N] to COM0
-            SET_DISP_OFFSET,
-            0x00,
-            SET_COM_PIN_CFG,
-            0x02 if self.width > 2 * self.height else 0x12,
-            # timing and driving scheme
-            SET_DISP_CLK_DIV,
-            0x80,
-            SET_PRECHARGE,
-            0x22 if self.external_vcc else 0xF1,
-            SET_VCOM_DESEL,
-            0x30,  # 0.83*Vcc
-            # display
-            SET_CONTRAST,
-            0xFF,  # maximum
-            SET_ENTIRE_ON,  # output follows RAM contents
-            SET_NORM_INV,  # not inverted
-            SET_IREF_SELECT,
-            0x30,  # enable internal IREF during display on
-            # charge pump
-            SET_CHARGE_PUMP,
-            0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,  # display on
-        ):  # on
-            self.write_cmd(cmd)
+        cmds = bytes(
+            (
+                SET_DISP,  # display off
+                # address setting
+                SET_MEM_ADDR,
+                0x00,  # horizontal
+                # resolution and layout
+                SET_DISP_START_LINE,  # start at line 0
+                SET_SEG_REMAP | 0x01,  # column addr 127 mapped to SEG0
+                SET_MUX_RATIO,
+                self.height - 1,
+                SET_COM_OUT_DIR | 0x08,  # scan from COM[N] to COM0
+                SET_DISP_OFFSET,
+                0x00,
+                SET_COM_PIN_CFG,
+                0x02 if self.width > 2 * self.height else 0x12,
+                # timing and driving scheme
+                SET_DISP_CLK_DIV,
+                0x80,
+                SET_PRECHARGE,
+                0x22 if self.external_vcc else 0xF1,
+                SET_VCOM_DESEL,
+                0x30,  # 0.83*Vcc
+                # display
+                SET_CONTRAST,
+                0xFF,  # maximum
+                SET_ENTIRE_ON,  # output follows RAM contents
+                SET_NORM_INV,  # not inverted
+                SET_IREF_SELECT,
+                0x30,  # enable internal IREF during display on
+                # charge pump
+                SET_CHARGE_PUMP,
+                0x10 if self.external_vcc else 0x14,
+                SET_DISP | 0x01,  # display on
+            )
+        )
+        self.write_cmds(cmds)
+        self._stale = True
         self.fill(0)
         self.show()
 
@@ -82,31 +104,90 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self._cmd_pair[0] = SET_CONTRAST
+        self._cmd_pair[1] = contrast
+        self.write_cmds(self._cmd_pair)
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
     def rotate(self, rotate):
-        self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
-        self.write_cmd(SET_SEG_REMAP | (rotate & 1))
-
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width != 128:
-            # narrow displays use centred columns
-            col_offset = (128 - self.width) // 2
-            x0 += col_offset
-            x1 += col_offset
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self._cmd_pair[0] = SET_COM_OUT_DIR | ((rotate & 1) << 3)
+        self._cmd_pair[1] = SET_SEG_REMAP | (rotate & 1)
+        self.write_cmds(self._cmd_pair)
+
+    def show(self, full=False):
+        """
+        Send the frame buffer to the display.
+
+        Only the column span that changed within each page is sent, unless full is set or the
+        display contents are unknown.
+        """
+        if full or self._stale:
+            self._set_window(0, self.width - 1, 0, self.pages - 1)
+            self.write_data(self.buffer)
+            self._shadow[:] = self.buffer
+            self._stale = False
+            self.bytes_sent = len(self.buffer)
+            return
+        sent = 0
+        for page in range(self.pages):
+            sent += self._show_page(page)
+        self.bytes_sent = sent
+
+    async def show_async(self, budget_us=0, full=False):
+        """
+        Send the frame buffer like show(), yielding to the event loop between pages.
+
+        Pages are sent until a step has taken budget_us, then the event loop gets to run other
+        tasks before the next step. With the default budget of 0 every page is its own step, so
+        no other task waits longer than a single page transfer. Per-step durations are kept in
+        step_us for profiling.
+        """
+        full = full or self._stale
+        self._stale = False
+        sent = 0
+        steps = 0
+        start = time.ticks_us()
+        for page in range(self.pages):
+            sent += self._show_page(page, full)
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            if elapsed >= budget_us and page < self.pages - 1:
+                self.step_us[steps] = elapsed
+                steps += 1
+                await uasyncio.sleep_ms(0)
+                start = time.ticks_us()
+        self.step_us[steps] = time.ticks_diff(time.ticks_us(), start)
+        self.steps = steps + 1
+        self.bytes_sent = sent
+
+    def _show_page(self, page, full=False):
+        current = self._buffer_pages[page]
+        shown = self._shadow_pages[page]
+        if full:
+            x0 = 0
+            x1 = self.width - 1
+        else:
+            if current == shown:
+                return 0
+            x0 = 0
+            while current[x0] == shown[x0]:
+                x0 += 1
+            x1 = self.width - 1
+            while current[x1] == shown[x1]:
+                x1 -= 1
+        self._set_window(x0, x1, page, page)
+        self.write_data(current[x0 : x1 + 1])
+        shown[x0 : x1 + 1] = current[x0 : x1 + 1]
+        return x1 - x0 + 1
+
+    def _set_window(self, x0, x1, page0, page1):
+        window = self._window
+        window[1] = x0 + self._col_offset
+        window[2] = x1 + self._col_offset
+        window[4] = page0
+        window[5] = page1
+        self.write_cmds(window)
 
 
 class SSD1306_I2C(SSD1306):
@@ -115,6 +196,7 @@ class SSD1306_I2C(SSD1306):
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.write_cmds_list = [b"\x00", None]  # Co=0, D/C#=0
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
@@ -122,6 +204,11 @@ class SSD1306_I2C(SSD1306):
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # a single control byte, then all commands in the same transaction
+        self.write_cmds_list[1] = cmds
+        self.i2c.writevto(self.addr, self.write_cmds_list)
+
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
@@ -144,14 +231,19 @@ class SSD1306_SPI(SSD1306):
         self.res(0)
         time.sleep_ms(10)
         self.res(1)
+        self.temp = bytearray(1)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
+        self.temp[0] = cmd
+        self.write_cmds(self.temp)
+
+    def write_cmds(self, cmds):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(cmds)
         self.cs(1)
 
     def write_data(self, buf):
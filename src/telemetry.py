@@ -0,0 +1,211 @@
+# KISS ESC telemetry, as sent by BLHeli_32 and KISS ESCs on request of the DShot telemetry bit.
+# https://www.rcgroups.com/forums/showthread.php?2555162-KISS-ESC-24A-Race-Edition
+#
+# Each frame is 10 bytes:
+#   0: temperature (C)
+#   1-2: voltage (0.01 V)
+#   3-4: current (0.01 A)
+#   5-6: consumption (mAh)
+#   7-8: eRPM (100 eRPM)
+#   9: CRC8 of bytes 0-8
+
+import time
+
+_FRAME_LEN = 10
+
+
+def _crc8_table():
+    """CRC8 lookup table for polynomial 0x07, as used by KISS telemetry."""
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) if crc & 0x80 else (crc << 1)
+            crc &= 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+_CRC8 = _crc8_table()
+
+
+class KissTelemetry:
+    """
+    Incremental KISS telemetry parser.
+
+    Bytes are read from the UART into a preallocated ring buffer and frames are found by their
+    CRC, so the parser resynchronises by itself after a partial or corrupted frame. Ten zero bytes
+    also pass the CRC, so all-zero frames, e.g. from an idle or shorted line, are rejected too.
+    The fields of the latest frame are kept as integers, so decoding does not allocate.
+
+    It also schedules telemetry requests: request() only asks for a new frame once the previous
+    one has arrived or timed out, so replies never queue up behind each other on the wire.
+    Scheduling is off when the DShot packet loops in hardware: the looped packet then always
+    carries the request, so toggling it does not force packet rewrites, and the ESC replies once
+    per loop period.
+    """
+
+    def __init__(
+        self, uart, motor_poles=14, size=64, baudrate=115200, timeout_us=None, scheduled=True
+    ):
+        """
+        Args:
+            uart: UART the ESC telemetry wire is connected to.
+            motor_poles: Number of magnet poles of the motor, to convert eRPM to RPM.
+            size: Ring buffer size in bytes, must be a power of two.
+            baudrate: Baud rate of the UART, to work out how long a reply takes.
+            timeout_us: How long to wait for a reply before requesting another one. Defaults to
+                four times the wire time of a frame.
+            scheduled: Whether request() schedules requests. If not, it always asks for a frame
+                and every frame is timestamped as unsolicited. The requests must then come no
+                faster than frame_us apart, e.g. from a DShot packet looped at a longer period.
+        """
+        if size & (size - 1) or size < _FRAME_LEN:
+            raise ValueError("size must be a power of two of at least {}".format(_FRAME_LEN))
+        self.uart = uart
+        self._pole_pairs = motor_poles // 2
+
+        # 10 bits per byte with start and stop bits
+        self.frame_us = _FRAME_LEN * 10 * 1000000 // baudrate
+        self._timeout_us = 4 * self.frame_us if timeout_us is None else timeout_us
+        self.scheduled = scheduled
+        self._pending = False
+        self._request_us = 0
+
+        self._buffer = bytearray(size)
+        view = memoryview(self._buffer)
+        self._views = [view[i:] for i in range(size)]  # readinto targets, one per start index
+        self._mask = size - 1
+        self._head = 0  # next index to write
+        self._tail = 0  # first unparsed index
+        self._count = 0  # number of unparsed bytes
+        self._synced = False
+
+        # latest frame
+        self.temperature = 0  # degrees Celsius
+        self.voltage = 0  # 0.01 V
+        self.current = 0  # 0.01 A, only available if the ESC has a current meter
+        self.consumption = 0  # mAh, only available if the ESC has a current meter
+        self.erpm = 0
+        self.rpm = 0
+        self.timestamp_us = 0  # ticks_us() at which the ESC took the latest sample
+        self.interval_us = 0  # time between the latest two samples, 0 until there are two
+        self.latency_us = 0  # time from request to decoded reply for the latest frame
+        self.max_latency_us = 0
+
+        self.frames = 0  # valid frames
+        self.dropped = 0  # valid frames replaced by a newer one within the same poll
+        self.corrupt = 0  # CRC failures while in sync
+        self.skipped = 0  # bytes discarded while searching for a frame boundary
+        self.requests = 0  # telemetry requests sent
+        self.timeouts = 0  # requests that were not answered in time
+
+    def request(self, now=None):
+        """
+        Decide whether the next DShot packet should request telemetry.
+
+        Args:
+            now: Current ticks_us(), looked up if not given.
+
+        Returns:
+            True if a request should be sent, in which case it is counted as outstanding.
+        """
+        if not self.scheduled:
+            return True
+        if now is None:
+            now = time.ticks_us()
+        if self._pending:
+            if time.ticks_diff(now, self._request_us) < self._timeout_us:
+                return False
+            self.timeouts += 1
+        self._pending = True
+        self._request_us = now
+        self.requests += 1
+        return True
+
+    def poll(self, now=None):
+        """
+        Read all available bytes and decode any complete frames.
+
+        Args:
+            now: Current ticks_us(), looked up if not given.
+
+        Returns:
+            True if at least one new frame was decoded.
+        """
+        new = 0
+        while True:
+            read = self._read()
+            new += self._parse()
+            if not read:
+                break
+        if not new:
+            return False
+
+        if now is None:
+            now = time.ticks_us()
+        previous_us = self.timestamp_us
+        if self._pending:
+            # the ESC samples when it receives the request
+            self._pending = False
+            self.timestamp_us = self._request_us
+            self.latency_us = time.ticks_diff(now, self._request_us)
+            self.max_latency_us = max(self.max_latency_us, self.latency_us)
+        else:
+            # unsolicited reply, it was at least sampled before it was sent
+            self.timestamp_us = time.ticks_add(now, -self.frame_us)
+        if self.frames > new:
+            self.interval_us = time.ticks_diff(self.timestamp_us, previous_us)
+        if new > 1:
+            self.dropped += new - 1
+        return True
+
+    def _read(self):
+        size = self._mask + 1
+        available = self.uart.any()
+        if not available or self._count == size:
+            return 0
+        # read up to the end of the buffer, the next call wraps around
+        n = min(available, size - self._count, size - self._head)
+        n = self.uart.readinto(self._views[self._head], n)
+        if not n:
+            return 0
+        self._head = (self._head + n) & self._mask
+        self._count += n
+        return n
+
+    def _parse(self):
+        buffer = self._buffer
+        mask = self._mask
+        new = 0
+        while self._count >= _FRAME_LEN:
+            tail = self._tail
+            crc = 0
+            bits = 0
+            for i in range(_FRAME_LEN - 1):
+                byte = buffer[(tail + i) & mask]
+                crc = _CRC8[crc ^ byte]
+                bits |= byte
+            if crc != buffer[(tail + _FRAME_LEN - 1) & mask] or not bits:
+                if self._synced:
+                    self.corrupt += 1
+                    self._synced = False
+                # slide one byte and try again
+                self._tail = (tail + 1) & mask
+                self._count -= 1
+                self.skipped += 1
+                continue
+
+            self.temperature = buffer[tail]
+            self.voltage = (buffer[(tail + 1) & mask] << 8) | buffer[(tail + 2) & mask]
+            self.current = (buffer[(tail + 3) & mask] << 8) | buffer[(tail + 4) & mask]
+            self.consumption = (buffer[(tail + 5) & mask] << 8) | buffer[(tail + 6) & mask]
+            self.erpm = ((buffer[(tail + 7) & mask] << 8) | buffer[(tail + 8) & mask]) * 100
+            self.rpm = self.erpm // self._pole_pairs
+
+            self._tail = (tail + _FRAME_LEN) & mask
+            self._count -= _FRAME_LEN
+            self._synced = True
+            self.frames += 1
+            new += 1
+        return new
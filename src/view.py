@@ -0,0 +1,48 @@
+import framebuf
+
+_backgrounds = {}  # rendered static layers, shared between views drawing the same one
+
+
+class View:
+    """
+    A screen made of a static layer and dynamic fields.
+
+    The static layer (labels, header bars) is rendered once into a cached frame buffer and blitted
+    when the view is entered. After that only the dynamic fields are redrawn, each clearing its
+    own bounding box first, so the rest of the frame buffer stays byte-identical between frames.
+    """
+
+    def __init__(self, draw_static, draw_dynamic, width=128, height=64):
+        """
+        Args:
+            draw_static: Function drawing the static layer, called as draw_static(fb).
+            draw_dynamic: Function drawing the dynamic fields, called as
+                draw_dynamic(fb, state, rotary).
+            width: Width of the display in pixels.
+            height: Height of the display in pixels.
+        """
+        self.draw_static = draw_static
+        self.draw_dynamic = draw_dynamic
+        self.width = width
+        self.height = height
+
+    def background(self):
+        """The rendered static layer, rendered on first use."""
+        background = _backgrounds.get(self.draw_static)
+        if background is None:
+            buffer = bytearray(self.width * self.height // 8)
+            background = framebuf.FrameBuffer(buffer, self.width, self.height, framebuf.MONO_VLSB)
+            self.draw_static(background)
+            _backgrounds[self.draw_static] = background
+        return background
+
+    def render(self, fb, state, rotary, full=False):
+        """
+        Draw the view into fb.
+
+        Args:
+            full: Whether to draw the static layer too, e.g. when the view was just entered.
+        """
+        if full:
+            fb.blit(self.background(), 0, 0)
+        self.draw_dynamic(fb, state, rotary)
@@ -0,0 +1,159 @@
+import time
+
+FAULT_TELEMETRY = 1  # no telemetry frame within the timeout while the motor is driven
+FAULT_TEMPERATURE = 2  # ESC temperature over the limit
+FAULT_VOLTAGE = 4  # supply voltage under the limit
+FAULT_RPM = 8  # RPM away from the setpoint and not getting closer
+
+# display names of the fault bits, in display order
+FAULT_NAMES = (
+    (FAULT_TELEMETRY, "No telemetry"),
+    (FAULT_TEMPERATURE, "ESC too hot"),
+    (FAULT_VOLTAGE, "Low voltage"),
+    (FAULT_RPM, "RPM diverged"),
+)
+
+
+def _onset(since, bad, now):
+    # when a condition started, or None while it does not hold
+    if not bad:
+        return None
+    return now if since is None else since
+
+
+class Watchdog:
+    """
+    Latching fault supervisor for the motor, checked by the control loop on every step.
+
+    Each check only compares small ints, so it costs next to nothing next to the rest of the
+    step, and a fault cuts the throttle in the step that detects it. The worst-case time from a
+    fault to the throttle cut is therefore the timeout for lost telemetry, one telemetry interval
+    plus filter_ms for temperature and voltage, and diverge_ms for the RPM, each plus one step.
+
+    Lost telemetry is counted while the motor is driven, and while it is not only until the ESC
+    sends its first frame, with a longer timeout so it has time to start up. The RPM is faulted
+    when it is out of a band around the setpoint and has not moved towards it for diverge_ms,
+    which catches a stalled or runaway motor without tripping on an ordinary spin-up, or on a
+    ramp the motor follows at a distance. A setpoint step larger than the band restarts that
+    timer, a ramp does not, so a motor that jams while it ramps is caught too.
+
+    Faults latch until clear() is called. check() is meant to be called by the control loop and
+    clear() by the user interface, so each field has a single writer.
+    """
+
+    def __init__(
+        self,
+        timeout_ms=50,
+        max_temperature=90,
+        min_voltage=0,
+        filter_ms=10,
+        rpm_tolerance=0.2,
+        min_rpm_band=300,
+        diverge_ms=2000,
+        boot_timeout_ms=3000,
+    ):
+        """
+        Args:
+            timeout_ms: Longest time without a telemetry frame while the motor is driven.
+            max_temperature: Highest ESC temperature in degrees Celsius, 0 to not check it.
+            min_voltage: Lowest supply voltage in 0.01 V, 0 to not check it.
+            filter_ms: How long the temperature or voltage has to stay over its limit to fault,
+                so a single sample during a load transient does not stop a run.
+            rpm_tolerance: Half width of the band around the setpoint, as a fraction of it.
+            min_rpm_band: Smallest half width of the band in RPM.
+            diverge_ms: How long the RPM may stay out of the band without getting closer.
+            boot_timeout_ms: Longest time for the ESC to send its first frame, even while the
+                motor is not driven, so a missing ESC shows before a run is started.
+        """
+        self.timeout_us = timeout_ms * 1000
+        self.max_temperature = max_temperature
+        self.min_voltage = min_voltage
+        self.filter_us = filter_ms * 1000
+        self.rpm_tolerance = rpm_tolerance
+        self.min_rpm_band = min_rpm_band
+        self.diverge_us = diverge_ms * 1000
+        self.boot_timeout_us = boot_timeout_ms * 1000
+        self.faults = 0  # latched fault bits
+        self.trips = 0  # times a fault has latched
+
+        self._frames = -1
+        self._frame_us = 0
+        self._temperature_us = None  # since when the temperature has been over the limit
+        self._voltage_us = None  # since when the voltage has been under the limit
+        self._target = -1
+        self._band = min_rpm_band
+        self._best_rpm = 0  # RPM when it last moved towards the setpoint
+        self._best_us = 0
+        self._clear = False
+
+    def clear(self):
+        """Clear the latched faults at the next check. A fault that still holds latches again."""
+        self._clear = True
+
+    def check(self, now, telemetry, target_rpm, rpm, throttle):
+        """
+        Check for new faults.
+
+        Args:
+            now: Current ticks_us().
+            telemetry: KissTelemetry, polled earlier in the step.
+            target_rpm: Setpoint of the step.
+            rpm: Measured or estimated RPM.
+            throttle: Throttle sent in the previous step.
+
+        Returns:
+            The latched fault bits. While they are not 0 the throttle has to stay cut.
+        """
+        if self._clear:
+            self._clear = False
+            self.faults = 0
+            self._temperature_us = None
+            self._voltage_us = None
+            self._target = -1
+        faults = 0
+
+        frames = telemetry.frames
+        if frames != self._frames or (frames and not throttle):
+            self._frames = frames
+            self._frame_us = now
+            # the limits are only compared when a frame brings new values, before the first
+            # one the fields still hold zeros
+            if frames:
+                self._temperature_us = _onset(
+                    self._temperature_us,
+                    self.max_temperature and telemetry.temperature > self.max_temperature,
+                    now,
+                )
+                self._voltage_us = _onset(
+                    self._voltage_us, telemetry.voltage < self.min_voltage, now
+                )
+        elif time.ticks_diff(now, self._frame_us) > (
+            self.timeout_us if throttle else self.boot_timeout_us
+        ):
+            faults |= FAULT_TELEMETRY
+        since = self._temperature_us
+        if since is not None and time.ticks_diff(now, since) >= self.filter_us:
+            faults |= FAULT_TEMPERATURE
+        since = self._voltage_us
+        if since is not None and time.ticks_diff(now, since) >= self.filter_us:
+            faults |= FAULT_VOLTAGE
+
+        restart = False
+        if target_rpm != self._target:
+            # a ramp moves the setpoint a little on every step, only a step restarts the timer
+            restart = self._target < 0 or abs(target_rpm - self._target) > self._band
+            self._target = target_rpm
+            self._band = max(int(self.rpm_tolerance * target_rpm), self.min_rpm_band)
+        # how far the RPM has moved towards the setpoint since it last did
+        moved = rpm - self._best_rpm if target_rpm > rpm else self._best_rpm - rpm
+        if restart or abs(target_rpm - rpm) <= self._band or moved > self._band >> 3:
+            # within the band or still converging
+            self._best_rpm = rpm
+            self._best_us = now
+        elif time.ticks_diff(now, self._best_us) > self.diverge_us:
+            faults |= FAULT_RPM
+
+        if faults & ~self.faults:
+            self.trips += 1
+        self.faults |= faults
+        return self.faults
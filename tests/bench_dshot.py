@@ -0,0 +1,128 @@
+"""
+Packets per second of the DShot encoder, and what it allocates, against the driver it replaced.
+
+Run with python3 tests/bench_dshot.py. The original driver is the _send() the repository started
+with, building a new list per packet from 2**i bit masks. The RMT does nothing but keep every
+pulse list it is given, so the encoding alone is timed, and in a second pass the pulse lists
+allocated per packet are counted and the bytes they hold traced with tracemalloc. The script
+also runs under the MicroPython unix port, e.g. MICROPYPATH=src:tests/stubs micropython
+tests/bench_dshot.py, which reports the heap bytes allocated per packet instead.
+"""
+import gc
+import time
+
+try:
+    import host  # noqa: F401
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # MicroPython, with src on MICROPYPATH
+
+from dshot import Dshot
+
+N = 20000
+
+
+class KeepingRMT:
+    """Keeps every pulse list written, so allocating one per packet shows up."""
+
+    def __init__(self):
+        self.kept = [None] * N  # preallocated, so keeping them does not allocate
+        self.count = 0
+
+    def reset(self):
+        for i in range(N):
+            self.kept[i] = None
+        self.count = 0
+
+    def write_pulses(self, durations, data=True):
+        self.kept[self.count % N] = durations
+        self.count += 1
+
+    def loop(self, enable):
+        pass
+
+
+class OriginalDshot(Dshot):
+    """The driver as it was, set up for DShot300 with clock divider 7."""
+
+    def __init__(self, rmt):
+        self._ON_PULSES = 57  # number of pulses for an ON bit
+        self._OFF_PULSES = 29  # number of pulses for an OFF bit
+        self._BIT_PULSES = 76  # total number of pulses per bit
+        self._PAUSE_PULSES = 21  # pause after sending packet
+        self.rmt = rmt
+
+    def set_throttle(self, value: float, telemetry=True):
+        value = self._encode_throttle(value)
+        value = self._create_packet(value)
+        self._send(value)
+
+    def _create_packet(self, value, telemetry=True):
+        # add telemetry bit
+        value = (value << 1) | telemetry
+
+        # add CRC (Cyclic Redundancy Check)
+        crc = (value ^ (value >> 4) ^ (value >> 8)) & 0x0F
+        value = (value << 4) | crc
+
+        return value
+
+    def _send(self, value):
+        """
+        Send value to ESC.
+        """
+        duration = []
+
+        for i in reversed(range(16)):
+            bit = (value & (2**i)) == 2**i  # select bit
+            if bit == 1:
+                duration += [self._ON_PULSES, self._BIT_PULSES - self._ON_PULSES]
+            else:
+                duration += [self._OFF_PULSES, self._BIT_PULSES - self._OFF_PULSES]
+
+        duration[-1] += self._PAUSE_PULSES
+
+        self.rmt.write_pulses(duration, True)
+
+
+def run(name, dshot):
+    throttles = [i % 2000 / 2000 for i in range(N)]
+    send = dshot.set_throttle
+    rmt = dshot.rmt
+    start = time.ticks_us()
+    for throttle in throttles:
+        send(throttle)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    line = "{:<10} {:>9.0f} packets/s".format(name, N * 1e6 / elapsed)
+    rmt.reset()
+    gc.collect()
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for throttle in throttles:
+            send(throttle)
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        lists = len(set(id(durations) for durations in rmt.kept))
+        line += "  {:.2f} pulse lists/packet, {:.0f} bytes/packet".format(
+            lists / N, retained / N
+        )
+    else:
+        gc.disable()
+        before = gc.mem_alloc()
+        for throttle in throttles[:200]:
+            send(throttle)
+        line += "  {:.1f} heap bytes/packet".format((gc.mem_alloc() - before) / 200)
+        gc.enable()
+    print(line)
+
+
+def main():
+    Dshot._arm = lambda self, duration=2: self.set_throttle(0)
+    run("original", OriginalDshot(KeepingRMT()))
+    run("table", Dshot(pin=None, rate=300, rmt=KeepingRMT()))
+
+
+if __name__ == "__main__":
+    main()
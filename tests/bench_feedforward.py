@@ -0,0 +1,33 @@
+"""
+Settling time of the deposit to coating step on a simulated motor, with and without the learned
+feed-forward table.
+
+Run with python3 tests/bench_feedforward.py. The motor is the first-order model with ESC delay
+and telemetry frames from test_pid.py, the controller uses the gains in config.json, and each
+cycle steps from 1000 to 6000 RPM and back. The table starts empty and learns as the cycles go.
+The last run starts from a table learned on a motor that needed 30% more throttle.
+"""
+import host  # noqa: F401
+
+from feedforward import FeedForward
+from test_feedforward import SpeedLoop, stale_table
+
+CYCLES = 4
+
+
+def run(name, loop):
+    times = []
+    for _ in range(CYCLES):
+        loop.settle(1000)
+        times.append(loop.settle(6000, 6000))
+    print("{:<14} {} ms to within 1% of 6000 RPM".format(name, ", ".join(map(str, times))))
+
+
+def main():
+    run("no table", SpeedLoop())
+    run("learned table", SpeedLoop(FeedForward()))
+    run("stale table", SpeedLoop(stale_table()))
+
+
+if __name__ == "__main__":
+    main()
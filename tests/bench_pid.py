@@ -0,0 +1,79 @@
+"""
+Calls per second of the PID update, through the PID wrapper and the simple, general and
+fixed-point paths of PIDCore, and what each allocates.
+
+Run with python3 tests/bench_pid.py on the host, which reports the peak memory traced by
+tracemalloc over 100 calls beyond an empty loop, as test_numfield.py measures the number fields.
+CPython boxes ints above 256 and keeps freed floats on a free list, so the figures only compare
+the paths with each other. The script also runs under the MicroPython unix port, e.g.
+MICROPYPATH=src micropython tests/bench_pid.py, which reports the heap bytes allocated per call
+instead: floats are boxed there, while the fixed-point update only makes small ints and should
+report 0.
+"""
+import gc
+import time
+
+try:
+    import host  # noqa: F401
+    from test_numfield import peak_allocation
+except ImportError:
+    peak_allocation = None  # MicroPython, with src on MICROPYPATH
+
+from pid import FIXED_ONE, PID, PIDCore
+
+N = 20000
+GAINS = {"Kp": 1e-4, "Ki": 1e-3, "Kd": 2e-6}
+
+
+def inputs():
+    # a motor settling on the setpoint, as integer RPM readings
+    rpm = 0.0
+    readings = []
+    for _ in range(200):
+        rpm += (5000 - rpm) * 0.02
+        readings.append(int(rpm))
+    return readings
+
+
+def run(name, update, readings):
+    for rpm in readings:
+        update(rpm)  # warm up
+    gc.collect()
+    start = time.ticks_us()
+    for _ in range(N // len(readings)):
+        for rpm in readings:
+            update(rpm)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    calls = N // len(readings) * len(readings)
+    line = "{:<12} {:>9.0f} calls/s".format(name, calls * 1e6 / elapsed)
+    if hasattr(gc, "mem_alloc"):
+        gc.disable()
+        before = gc.mem_alloc()
+        for rpm in readings:
+            update(rpm)
+        line += "  {:.1f} heap bytes/call".format((gc.mem_alloc() - before) / len(readings))
+        gc.enable()
+    elif peak_allocation is not None:
+        rpm = readings[-1]
+        line += "  {:>4} bytes peak over 100 calls".format(peak_allocation(lambda: update(rpm)))
+    print(line)
+
+
+def main():
+    readings = inputs()
+    pid = PID(setpoint=5000, sample_time=None, output_limits=(0, 1), **GAINS)
+    core = PIDCore(setpoint=5000, output_limits=(0, 1), **GAINS)
+    general = PIDCore(
+        setpoint=5000, output_limits=(0, 1), proportional_on_measurement=True, **GAINS
+    )
+    fixed = PIDCore(setpoint=5000, output_limits=(0, 1), fixed_point=True, **GAINS)
+    run("PID", lambda rpm: pid(rpm, 0.001), readings)
+    run("PIDCore", lambda rpm: core.update(rpm, 0.001), readings)
+    run("general", lambda rpm: general.update(rpm, 0.001), readings)
+    run("fixed point", lambda rpm: fixed.update(rpm, 1000), readings)
+    print("fixed point output {:.4f}, float {:.4f}".format(
+        fixed.update(5000, 1000) / FIXED_ONE, core.update(5000, 0.001)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Edges per second of the rotary encoder interrupt handler, against the decoder it replaced.
+
+Run with python3 tests/bench_rotary.py. A recorded session of a knob turned back and forth,
+with contact bounce, is replayed through each handler, and the values after every edge must
+match those of the original decoder. On the host the native emitter does nothing, so the native
+handler only shows the cost of the shared code; on the board it is the fastest of the three.
+"""
+import time
+
+import host  # noqa: F401
+
+import micropython
+from rotary import _bound, _trigger, _wrap
+from rotary_irq_esp import RotaryIRQ
+from test_rotary import (
+    REFERENCE_TABLE,
+    REFERENCE_TABLE_HALF_STEP,
+    ReferenceRotary,
+    make_rotary,
+    recorded_edges,
+)
+
+DETENTS = 20000
+
+
+class OriginalRotaryIRQ(RotaryIRQ):
+    """The encoder with the interrupt handler it had before, reading the same pins."""
+
+    def _process_rotary_pins(self, pin):
+        old_value = self._value
+        clk_dt_pins = (self._hal_get_clk_value() << 1) | self._hal_get_dt_value()
+        if self._invert:
+            clk_dt_pins = ~clk_dt_pins & 0x03
+        if self._half_step:
+            self._state = REFERENCE_TABLE_HALF_STEP[self._state & 0x07][clk_dt_pins]
+        else:
+            self._state = REFERENCE_TABLE[self._state & 0x07][clk_dt_pins]
+        direction = self._state & 0x30
+        incr = 0
+        if direction == 0x10:
+            incr = 1
+        elif direction == 0x20:
+            incr = -1
+        incr *= self._reverse
+        if self._range_mode == self.RANGE_WRAP:
+            self._value = _wrap(self._value, incr, self._min_val, self._max_val)
+        elif self._range_mode == self.RANGE_BOUNDED:
+            self._value = _bound(self._value, incr, self._min_val, self._max_val)
+        else:
+            self._value = self._value + incr
+        try:
+            if old_value != self._value and len(self._listener) != 0:
+                micropython.schedule(_trigger, self)
+        except:  # noqa: E722
+            pass
+
+
+def run(name, edges, process):
+    start = time.perf_counter()
+    values = [process(clk, dt) for _, clk, dt in edges]
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>9.0f} edges/s".format(name, len(edges) / elapsed))
+    return values
+
+
+def handler(rotary):
+    clk = rotary._pin_clk
+    dt = rotary._pin_dt
+    process = rotary._handler
+
+    def process_edge(clk_level, dt_level):
+        clk.level = clk_level
+        dt.level = dt_level
+        process(clk)
+        return rotary._value
+
+    return process_edge
+
+
+def main():
+    edges = recorded_edges(DETENTS)
+    for options in ({}, {"half_step": True}):
+        print("half step" if options else "full step", "{} edges".format(len(edges)))
+        reference = ReferenceRotary(**options)
+        expected = [reference.process(clk, dt) for _, clk, dt in edges]
+        run("original", edges, handler(OriginalRotaryIRQ(12, 13, **options)))
+        for native in (False, True):
+            name = "native" if native else "handler"
+            values = run(name, edges, handler(make_rotary(native=native, **options)))
+            print("{:<10} {}".format("", "matches" if values == expected else "DIFFERS"))
+
+
+if __name__ == "__main__":
+    main()
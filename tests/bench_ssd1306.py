@@ -0,0 +1,39 @@
+"""
+I2C traffic per frame of the SSD1306 driver on a fake bus.
+
+Run with python3 tests/bench_ssd1306.py. Each frame redraws a 5 digit RPM readout, as the
+recipe screen does, and the original driver is modelled as what it sent for every frame: six
+single-command transactions for the window and the whole buffer.
+"""
+import host  # noqa: F401
+
+from machine import I2C
+from ssd1306 import SSD1306_I2C
+
+FRAMES = 100
+
+
+def main():
+    i2c = I2C()
+    display = SSD1306_I2C(128, 64, i2c)
+    init_transactions = len(i2c.transactions)
+    display.text("RPM:", 0, 24, 1)
+    display.show()
+    i2c.reset()
+    for i in range(FRAMES):
+        display.fill_rect(40, 20, 80, 16, 0)
+        display.text("{:>5}".format(3000 + 7 * i), 40, 24, 1)
+        display.show()
+    print("init: {} transactions".format(init_transactions))
+    print(
+        "per frame: {:.1f} bytes in {:.1f} transactions, original driver {} bytes in {}".format(
+            i2c.bytes_sent() / FRAMES,
+            len(i2c.transactions) / FRAMES,
+            6 * 2 + 1 + 128 * 64 // 8,
+            7,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
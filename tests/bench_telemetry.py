@@ -0,0 +1,45 @@
+"""
+Throughput of the KISS telemetry parser on a synthetic byte stream with injected noise.
+
+Run with python3 tests/bench_telemetry.py. The stream is fed one frame at a time, as the UART
+would deliver it, with a burst of random bytes before one frame in ten.
+"""
+import random
+import time
+
+import host  # noqa: F401
+
+from machine import UART
+from telemetry import KissTelemetry
+from test_telemetry import frame
+
+FRAMES = 20000
+
+
+def main():
+    random.seed(1)
+    chunks = []
+    for _ in range(FRAMES):
+        chunk = b""
+        if random.random() < 0.1:
+            chunk = bytes(random.randrange(256) for _ in range(random.randrange(1, 12)))
+        chunks.append(chunk + frame(erpm=100 * random.randrange(1, 600)))
+    total = sum(len(chunk) for chunk in chunks)
+
+    uart = UART(1)
+    telemetry = KissTelemetry(uart)
+    start = time.perf_counter()
+    for chunk in chunks:
+        uart.feed(chunk)
+        telemetry.poll()
+    elapsed = time.perf_counter() - start
+    print("{:.0f} bytes/s, {:.0f} frames/s".format(total / elapsed, telemetry.frames / elapsed))
+    print(
+        "{} frames sent, {} decoded, {} corrupt, {} bytes skipped".format(
+            FRAMES, telemetry.frames, telemetry.corrupt, telemetry.skipped
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Render time per frame of the coating screen, redrawn in full as before against cached layers.
+
+Run with python3 tests/bench_views.py. framebuf is the pure-Python stand-in, so the absolute
+times are far slower than on the board, where framebuf is native code. The comparison still
+shows how much less drawing each frame does, and the pixel writes per frame are counted too.
+Both renderers must produce identical frames.
+"""
+import time
+
+import host  # noqa: F401
+
+import framebuf
+from numfield import NumberField
+from view import View
+
+FRAMES = 1000
+
+
+def coating_full(fb, rpm, timer):
+    # the original coating_view, after display.fill(0)
+    fb.fill(0)
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Coating", 36, 3, 0)
+    fb.text("RPM:{: >{w}.0f}".format(rpm, w=5), 30, 27, 1)
+    fb.text("{: >{w}} sec".format(timer, w=4), 30, 48, 1)
+
+
+def draw_coating(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("Coating", 36, 3, 0)
+    fb.text("RPM:", 30, 27, 1)
+    fb.text("sec", 70, 48, 1)
+
+
+# the same layout as the original, so both draw identical frames
+rpm_field = NumberField(62, 27, 5)
+timer_field = NumberField(30, 48, 4)
+
+
+def coating_status(fb, state, rotary):
+    rpm_field.draw(fb, state["rpm"])
+    timer_field.draw(fb, state["timer"])
+
+
+class CountingFrameBuffer(framebuf.FrameBuffer):
+    writes = 0
+
+    def pixel(self, x, y, c=None):
+        if c is not None:
+            self.writes += 1
+        return super().pixel(x, y, c)
+
+
+def run(name, render):
+    buffer = bytearray(128 * 64 // 8)
+    fb = framebuf.FrameBuffer(buffer, 128, 64, framebuf.MONO_VLSB)
+    render(fb, 0, True)
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        render(fb, i, False)
+    elapsed = time.perf_counter() - start
+
+    # again with a counting frame buffer, keeping each frame
+    fb = CountingFrameBuffer(buffer, 128, 64, framebuf.MONO_VLSB)
+    render(fb, 0, True)
+    fb.writes = 0
+    frames = []
+    for i in range(FRAMES):
+        render(fb, i, False)
+        frames.append(bytes(buffer))
+    print(
+        "{:<8} {:.3f} ms per frame, {:.0f} pixel writes per frame".format(
+            name, 1000 * elapsed / FRAMES, fb.writes / FRAMES
+        )
+    )
+    return frames
+
+
+def main():
+    def render_full(fb, i, full):
+        coating_full(fb, 3000 + i, 60 - i // 4)
+
+    view = View(draw_coating, coating_status)
+
+    def render_view(fb, i, full):
+        view.render(fb, {"rpm": 3000 + i, "timer": 60 - i // 4}, None, full=full)
+
+    full = run("full", render_full)
+    layered = run("layered", render_view)
+    print("identical frames:", full == layered)
+
+
+if __name__ == "__main__":
+    main()
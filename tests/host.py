@@ -0,0 +1,83 @@
+"""
+Host setup for running the firmware modules under CPython.
+
+Puts the MicroPython stand-ins in stubs/ and the firmware in src/ on the import path, and adds
+const() and the MicroPython-only functions of the time module. Imported by conftest.py for the
+tests and at the top of each benchmark script.
+"""
+import builtins
+import os
+import sys
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_HERE, "..", "src"), os.path.join(_HERE, "stubs")):
+    _path = os.path.normpath(_path)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+# MicroPython compiles const() without an import, and some modules rely on that
+if not hasattr(builtins, "const"):
+    builtins.const = lambda value: value
+
+TICKS_PERIOD = 1 << 30  # ticks wrap around like on a 32-bit port
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(end, start):
+    return (end - start + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+
+def _ticks_us():
+    return time.perf_counter_ns() // 1000 % TICKS_PERIOD
+
+
+def _ticks_ms():
+    return time.perf_counter_ns() // 1000000 % TICKS_PERIOD
+
+
+if not hasattr(time, "ticks_us"):
+    time.ticks_us = _ticks_us
+    time.ticks_ms = _ticks_ms
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+
+
+class FakeClock:
+    """
+    Manually advanced replacement for time.ticks_us() and time.ticks_ms().
+
+    Install it with install(monkeypatch) in a test, or use it as a context manager in a
+    benchmark script.
+    """
+
+    def __init__(self, start_us=0):
+        self.us = start_us % TICKS_PERIOD
+
+    def ticks_us(self):
+        return self.us
+
+    def ticks_ms(self):
+        return self.us // 1000
+
+    def advance(self, us):
+        self.us = ticks_add(self.us, us)
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(time, "ticks_us", self.ticks_us)
+        monkeypatch.setattr(time, "ticks_ms", self.ticks_ms)
+        return self
+
+    def __enter__(self):
+        self._saved = time.ticks_us, time.ticks_ms
+        time.ticks_us = self.ticks_us
+        time.ticks_ms = self.ticks_ms
+        return self
+
+    def __exit__(self, *exc):
+        time.ticks_us, time.ticks_ms = self._saved
@@ -0,0 +1,20 @@
+"""CPython stand-in for the esp32 module."""
+
+
+class RMT:
+    """Records what would be sent instead of driving a pin."""
+
+    def __init__(self, channel, pin=None, clock_div=8, idle_level=False):
+        self.clock_div = clock_div
+        self.idle_level = idle_level
+        self.writes = []  # (durations, start level) per write_pulses() call
+        self.looping = False
+
+    def write_pulses(self, durations, data=True):
+        self.writes.append((list(durations), data))
+
+    def loop(self, enable):
+        self.looping = bool(enable)
+
+    def wait_done(self, timeout=0):
+        return True
@@ -0,0 +1,66 @@
+"""
+CPython stand-in for framebuf, MONO_VLSB only.
+
+Text is drawn with a made-up font: each character is an 8x8 pattern made from the bits of its
+character code, which is enough to tell what was drawn where. Spaces are blank, as in the real
+font.
+"""
+
+MONO_VLSB = 0
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format=MONO_VLSB):
+        self._fb_buffer = buffer
+        self._fb_width = width
+        self._fb_height = height
+
+    def fill(self, c):
+        value = 0xFF if c else 0
+        buffer = self._fb_buffer
+        for i in range(len(buffer)):
+            buffer[i] = value
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._fb_width and 0 <= y < self._fb_height):
+            return 0 if c is None else None
+        i = (y >> 3) * self._fb_width + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self._fb_buffer[i] & bit else 0
+        if c:
+            self._fb_buffer[i] |= bit
+        else:
+            self._fb_buffer[i] &= ~bit & 0xFF
+
+    def fill_rect(self, x, y, w, h, c):
+        for xx in range(max(x, 0), min(x + w, self._fb_width)):
+            for yy in range(max(y, 0), min(y + h, self._fb_height)):
+                self.pixel(xx, yy, c)
+
+    def rect(self, x, y, w, h, c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def text(self, s, x, y, c=1):
+        for k, char in enumerate(s):
+            code = ord(char) if char != " " else 0
+            for col in range(8):
+                for row in range(8):
+                    if (code >> row) & 1 and (col + row) & 1:
+                        self.pixel(x + 8 * k + col, y + row, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._fb_height):
+            for xx in range(fbuf._fb_width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
@@ -0,0 +1,146 @@
+"""CPython stand-in for the machine module."""
+import threading
+import time
+
+# disable_irq() also keeps other threads out, as it does with the single-core threads on ESP32
+_irq_lock = threading.RLock()
+
+
+class _Memory:
+    """Memory by address, for mem8 and mem32. Tests set the values they expect to be read."""
+
+    def __init__(self):
+        self.values = {}
+
+    def __getitem__(self, addr):
+        return self.values.get(addr, 0)
+
+    def __setitem__(self, addr, value):
+        self.values[addr] = value
+
+
+mem8 = _Memory()
+mem32 = _Memory()
+
+
+def disable_irq():
+    _irq_lock.acquire()
+    return True
+
+
+def enable_irq(state=True):
+    _irq_lock.release()
+
+
+class UART:
+    """Serves bytes queued with feed() instead of reading a wire."""
+
+    def __init__(self, id=0, baudrate=115200, **kwargs):
+        self.baudrate = baudrate
+        self._data = bytearray()
+        self.written = bytearray()
+
+    def feed(self, data):
+        self._data += data
+
+    def any(self):
+        return len(self._data)
+
+    def read(self, n=None):
+        if not self._data:
+            return None
+        n = len(self._data) if n is None else n
+        data = bytes(self._data[:n])
+        del self._data[:n]
+        return data
+
+    def readinto(self, buf, n=None):
+        n = min(len(buf) if n is None else n, len(self._data))
+        if not n:
+            return None
+        buf[:n] = self._data[:n]
+        del self._data[:n]
+        return n
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+
+class I2C:
+    """
+    Records transactions instead of driving a bus.
+
+    Each transaction is kept as the address and the bytes sent. With byte_us set, a transaction
+    blocks for that long per byte, like a blocking transfer that releases the interpreter lock.
+    """
+
+    def __init__(self, id=0, byte_us=0, **kwargs):
+        self.byte_us = byte_us
+        self.transactions = []
+
+    def writeto(self, addr, buf, stop=True):
+        return self.writevto(addr, (buf,), stop)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(buf) for buf in vector)
+        self.transactions.append((addr, data))
+        if self.byte_us:
+            time.sleep(len(data) * self.byte_us / 1000000)
+        return 1
+
+    def bytes_sent(self):
+        return sum(len(data) for _, data in self.transactions)
+
+    def reset(self):
+        self.transactions = []
+
+
+class Pin:
+    """Pin whose level is set by the test. irq() keeps the handler for the test to call."""
+
+    IN = 1
+    OUT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id=None, mode=None, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self.level = 1 if pull == Pin.PULL_UP else 0
+        self.handler = None
+        if value is not None:
+            self.level = value
+
+    def init(self, mode=None, pull=None, value=None):
+        self.mode = mode
+        if value is not None:
+            self.level = value
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.level = level
+
+    def __call__(self, level=None):
+        return self.value(level)
+
+    def irq(self, handler=None, trigger=None):
+        self.handler = handler
+
+
+class SPI:
+    """Records each write() with the levels of the pins given as watch, e.g. CS and DC."""
+
+    def __init__(self, id=0, watch=(), **kwargs):
+        self.watch = watch
+        self.writes = []
+        self.inits = 0
+
+    def init(self, **kwargs):
+        self.inits += 1
+
+    def write(self, buf):
+        self.writes.append((bytes(buf), tuple(pin.value() for pin in self.watch)))
@@ -0,0 +1,26 @@
+"""CPython stand-in for uasyncio, on top of asyncio."""
+import threading
+from asyncio import *  # noqa: F401, F403
+from asyncio import sleep
+
+
+async def sleep_ms(ms):
+    await sleep(ms / 1000)
+
+
+class ThreadSafeFlag:
+    """Flag that can be set from another thread, polled by the waiting task."""
+
+    def __init__(self):
+        self._flag = threading.Event()
+
+    def set(self):
+        self._flag.set()
+
+    def clear(self):
+        self._flag.clear()
+
+    async def wait(self):
+        while not self._flag.is_set():
+            await sleep(0.0002)
+        self._flag.clear()
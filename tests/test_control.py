@@ -0,0 +1,240 @@
+import time
+
+import pytest
+import uasyncio
+
+from control import EVENT_FAULT, EVENT_RECIPE_DONE, ControlLoop, MotorState, SpeedControl
+from feedforward import FeedForward
+from host import FakeClock
+from pid import GainSchedule, PIDCore
+from recipe import RecipePlayer, compile_recipe
+from test_pid import GAINS, Plant
+from watchdog import FAULT_TELEMETRY, Watchdog
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1000).install(monkeypatch)
+    clock.yields = 0
+    clock.task_us = 140  # time the other tasks run at each yield
+    clock.blocked_us = 0  # time another task holds the CPU at the next yield
+    clock.slept_us = []  # blocking waits
+
+    async def sleep_ms(ms):
+        clock.yields += 1
+        clock.advance(ms * 1000 + clock.task_us + clock.blocked_us)
+        clock.blocked_us = 0
+
+    def sleep_us(us):
+        clock.slept_us.append(us)
+        clock.advance(us)
+
+    monkeypatch.setattr(uasyncio, "sleep_ms", sleep_ms)
+    monkeypatch.setattr(time, "sleep_us", sleep_us)
+    return clock
+
+
+def steps(loop, clock, n, work_us=100):
+    async def run():
+        starts = []
+        for _ in range(n):
+            await loop.wait()
+            starts.append(clock.us)
+            clock.advance(work_us)
+        return starts
+
+    return uasyncio.run(run())
+
+
+def test_steps_on_time_yield_until_the_deadline(clock):
+    loop = ControlLoop(rate=1000)
+    starts = steps(loop, clock, 100)
+    assert [b - a for a, b in zip(starts, starts[1:])] == [1000] * 99
+    assert loop.overruns == 0
+    # the other tasks get the period but for the last spin_us, blocked out to the deadline
+    assert clock.yields == 99 * 6
+    assert len(clock.slept_us) == 99
+    assert max(clock.slept_us) <= loop.spin_us
+
+
+def test_blocked_wait_counts_overrun_without_burst(clock):
+    loop = ControlLoop(rate=1000)
+    steps(loop, clock, 10)
+    clock.blocked_us = 3500  # e.g. a display transfer holding the CPU
+    starts = steps(loop, clock, 5)
+    assert loop.overruns == 1
+    # after the late step the loop starts a new period instead of catching up
+    assert [b - a for a, b in zip(starts, starts[1:])] == [1000] * 4
+
+
+def test_long_step_counts_overrun(clock):
+    loop = ControlLoop(rate=1000)
+    steps(loop, clock, 10)
+    steps(loop, clock, 1, work_us=1500)
+    starts = steps(loop, clock, 5)
+    assert loop.overruns == 1
+    assert [b - a for a, b in zip(starts, starts[1:])] == [1000] * 4
+    # the late step still lets the other tasks run once
+    assert loop.max_period_us == 1500 + clock.task_us
+
+
+class Flag:
+    """Counts the redraw requests."""
+
+    def __init__(self):
+        self.sets = 0
+
+    def set(self):
+        self.sets += 1
+
+
+class Events(list):
+    """Keeps the posted event codes."""
+
+    put = list.append
+
+
+class SimDshot:
+    """Keeps the throttle sent for the next millisecond of the simulated motor."""
+
+    def __init__(self):
+        self.throttle = 0
+
+    def set_throttle(self, value, telemetry=True):
+        self.throttle = value
+
+
+class SimTelemetry:
+    """KissTelemetry reading the simulated motor, with a frame every frame_ms unless lost."""
+
+    def __init__(self, plant):
+        self.plant = plant
+        self.lost = False
+        self.frames = 0
+        self.rpm = 0
+        self.timestamp_us = 0
+        self.temperature = 40
+        self.voltage = 1200
+        self._ms = 0
+
+    def poll(self, now=None):
+        plant = self.plant
+        if self.lost or plant.ms == self._ms or plant.ms % plant.frame_ms:
+            return False
+        self._ms = plant.ms
+        self.frames += 1
+        self.rpm = plant.rpm
+        self.timestamp_us = now
+        return True
+
+    def request(self, now=None):
+        return True
+
+
+class MotorRig:
+    """
+    SpeedControl driving the simulated motor from test_pid.py, a millisecond per step.
+
+    Faults are injected by setting the fields: jammed stops the rotor, telemetry.lost stops the
+    frames, and the telemetry values can be set directly. Keyword options go to SpeedControl.
+    """
+
+    def __init__(self, watchdog=None, gains=GAINS, feedforward=None, hold=None, **options):
+        self.plant = Plant()
+        self.motor = MotorState()
+        self.dshot = SimDshot()
+        self.telemetry = SimTelemetry(self.plant)
+        self.watchdog = watchdog or Watchdog()
+        self.feedforward = feedforward or FeedForward()
+        self.pid = PIDCore(**gains, setpoint=0, output_limits=(0.0, 1.0), integral_hold=hold)
+        self.events = Events()
+        self.redraw = Flag()
+        self.control = SpeedControl(
+            self.motor,
+            self.dshot,
+            self.pid,
+            self.telemetry,
+            self.watchdog,
+            self.feedforward,
+            GainSchedule(),
+            self.events,
+            self.redraw,
+            **options,
+        )
+        self.jammed = False
+
+    def step(self, target=None):
+        """Run a millisecond, at target if given, returning the RPM of the motor."""
+        plant = self.plant
+        if target is not None:
+            self.motor.target_rpm = target
+        if self.jammed:
+            plant.motor.rpm = 0.0
+        plant.step(self.dshot.throttle)
+        self.control.step(0.001, plant.ms * 1000)
+        return plant.motor.rpm
+
+    def run(self, setpoint, ms):
+        """Run until ms, returning the time and bits of the first fault, or (None, 0)."""
+        while self.plant.ms < ms:
+            self.step(setpoint(self.plant.ms))
+            if self.motor.faults:
+                return self.plant.ms, self.motor.faults
+        return None, 0
+
+
+def test_recipe_hands_the_motor_back_when_done():
+    rig = MotorRig()
+    recipe = compile_recipe([{"rpm": 3000, "hold": 1}], ramp_rate=5000)
+    rig.motor.recipe = RecipePlayer(recipe, timeout_ms=3000)
+    rig.run(lambda ms: 0, 1000)
+    assert rig.pid.setpoint == 3000
+    rig.run(lambda ms: 0, 6000)
+    assert rig.events == [EVENT_RECIPE_DONE]
+    assert rig.pid.setpoint == 0
+    assert rig.motor.throttle == 0
+
+
+def test_fault_is_posted_once_and_cuts_the_throttle():
+    rig = MotorRig(Watchdog(timeout_ms=50))
+    rig.run(lambda ms: 3000, 1000)
+    rig.telemetry.lost = True
+    trip_ms, faults = rig.run(lambda ms: 3000, 2000)
+    assert faults == FAULT_TELEMETRY
+    rig.run(lambda ms: 3000, 2000)
+    assert rig.events == [EVENT_FAULT]
+    assert rig.dshot.throttle == 0
+
+
+def test_redraw_is_requested_when_the_rpm_moves_a_step():
+    rig = MotorRig(display_rpm_step=100)
+    shown = 0
+    redraws = []
+    for ms in range(4000):
+        sets = rig.redraw.sets
+        rig.step(3000)
+        if rig.redraw.sets > sets:
+            assert abs(rig.motor.rpm - shown) >= 100
+            shown = rig.motor.rpm
+            redraws.append(ms)
+        else:
+            assert abs(rig.motor.rpm - shown) < 100
+    assert rig.motor.shown_rpm == shown
+    # a step at most every telemetry frame while it spins up, none once it has settled
+    assert len(redraws) >= 3000 // 100
+    assert redraws[-1] < 1000
+
+
+def test_redraw_is_requested_when_the_time_left_changes():
+    rig = MotorRig(display_rpm_step=10**6)
+    recipe = compile_recipe([{"rpm": 3000, "hold": 3}], ramp_rate=5000)
+    rig.motor.recipe = RecipePlayer(recipe, timeout_ms=3000)
+    time_left = []
+    for ms in range(6000):
+        sets = rig.redraw.sets
+        rig.step(0)
+        if rig.redraw.sets > sets:
+            time_left.append(rig.motor.time_left)
+    # a 600 ms ramp and a 3 s hold, counted down in whole seconds
+    assert time_left == [4, 3, 2, 1, 0]
+    assert rig.events == [EVENT_RECIPE_DONE]
@@ -0,0 +1,172 @@
+import pytest
+
+from dshot import DSHOT_RATES, Dshot, decode_erpm, dshot_timings
+from machine import UART
+from telemetry import KissTelemetry
+
+
+def reference_packet(value, telemetry=True):
+    # the packet as the original driver built it
+    value = (value << 1) | telemetry
+    crc = (value ^ (value >> 4) ^ (value >> 8)) & 0x0F
+    return (value << 4) | crc
+
+
+def reference_pulses(packet, on, off, bit, pause):
+    # the pulse train as the original _send() built it
+    duration = []
+    for i in reversed(range(16)):
+        high = on if packet & (1 << i) else off
+        duration += [high, bit - high]
+    duration[-1] += pause
+    return duration
+
+
+@pytest.fixture
+def make_dshot(monkeypatch):
+    # skip the two second arming loop
+    monkeypatch.setattr(Dshot, "_arm", lambda self, duration=2: self.set_throttle(0))
+
+    def make(**kwargs):
+        return Dshot(pin=None, **kwargs)
+
+    return make
+
+
+def pulse_us(clock_div, pulses):
+    return pulses * clock_div / 80
+
+
+@pytest.mark.parametrize("period_us", [None, 1000])
+@pytest.mark.parametrize("rate", DSHOT_RATES)
+def test_timings_meet_the_bit_timing(rate, period_us):
+    clock_div, on, off, bit, pause = dshot_timings(rate, period_us)
+    assert bit >= 20
+    assert pulse_us(clock_div, bit) == pytest.approx(1000 / rate, rel=0.025)
+    # T1H is 3/4 and T0H 3/8 of the bit
+    assert abs(on / bit - 0.75) <= 0.025
+    assert abs(off / bit - 0.375) <= 0.025
+    if period_us is None:
+        assert pulse_us(clock_div, pause) == pytest.approx(2, abs=0.1)
+    else:
+        # the looped packet repeats every period
+        assert pulse_us(clock_div, 16 * bit + pause) == pytest.approx(period_us, abs=0.1)
+
+
+def test_unsupported_rate_is_rejected():
+    with pytest.raises(ValueError, match="unsupported"):
+        dshot_timings(400)
+
+
+@pytest.mark.parametrize("rate, period_us", [(150, 100), (1200, 13)])
+def test_period_shorter_than_a_packet_is_rejected(rate, period_us):
+    with pytest.raises(ValueError, match="too short"):
+        dshot_timings(rate, period_us)
+
+
+@pytest.mark.parametrize("rate, period_us", [(600, 5000), (1200, 2000), (1200, 5000)])
+def test_period_too_long_to_resolve_a_bit_is_rejected(rate, period_us):
+    # the pause has to fit one RMT duration, which would leave too few pulses per bit
+    with pytest.raises(ValueError, match="too long"):
+        dshot_timings(rate, period_us)
+
+
+def test_packets_match_reference(make_dshot):
+    dshot = make_dshot(rate=300)
+    for value in (0, 48, 1000, 2047):
+        for telemetry in (False, True):
+            assert dshot._create_packet(value, telemetry) == reference_packet(value, telemetry)
+
+
+@pytest.mark.parametrize("rate", (150, 300, 600, 1200))
+def test_pulses_match_reference(make_dshot, rate):
+    dshot = make_dshot(rate=rate)
+    timings = (dshot._ON_PULSES, dshot._OFF_PULSES, dshot._BIT_PULSES, dshot._PAUSE_PULSES)
+    for throttle in (0.0, 0.001, 0.25, 0.5, 1.0):
+        dshot.set_throttle(throttle)
+        packet = reference_packet(dshot._encode_throttle(throttle))
+        assert dshot.rmt.writes[-1][0] == reference_pulses(packet, *timings)
+
+
+def test_pulse_buffer_is_reused(make_dshot):
+    dshot = make_dshot()
+    buffer = dshot._duration
+    for throttle in (0.1, 0.2, 0.1):
+        dshot.set_throttle(throttle)
+    assert dshot._duration is buffer
+    assert len(buffer) == 32
+
+
+def test_hold_only_rewrites_changed_packets(make_dshot):
+    dshot = make_dshot(hold=True)
+    assert dshot.rmt.looping
+    writes = len(dshot.rmt.writes)
+    written = dshot.frames_written
+    for throttle in [0.5] * 100 + [0.6] * 100 + [0.5] * 100:
+        dshot.set_throttle(throttle, telemetry=False)
+    assert dshot.frames_written - written == 3
+    assert dshot.frames_held == 297
+    assert len(dshot.rmt.writes) - writes == 3
+
+
+def test_without_hold_every_packet_is_written(make_dshot):
+    dshot = make_dshot()
+    assert not dshot.rmt.looping
+    written = dshot.frames_written
+    for _ in range(100):
+        dshot.set_throttle(0.5, telemetry=False)
+    assert dshot.frames_written - written == 100
+    assert dshot.frames_held == 0
+
+
+# Bidirectional DShot300 replies as captured in RMT pulses of 53 per reply bit, with up to a
+# fifth of a bit of jitter on each level, and the eRPM each decodes to. The last level merges
+# with the idle line, so it is not part of the capture.
+REPLY_BIT_PULSES = 53
+REPLIES = (
+    ((100, 53, 50, 55, 108, 43, 42, 60, 100, 47, 63, 52, 60, 52, 161), 0),
+    ((98, 55, 60, 53, 111, 56, 96, 58, 54, 48, 96, 113, 158), 1002),
+    ((57, 114, 57, 61, 50, 112, 51, 115, 114, 97, 98, 100, 62), 21008),
+    ((51, 161, 48, 53, 156, 49, 54, 160, 167, 56, 115), 98039),
+    ((60, 63, 162, 98, 60, 62, 61, 54, 57, 152, 60, 54, 154), 250000),
+)
+
+
+@pytest.mark.parametrize("durations, erpm", REPLIES)
+def test_decode_erpm_fixtures(durations, erpm):
+    assert decode_erpm(durations, REPLY_BIT_PULSES) == erpm
+
+
+def test_decode_erpm_rejects_corrupt_replies():
+    durations = list(REPLIES[2][0])
+    durations[0] *= 2  # a missed transition shifts every later bit
+    assert decode_erpm(durations, REPLY_BIT_PULSES) is None
+    durations = list(REPLIES[2][0])
+    durations[4] = 10  # a glitch shorter than half a bit
+    assert decode_erpm(durations, REPLY_BIT_PULSES) is None
+    assert decode_erpm((), REPLY_BIT_PULSES) is None
+
+
+def test_read_erpm_counts_errors(make_dshot):
+    replies = [REPLIES[1][0], (10, 10)]
+
+    class Receiver:
+        def read_pulses(self):
+            return replies.pop(0) if replies else None
+
+    dshot = make_dshot(rate=300, bidirectional=True, receiver=Receiver())
+    assert dshot._reply_bit_pulses == REPLY_BIT_PULSES
+    assert dshot.read_erpm() == 1002
+    assert dshot.read_erpm() is None
+    assert dshot.read_erpm() is None
+    assert dshot.erpm_errors == 1
+
+
+def test_hold_with_unscheduled_telemetry_keeps_packets(make_dshot):
+    dshot = make_dshot(hold=True)
+    telemetry = KissTelemetry(UART(1), scheduled=False)
+    written = dshot.frames_written
+    for _ in range(100):
+        dshot.set_throttle(0.5, telemetry=telemetry.request())
+    assert dshot.frames_written - written == 1
+    assert dshot._last_packet & 0x10  # the looped packet carries the request
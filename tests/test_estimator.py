@@ -0,0 +1,106 @@
+import random
+from collections import deque
+
+import pytest
+
+from estimator import RpmEstimator
+from pid import FIXED_ONE
+from test_pid import Motor
+
+# throttle steps up, holds, steps down and holds again
+PROFILE = ((0, 0.1), (1000, 0.5), (3000, 0.2), (5000, 0.2))
+HOLDS = ((2000, 3000), (4200, 5000))  # settled, for the noise
+STEPS = ((1000, 1600), (3000, 3600))  # accelerating, for the lag
+RPM_STEP = 100 / 7  # KISS reports eRPM in steps of 100, with 7 pole pairs
+
+
+def throttle_at(ms):
+    throttle = 0
+    for start, value in PROFILE:
+        if ms >= start:
+            throttle = value
+    return throttle
+
+
+def replay(estimator=None, frame_ms=4, latency_ms=2, jitter=20, delay_ms=20, seed=1):
+    """
+    Feed a simulated telemetry stream through the estimator, or hold the raw samples without one.
+
+    The ESC reacts to the throttle after delay_ms, samples the RPM every frame_ms, quantised to
+    the eRPM resolution of KISS telemetry with jitter RPM of gaussian noise, and the sample
+    arrives latency_ms later. Returns the true RPM and the reading, one each per millisecond.
+    """
+    rng = random.Random(seed)
+    motor = Motor()
+    queue = deque([0.0] * delay_ms)
+    in_flight = deque()
+    truth = []
+    readings = []
+    reading = 0
+    end = PROFILE[-1][0]
+    for ms in range(end):
+        now = ms * 1000
+        throttle = throttle_at(ms)
+        queue.append(throttle)
+        motor.step(queue.popleft(), 0.001)
+        truth.append(motor.rpm)
+        if ms % frame_ms == 0:
+            sample = int(max(motor.rpm + rng.gauss(0, jitter), 0) / RPM_STEP) * RPM_STEP
+            in_flight.append((ms + latency_ms, int(sample), now))
+        if estimator is not None:
+            estimator.predict(now, int(throttle * FIXED_ONE))
+        while in_flight and in_flight[0][0] <= ms:
+            _, rpm, timestamp = in_flight.popleft()
+            if estimator is not None:
+                estimator.update(rpm, timestamp, now)
+            else:
+                reading = rpm
+        readings.append(estimator.rpm if estimator is not None else reading)
+    return truth, readings
+
+
+def noise(truth, readings):
+    """RMS error of the reading over the holds, in RPM."""
+    errors = [readings[t] - truth[t] for start, end in HOLDS for t in range(start, end)]
+    return (sum(e * e for e in errors) / len(errors)) ** 0.5
+
+
+def lag(truth, readings, longest_ms=50):
+    """The delay in ms that best lines the reading up with the true RPM over the steps."""
+
+    def misfit(shift):
+        return sum(
+            (readings[t] - truth[t - shift]) ** 2 for start, end in STEPS for t in range(start, end)
+        )
+
+    return min(range(-longest_ms, longest_ms + 1), key=misfit)
+
+
+def report(estimator=None, **kwargs):
+    truth, readings = replay(estimator, **kwargs)
+    return noise(truth, readings), lag(truth, readings)
+
+
+def test_raw_telemetry_lags_by_about_half_a_frame_plus_latency():
+    raw_noise, raw_lag = report()
+    assert 2 <= raw_lag <= 5
+    assert raw_noise < 30
+
+
+@pytest.mark.parametrize("frame_ms", [2, 4])
+def test_default_estimator_smooths_without_adding_lag(frame_ms):
+    # the settings in config.json
+    raw_noise, raw_lag = report(frame_ms=frame_ms)
+    est_noise, est_lag = report(RpmEstimator(alpha=0.3, beta=0.02), frame_ms=frame_ms)
+    assert est_noise < 0.7 * raw_noise
+    assert est_lag <= raw_lag
+
+
+@pytest.mark.parametrize("frame_ms", [4, 8])
+def test_motor_model_cuts_the_lag(frame_ms):
+    # with slow telemetry the rate alone falls behind a step, the model predicts it
+    raw_noise, raw_lag = report(frame_ms=frame_ms)
+    estimator = RpmEstimator(alpha=0.3, beta=0.02, gain=12000, tau_ms=250)
+    est_noise, est_lag = report(estimator, frame_ms=frame_ms)
+    assert est_noise < 0.7 * raw_noise
+    assert abs(est_lag) < raw_lag
@@ -0,0 +1,58 @@
+import pytest
+import uasyncio
+
+from events import EventQueue
+from host import TICKS_PERIOD, FakeClock
+
+
+def handle(events, clock, work_us):
+    """Get the next event, take work_us to handle it and return its code."""
+
+    async def run():
+        return await events.get()
+
+    code = uasyncio.run(run())
+    clock.advance(work_us)
+    events.handled()
+    return code
+
+
+@pytest.mark.parametrize("start_us", [0, TICKS_PERIOD - 1500])
+def test_latency_from_put_to_handled(monkeypatch, start_us):
+    clock = FakeClock(start_us).install(monkeypatch)
+    events = EventQueue()
+    events.put(1)
+    clock.advance(400)  # e.g. a display transfer before the event task runs
+    events.put(2)
+    assert handle(events, clock, 100) == 1
+    assert events.latency_us == 500
+    assert handle(events, clock, 100) == 2
+    assert events.latency_us == 200
+    assert events.max_latency_us == 500
+
+
+def test_age_counts_from_put(monkeypatch):
+    clock = FakeClock().install(monkeypatch)
+    events = EventQueue()
+    events.put(1)
+    clock.advance(3000)
+
+    async def run():
+        await events.get()
+        return events.age_us()
+
+    # e.g. how much of the debounce time has passed already
+    assert uasyncio.run(run()) == 3000
+
+
+def test_full_queue_drops_events(monkeypatch):
+    FakeClock().install(monkeypatch)
+    events = EventQueue(size=4)
+    for code in range(5):
+        events.put(code)
+    assert events.dropped == 2
+
+    async def drain():
+        return [await events.get() for _ in range(3)]
+
+    assert uasyncio.run(drain()) == [0, 1, 2]
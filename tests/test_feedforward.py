@@ -0,0 +1,133 @@
+import pytest
+
+from feedforward import FeedForward
+from pid import PIDCore
+from test_control import MotorRig
+from watchdog import Watchdog
+
+DEFAULT_GAINS = {"Kp": 1e-5, "Ki": 1e-4, "Kd": 0}  # the gains in config.json
+
+
+class SpeedLoop(MotorRig):
+    """SpeedControl on the simulated motor, with the feed-forward table off if none is given."""
+
+    def __init__(self, table=None, hold=1000, gains=DEFAULT_GAINS, band=0.05):
+        super().__init__(
+            # a stale table holds the RPM far off the setpoint on purpose
+            Watchdog(rpm_tolerance=1),
+            gains,
+            feedforward=table,
+            hold=hold,
+            use_feedforward=table is not None,
+            feedforward_band=band,
+        )
+        self.table = self.feedforward
+
+    def settle(self, target, ms=4000, tolerance=0.01):
+        """Run at target for ms, returning the time in ms until the RPM stayed within 1%."""
+        settled = 0
+        for t in range(ms):
+            if abs(self.step(target) - target) > tolerance * target:
+                settled = t + 1
+        return settled
+
+
+def test_learns_steady_throttle():
+    table = FeedForward(samples=10)
+    for _ in range(10):
+        table.observe(4000, 4000, 0.3)
+    table.observe(4000, 4000, 0.3)
+    assert table.points == 1
+    assert table(4000) == pytest.approx(0.3)
+    assert table(2000) == pytest.approx(0.15)
+
+
+def test_learns_float_targets():
+    table = FeedForward(samples=10)
+    for _ in range(11):
+        table.observe(2500.4, 2500, 0.2)
+    table.learn(5000.6, 0.4)
+    assert list(table.rpm[: table.points]) == [2500, 5001]
+
+
+def test_unsteady_rpm_is_not_learned():
+    table = FeedForward(samples=10)
+    for i in range(100):
+        table.observe(4000, 4000 + (200 if i % 5 == 0 else 0), 0.3)
+    assert table.points == 0
+
+
+def test_full_table_drops_the_most_crowded_point():
+    table = FeedForward(size=3)
+    for rpm in (1000, 2000, 2100, 5000):
+        table.learn(rpm, rpm / 10000)
+    assert list(table.rpm[: table.points]) == [1000, 2000, 5000]
+
+
+def test_dirty_until_saved_or_loaded(tmp_path):
+    path = str(tmp_path / "feedforward.bin")
+    table = FeedForward()
+    assert not table.dirty
+    table.learn(3000, 0.25)
+    table.learn(6000, 0.5)
+    assert table.dirty
+    table.save(path)
+    assert not table.dirty
+    loaded = FeedForward()
+    loaded.load(path)
+    assert not loaded.dirty
+    assert list(loaded.rpm[: loaded.points]) == [3000, 6000]
+    assert loaded(4500) == pytest.approx(0.375)
+
+
+def test_missing_file_keeps_the_table_empty(tmp_path):
+    table = FeedForward()
+    table.load(str(tmp_path / "missing.bin"))
+    assert table.points == 0
+    assert table(3000) == 0
+
+
+def test_table_shortens_settling():
+    without = SpeedLoop()
+    learned = SpeedLoop(FeedForward())
+    for _ in range(3):
+        without.settle(1000)
+        learned.settle(1000)
+        slow = without.settle(6000)
+        fast = learned.settle(6000)
+    assert learned.table.points == 2
+    assert fast < slow / 2
+
+
+def stale_table():
+    # learned on a motor that needed 30% more throttle
+    table = FeedForward()
+    table.learn(1000, 1.3 * 1000 / 12000)
+    table.learn(6000, 1.3 * 6000 / 12000)
+    return table
+
+
+def test_stale_point_is_corrected_and_relearned():
+    loop = SpeedLoop(stale_table())
+    loop.settle(1000, 6000)
+    assert loop.settle(6000, 6000) < 6000
+    assert loop.table(6000) == pytest.approx(0.5, abs=0.01)
+
+
+def test_stale_point_holds_an_offset_without_integral_hold():
+    loop = SpeedLoop(stale_table(), hold=None)
+    loop.settle(6000, 6000)
+    assert loop.plant.motor.rpm > 1.2 * 6000
+
+
+def test_integral_hold_restarts_with_the_setpoint():
+    pid = PIDCore(Kp=0, Ki=1, setpoint=1000, integral_band=100, integral_hold=3)
+    for _ in range(2):
+        pid.update(0, 0.001)
+    pid.setpoint = 900
+    for _ in range(2):
+        pid.update(0, 0.001)
+    assert pid.integral == 0
+    pid.update(0, 0.001)
+    assert pid.integral == pytest.approx(0.9)
+    assert pid.integral_band == float("inf")
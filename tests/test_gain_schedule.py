@@ -0,0 +1,126 @@
+import pytest
+
+from pid import FIXED_ONE, GainSchedule, PIDCore, RelayAutotune
+from test_pid import Plant
+
+MAX_RPM = 12000
+
+
+class DragMotor:
+    """
+    A motor turning a propeller, whose drag grows with the square of the speed.
+
+    The time constant falls from tau_500 at 500 RPM to a twentieth of it at 10000 RPM, so gains
+    that suit one end of the range do not suit the other.
+    """
+
+    def __init__(self, tau_500=1.0):
+        self.drag = 1 / (2 * 500 * tau_500)
+        self.torque = self.drag * MAX_RPM**2
+        self.rpm = 0.0
+
+    def step(self, throttle, dt):
+        self.rpm += (self.torque * throttle - self.drag * self.rpm * self.rpm) * dt
+        self.rpm = max(self.rpm, 0.0)
+        return self.rpm
+
+
+def drag_plant():
+    return Plant(motor=DragMotor())
+
+
+def relay_gains(rpm):
+    plant = drag_plant()
+    bias = (rpm / MAX_RPM) ** 2
+    tuner = RelayAutotune(rpm, bias=bias, amplitude=min(0.05, bias / 2), hysteresis=30)
+    output = 0
+    while not (tuner.done or tuner.failed):
+        output = tuner.update(plant.step(output), plant.ms * 1000)
+    assert tuner.done
+    return tuner.gains()
+
+
+@pytest.fixture(scope="module")
+def tuned():
+    return {rpm: relay_gains(rpm) for rpm in (1000, 3000, 8000)}
+
+
+def steps(core, schedule=None, targets=(1000, 3000, 8000, 3000), ms=3000):
+    """Overshoot in % and time in ms until within 1% for each step of targets."""
+    plant = drag_plant()
+    output = 0
+    results = []
+    for target in targets:
+        if schedule is not None:
+            schedule.apply(core, target)
+        core.setpoint = target
+        start = plant.motor.rpm
+        peak = 0
+        trough = MAX_RPM
+        settled = 0
+        for t in range(ms):
+            output = core.update(plant.step(output), 0.001)
+            rpm = plant.motor.rpm
+            peak = max(peak, rpm)
+            trough = min(trough, rpm)
+            if abs(rpm - target) > 0.01 * target:
+                settled = t + 1
+        overshoot = peak - target if target > start else target - trough
+        results.append((100 * overshoot / target, settled))
+    return results
+
+
+def test_interpolates_between_breakpoints():
+    schedule = GainSchedule([(3000, 2.0, 20.0, 0.2), (1000, 1.0, 10.0, 0.1)])
+    core = PIDCore()
+    assert schedule.apply(core, 2000)
+    assert (core.Kp, core.Ki, core.Kd) == pytest.approx((1.5, 15.0, 0.15))
+    schedule.apply(core, 500)
+    assert (core.Kp, core.Ki, core.Kd) == pytest.approx((1.0, 10.0, 0.1))
+    schedule.apply(core, 9000)
+    assert (core.Kp, core.Ki, core.Kd) == pytest.approx((2.0, 20.0, 0.2))
+
+
+def test_same_setpoint_is_not_looked_up_again():
+    schedule = GainSchedule([(1000, 1.0, 0, 0)])
+    core = PIDCore()
+    assert schedule.apply(core, 1000)
+    assert not schedule.apply(core, 1000)
+    assert not GainSchedule().apply(core, 2000)
+
+
+def test_insert_replaces_and_round_trips():
+    schedule = GainSchedule([[3000, 2.0, 0, 0]])
+    schedule.insert(1000, 1.0, 0, 0)
+    schedule.insert(3000, 3.0, 0, 0)
+    assert schedule.breakpoints() == [[1000, 1.0, 0, 0], [3000, 3.0, 0, 0]]
+    assert GainSchedule(schedule.breakpoints()).breakpoints() == schedule.breakpoints()
+
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_gain_change_is_bumpless(fixed_point):
+    schedule = GainSchedule([(1000, 1e-4, 0, 0), (5000, 4e-4, 0, 0)])
+    core = PIDCore(setpoint=3000, fixed_point=fixed_point)
+    schedule.apply(core, 1000)
+    before = core.update(2000, 1000 if fixed_point else 0.001)
+    assert schedule.apply(core, 5000)
+    # the setpoint is not changed yet, so the output must not move with the gains
+    after = core.update(2000, 1000 if fixed_point else 0.001)
+    assert after == pytest.approx(before, abs=2 if fixed_point else 1e-9)
+    assert core.Kp == pytest.approx(4e-4)
+    if fixed_point:
+        assert before == pytest.approx(0.1 * FIXED_ONE, rel=1e-3)
+
+
+def test_schedule_settles_across_the_range(tuned):
+    schedule = GainSchedule([(rpm,) + gains for rpm, gains in tuned.items()])
+    results = steps(PIDCore(output_limits=(0, 1)), schedule)
+    # from a standstill to 1000 RPM the slow low end takes longest
+    assert all(overshoot < 4 for overshoot, _ in results)
+    assert all(settled < 1000 for _, settled in results[1:])
+
+    # gains tuned at one speed fall short elsewhere: too slow at the top, or overshooting
+    low = steps(PIDCore(*tuned[1000], output_limits=(0, 1)))
+    assert low[2][1] > 2000
+    high = steps(PIDCore(*tuned[8000], output_limits=(0, 1)))
+    assert high[3][0] > 5
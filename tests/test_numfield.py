@@ -0,0 +1,75 @@
+import tracemalloc
+
+import framebuf
+from numfield import NumberField, glyphs
+
+
+class NullFrameBuffer:
+    # stands in for the native framebuf methods, which do not allocate
+    def fill_rect(self, x, y, w, h, c):
+        pass
+
+    def blit(self, fbuf, x, y):
+        pass
+
+
+def _peak(function):
+    function()  # warm up
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(100):
+        function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+
+def peak_allocation(function):
+    """Peak memory allocated while calling function 100 times, beyond what the loop takes."""
+    return _peak(function) - _peak(lambda: None)
+
+
+def test_draws_right_aligned_digits():
+    buffer = bytearray(128 * 64 // 8)
+    fb = framebuf.FrameBuffer(buffer, 128, 64, framebuf.MONO_VLSB)
+    NumberField(0, 0, 5).draw(fb, -42)
+    expected = bytearray(len(buffer))
+    framebuf.FrameBuffer(expected, 128, 64, framebuf.MONO_VLSB).text("  -42", 0, 0, 1)
+    assert buffer == expected
+
+
+def test_clamps_values_that_do_not_fit():
+    buffer = bytearray(128 * 64 // 8)
+    fb = framebuf.FrameBuffer(buffer, 128, 64, framebuf.MONO_VLSB)
+    field = NumberField(0, 0, 3)
+    field.draw(fb, 12345)
+    expected = bytearray(len(buffer))
+    framebuf.FrameBuffer(expected, 128, 64, framebuf.MONO_VLSB).text("999", 0, 0, 1)
+    assert buffer == expected
+
+
+def test_scaled_glyphs_are_cached():
+    assert glyphs(2) is glyphs(2)
+
+
+def test_coating_screen_frame_does_not_allocate():
+    # the dynamic fields of the coating screen. CPython allocates ints above 256, which are
+    # small ints on MicroPython, so the values stay below that
+    rpm_field = NumberField(40, 20, 5, scale=2)
+    timer_field = NumberField(30, 48, 4)
+    fb = NullFrameBuffer()
+
+    def frame():
+        rpm_field.draw(fb, 250)
+        timer_field.draw(fb, 59)
+
+    assert peak_allocation(frame) == 0
+
+
+def test_formatting_allocates():
+    # the check above can see allocations
+    def frame():
+        "RPM:{: >{w}.0f}".format(250, w=5)
+
+    assert peak_allocation(frame) > 0
@@ -0,0 +1,245 @@
+import math
+from collections import deque
+
+import pytest
+
+from pid import FIXED_ONE, PID, PIDCore, RelayAutotune, _GAIN_BITS, _I_SHIFT
+
+SMALL_INT = 1 << 30  # ints from here on live on the heap of a 32-bit MicroPython port
+
+
+class ReferencePID:
+    """The update step of PID.__call__ as it was before it was split into PIDCore."""
+
+    def __init__(self, Kp, Ki, Kd, setpoint, output_limits, proportional_on_measurement=False,
+                 differetial_on_measurement=True, error_map=None):
+        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
+        self.setpoint = setpoint
+        self.limits = output_limits
+        self.proportional_on_measurement = proportional_on_measurement
+        self.differetial_on_measurement = differetial_on_measurement
+        self.error_map = error_map
+        self.proportional = self.integral = self.derivative = 0
+        self.last_input = self.last_error = None
+
+    def clamp(self, value):
+        lower, upper = self.limits
+        return min(max(value, lower), upper)
+
+    def __call__(self, input_, dt):
+        error = self.setpoint - input_
+        d_input = input_ - (self.last_input if self.last_input is not None else input_)
+        d_error = error - (self.last_error if self.last_error is not None else error)
+        if self.error_map is not None:
+            error = self.error_map(error)
+        if not self.proportional_on_measurement:
+            self.proportional = self.Kp * error
+        else:
+            self.proportional -= self.Kp * d_input
+        self.integral = self.clamp(self.integral + self.Ki * error * dt)
+        if self.differetial_on_measurement:
+            self.derivative = -self.Kd * d_input / dt
+        else:
+            self.derivative = self.Kd * d_error / dt
+        output = self.clamp(self.proportional + self.integral + self.derivative)
+        self.last_input = input_
+        self.last_error = error
+        return output
+
+
+class Motor:
+    """First-order model of the motor: RPM = K * throttle, reached with time constant tau."""
+
+    def __init__(self, k=12000, tau=0.25):
+        self.k = k
+        self.tau = tau
+        self.rpm = 0.0
+
+    def step(self, throttle, dt):
+        self.rpm += (self.k * throttle - self.rpm) * dt / self.tau
+        return self.rpm
+
+
+GAINS = {"Kp": 1e-4, "Ki": 1e-3, "Kd": 2e-6}
+DT = 0.001
+
+
+def ramp(step):
+    # a ramp gives float setpoints, then a hold and a step down
+    if step < 1000:
+        return 6000 * step / 1000
+    if step < 2000:
+        return 6000
+    return 2500
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"proportional_on_measurement": True},
+        {"differetial_on_measurement": False},
+        {"error_map": lambda error: max(min(error, 2000), -2000)},
+    ],
+)
+def test_core_matches_reference(options):
+    core = PIDCore(output_limits=(0, 1), **GAINS, **options)
+    reference = ReferencePID(output_limits=(0, 1), setpoint=0, **GAINS, **options)
+    motor = Motor()
+    for step in range(4000):
+        core.setpoint = reference.setpoint = ramp(step)
+        output = core.update(motor.rpm, DT)
+        assert output == pytest.approx(reference(motor.rpm, DT), abs=1e-9)
+        motor.step(output, DT)
+    assert motor.rpm == pytest.approx(2500, abs=5)
+
+
+def test_wrapper_matches_core():
+    pid = PID(output_limits=(0, 1), sample_time=None, **GAINS)
+    core = PIDCore(output_limits=(0, 1), **GAINS)
+    motor = Motor()
+    for step in range(2000):
+        pid.setpoint = core.setpoint = ramp(step)
+        output = pid(motor.rpm, dt=DT)
+        assert output == core.update(motor.rpm, DT)
+        motor.step(output, DT)
+    assert pid.components == (core.proportional, core.integral, core.derivative)
+
+
+# the last gain is too large for _GAIN_BITS and is scaled back up after the division by dt
+@pytest.mark.parametrize("kd", [0, 2e-6, 5e-5])
+def test_fixed_point_tracks_float(kd):
+    gains = dict(GAINS, Kd=kd)
+    fixed = PIDCore(output_limits=(0, 1), fixed_point=True, **gains)
+    core = PIDCore(output_limits=(0, 1), **gains)
+    motor = Motor()
+    worst = 0
+    for step in range(4000):
+        # float setpoints and inputs, as they come from a ramp and the estimator
+        fixed.setpoint = core.setpoint = ramp(step)
+        output = fixed.update(motor.rpm, DT * 1e6) / FIXED_ONE
+        worst = max(worst, abs(output - core.update(int(motor.rpm), DT)))
+        motor.step(output, DT)
+    assert worst < 0.005
+
+
+def test_fixed_point_stays_in_small_ints():
+    fixed = PIDCore(output_limits=(0, 1), fixed_point=True, **dict(GAINS, Kd=5e-5))
+    assert abs(fixed._kd_q) < 1 << _GAIN_BITS
+    motor = Motor()
+    last = 0
+    largest = 0
+    for step in range(4000):
+        fixed.setpoint = ramp(step)
+        rpm = round(motor.rpm)
+        error = fixed.setpoint - rpm
+        largest = max(
+            largest,
+            abs(fixed._kp_q * error),
+            abs(fixed._ki_q * error),
+            abs(fixed._kd_q * (rpm - last)),
+            abs(fixed._integral_q),
+        )
+        last = rpm
+        motor.step(fixed.update(rpm, 1000) / FIXED_ONE, DT)
+    assert largest < SMALL_INT
+
+
+def test_fixed_point_converts_floats_at_the_boundary():
+    fixed = PIDCore(output_limits=(0, 1), fixed_point=True, **GAINS)
+    fixed.setpoint = 1234.6
+    assert fixed.setpoint == 1235
+    fixed.set_integral(0.25 * FIXED_ONE + 0.5)
+    assert type(fixed.integral) is int
+    assert fixed._integral_q == fixed.integral << _I_SHIFT
+    output = fixed.update(1000.4, 1000.0)
+    assert type(output) is int
+    assert type(fixed.integral) is int
+
+
+class Plant:
+    """The motor behind an ESC that reacts after delay_ms, read by telemetry every frame_ms."""
+
+    def __init__(self, delay_ms=20, frame_ms=4, motor=None):
+        self.motor = motor or Motor()
+        self.queue = deque([0.0] * delay_ms)
+        self.frame_ms = frame_ms
+        self.ms = 0
+        self.rpm = 0
+
+    def step(self, throttle):
+        # one millisecond
+        self.queue.append(throttle)
+        self.motor.step(self.queue.popleft(), 0.001)
+        self.ms += 1
+        if self.ms % self.frame_ms == 0:
+            self.rpm = int(self.motor.rpm)
+        return self.rpm
+
+
+def ultimate(k=12000, tau=0.25, delay=0.021):
+    """Ultimate gain and period of the first-order motor with dead time, found by bisection."""
+    lo, hi = 0.0, 1000.0
+    for _ in range(60):
+        w = (lo + hi) / 2
+        if math.atan(w * tau) + w * delay < math.pi:
+            lo = w
+        else:
+            hi = w
+    return math.sqrt(1 + (w * tau) ** 2) / k, 2 * math.pi / w
+
+
+def relay(plant, tuner, limit_ms=20000):
+    output = 0
+    while not (tuner.done or tuner.failed) and plant.ms < limit_ms:
+        output = tuner.update(plant.step(output), plant.ms * 1000)
+    return tuner
+
+
+def settling(gains, setpoint=5000, band=100):
+    """Overshoot in RPM and the time in ms until the RPM stays within band of the setpoint."""
+    plant = Plant()
+    core = PIDCore(*gains, setpoint=setpoint, output_limits=(0, 1))
+    output = 0
+    peak = 0
+    settled = 0
+    for ms in range(5000):
+        output = core.update(plant.step(output), 0.001)
+        peak = max(peak, plant.motor.rpm)
+        if abs(plant.motor.rpm - setpoint) > band:
+            settled = ms + 1
+    return peak - setpoint, settled
+
+
+def test_relay_finds_the_ultimate_point():
+    tuner = relay(Plant(frame_ms=1), RelayAutotune(5000, bias=0.45, amplitude=0.1, hysteresis=30))
+    assert tuner.done
+    ku, pu = ultimate()
+    # the describing function is an approximation, which errs on the side of a lower gain
+    assert 0.6 * ku < tuner.ku < 1.1 * ku
+    assert 0.9 * pu < tuner.pu < 1.3 * pu
+
+
+def test_relay_centres_a_poor_bias():
+    plant = Plant()
+    tuner = relay(plant, RelayAutotune(5000, bias=0.5, amplitude=0.15, hysteresis=30))
+    assert tuner.done
+    assert tuner.bias == pytest.approx(5000 / 12000, abs=0.02)
+    assert plant.ms < 2000
+
+
+def test_relay_fails_when_the_setpoint_is_out_of_reach():
+    plant = Plant()
+    tuner = relay(plant, RelayAutotune(5000, bias=0.2, amplitude=0.1, timeout=1))
+    assert tuner.failed
+    assert plant.ms < 1010
+
+
+@pytest.mark.parametrize("rule", ["tyreus_luyben", "tyreus_luyben_pi", "ziegler_nichols"])
+def test_autotuned_gains_settle_faster_than_the_defaults(rule):
+    tuner = relay(Plant(), RelayAutotune(5000, bias=0.45, amplitude=0.1, hysteresis=30))
+    overshoot, settled = settling(tuner.gains(rule))
+    # the gains from config.json before autotuning
+    _, settled_default = settling((1e-5, 1e-4, 0))
+    assert settled < 1000 < settled_default
+    assert overshoot < 0.15 * 5000
@@ -0,0 +1,153 @@
+import pytest
+
+from host import TICKS_PERIOD, ticks_add
+from recipe import GATE_BUTTON, GATE_SETTLE, RecipePlayer, compile_recipe
+
+
+def test_compiles_ramps_holds_and_gates():
+    recipe = compile_recipe(
+        [
+            {"rpm": 1000, "ramp_time": 0.5, "hold": 2, "settle": False, "wait": True},
+            {"rpm": 3000, "ramp_rate": 4000, "hold": 1.5, "name": "Coat"},
+            {"rpm": 0},
+        ],
+        ramp_rate=1000,
+    )
+    assert list(recipe.times) == [0, 500, 2500, 3000, 4500, 7500, 7500]
+    assert list(recipe.rpms) == [0, 1000, 1000, 3000, 3000, 0, 0]
+    assert list(recipe.gates) == [0, 0, GATE_BUTTON, GATE_SETTLE, 0, 0, 0]
+    assert list(recipe.step_of) == [0, 0, 0, 1, 1, 2, 2]
+    assert list(recipe.step_end) == [2500, 4500, 7500]
+    assert recipe.names == ("Step 1", "Coat", "Step 3")
+    assert recipe.duration_ms == 7500
+
+
+def test_zero_ramp_rate_steps_to_the_target():
+    recipe = compile_recipe([{"rpm": 2000, "hold": 1}], start_rpm=500)
+    assert list(recipe.times) == [0, 0, 1000]
+    assert list(recipe.rpms) == [500, 2000, 2000]
+
+
+def test_float_fields_are_compiled_to_integers():
+    recipe = compile_recipe([{"rpm": 1234.5, "ramp_time": 0.25, "hold": 0.1}])
+    assert list(recipe.times) == [0, 250, 350]
+    assert list(recipe.rpms) == [0, 1234, 1234]
+    recipe = compile_recipe([{"rpm": 2000}], ramp_rate=1000, start_rpm=987.6)
+    assert list(recipe.times) == [0, 1013, 1013]
+    assert list(recipe.rpms) == [987, 2000, 2000]
+
+
+def test_float_ramp_rates_are_compiled_to_integers():
+    recipe = compile_recipe([{"rpm": 1000, "ramp_rate": 1500.5}, {"rpm": 0}], ramp_rate=2000.0)
+    assert list(recipe.times) == [0, 666, 666, 1166, 1166]
+    assert list(recipe.rpms) == [0, 1000, 1000, 0, 0]
+
+
+@pytest.mark.parametrize(
+    "steps",
+    [[], [{"rpm": 1000, "hold": -1}], [{"rpm": 1000, "ramp_time": -0.5}]],
+)
+def test_rejects_bad_recipes(steps):
+    with pytest.raises(ValueError):
+        compile_recipe(steps)
+
+
+def play(player, start_us, until_ms, rpm=lambda target: target, step_us=1000):
+    """Sample every step_us from start_us, feeding back an RPM, returning the setpoints."""
+    setpoints = []
+    now = start_us
+    target = 0
+    for _ in range(until_ms * 1000 // step_us):
+        target = player.sample(now, rpm(target))
+        setpoints.append(target)
+        now = ticks_add(now, step_us)
+    return setpoints, now
+
+
+@pytest.mark.parametrize("start_us", [0, TICKS_PERIOD - 1500000])
+def test_plays_the_trajectory_in_real_time(start_us):
+    recipe = compile_recipe(
+        [{"rpm": 2000, "ramp_time": 1, "hold": 1, "settle": False}, {"rpm": 0, "ramp_time": 0.5}]
+    )
+    player = RecipePlayer(recipe)
+    setpoints, _ = play(player, start_us, 3000)
+    assert setpoints[0] == 0
+    assert setpoints[500] == 1000
+    assert setpoints[1000:2000] == [2000] * 1000
+    assert setpoints[2250] == 1000
+    assert player.done
+    assert setpoints[-1] == 0
+    assert player.in_band_ms == 1000
+
+
+def test_sampling_slower_than_a_millisecond_keeps_the_remainder():
+    recipe = compile_recipe([{"rpm": 1000, "ramp_time": 1, "settle": False}])
+    player = RecipePlayer(recipe)
+    play(player, 0, 600, step_us=1500)
+    assert player.elapsed_ms == 598
+
+
+def test_button_gate_waits_for_release():
+    recipe = compile_recipe(
+        [{"rpm": 1000, "hold": 1, "settle": False, "wait": True}, {"rpm": 0}]
+    )
+    player = RecipePlayer(recipe)
+    setpoints, now = play(player, 0, 3000)
+    assert player.waiting and not player.done
+    assert player.time_left_ms() == 0
+    assert setpoints[-1] == 1000
+    player.release()
+    player.sample(now)
+    assert player.done
+    assert player.sample(ticks_add(now, 1000)) == 0
+
+
+def test_time_left_counts_down_the_step():
+    recipe = compile_recipe(
+        [{"rpm": 1000, "ramp_time": 1, "hold": 2, "settle": False}, {"rpm": 0, "hold": 1}]
+    )
+    player = RecipePlayer(recipe)
+    play(player, 0, 1500)
+    assert player.step == 0
+    assert player.time_left_ms() == 1501
+    play(player, 1500000, 1600)
+    assert player.step == 1
+
+
+def test_hold_starts_once_the_rpm_has_settled():
+    recipe = compile_recipe([{"rpm": 2000, "hold": 1}, {"rpm": 0}])
+    player = RecipePlayer(recipe, tolerance=0.02, samples=50)
+
+    def motor(target):
+        # reaches the band 300 ms in, and wobbles out of it once during the hold
+        motor.ms += 1
+        if motor.ms == 800:
+            return 1900
+        return 2000 if motor.ms > 300 else 1000
+
+    motor.ms = 0
+    setpoints, now = play(player, 0, 1300, motor)
+    assert not player.done
+    assert player.settle_ms[0] == 349
+    assert player.settle_timeouts == 0
+    play(player, now, 100, motor)
+    assert player.done
+    assert (player.in_band_ms, player.out_of_band_ms) == (998, 1)
+
+
+def test_settle_timeout_starts_the_hold_anyway():
+    recipe = compile_recipe([{"rpm": 9000, "hold": 1}, {"rpm": 0}])
+    player = RecipePlayer(recipe, timeout_ms=2000)
+    play(player, 0, 3100, lambda target: 7000)
+    assert player.done
+    assert player.settle_timeouts == 1
+    assert player.settle_ms[0] == 2000
+    assert player.out_of_band_ms == 999
+
+
+def test_without_a_timeout_settling_waits():
+    recipe = compile_recipe([{"rpm": 9000, "hold": 1}])
+    player = RecipePlayer(recipe)
+    play(player, 0, 20000, lambda target: 7000)
+    assert player.settling and not player.done
+    assert player.settle_timeouts == 0
@@ -0,0 +1,245 @@
+import collections
+import os
+import random
+
+import pytest
+
+import rotary_irq_esp
+from host import FakeClock, TICKS_PERIOD
+from machine import mem8
+from rotary import Rotary, _bound, _wrap
+from rotary_irq_esp import RotaryIRQ
+
+# the pin levels (CLK, DT) after each edge of one detent, starting from both high
+CW = ((1, 0), (0, 0), (0, 1), (1, 1))
+CCW = ((0, 1), (0, 0), (1, 0), (1, 1))
+
+_S, _CW1, _CW2, _CW3, _CCW1, _CCW2, _CCW3 = range(7)
+
+# the decoder tables as they were before they were flattened
+REFERENCE_TABLE = [
+    [_S, _CCW1, _CW1, _S],
+    [_CW2, _S, _CW1, _S],
+    [_CW2, _CW3, _CW1, _S],
+    [_CW2, _CW3, _S, _S | 0x10],
+    [_CCW2, _CCW1, _S, _S],
+    [_CCW2, _CCW1, _CCW3, _S],
+    [_CCW2, _S, _CCW3, _S | 0x20],
+    [_S, _S, _S, _S],
+]
+REFERENCE_TABLE_HALF_STEP = [
+    [_CW3, _CW2, _CW1, _S],
+    [_CW3 | 0x20, _S, _CW1, _S],
+    [_CW3 | 0x10, _CW2, _S, _S],
+    [_CW3, _CCW2, _CCW1, _S],
+    [_CW3, _CW2, _CCW1, _S | 0x10],
+    [_CW3, _CCW2, _CW3, _S | 0x20],
+    [_S, _S, _S, _S],
+    [_S, _S, _S, _S],
+]
+
+
+class ReferenceRotary:
+    """The decoder of _process_rotary_pins as it was before the tables were flattened."""
+
+    def __init__(self, min_val=0, max_val=10, reverse=False,
+                 range_mode=Rotary.RANGE_UNBOUNDED, half_step=False, invert=False):
+        self.min_val = min_val
+        self.max_val = max_val
+        self.reverse = -1 if reverse else 1
+        self.range_mode = range_mode
+        self.half_step = half_step
+        self.invert = invert
+        self.value = min_val
+        self.state = _S
+
+    def process(self, clk, dt):
+        clk_dt_pins = (clk << 1) | dt
+        if self.invert:
+            clk_dt_pins = ~clk_dt_pins & 0x03
+        if self.half_step:
+            self.state = REFERENCE_TABLE_HALF_STEP[self.state & 0x07][clk_dt_pins]
+        else:
+            self.state = REFERENCE_TABLE[self.state & 0x07][clk_dt_pins]
+        direction = self.state & 0x30
+        incr = 0
+        if direction == 0x10:
+            incr = 1
+        elif direction == 0x20:
+            incr = -1
+        incr *= self.reverse
+        if self.range_mode == Rotary.RANGE_WRAP:
+            self.value = _wrap(self.value, incr, self.min_val, self.max_val)
+        elif self.range_mode == Rotary.RANGE_BOUNDED:
+            self.value = _bound(self.value, incr, self.min_val, self.max_val)
+        else:
+            self.value = self.value + incr
+        return self.value
+
+
+def recorded_edges(detents, seed=1, bounce=0.3, interval_us=20000):
+    """
+    Edges of a knob turned back and forth, as (ticks_us, clk, dt) after each edge.
+
+    A share of the edges bounces: the pin goes back and forth again before it settles, as with
+    worn contacts.
+    """
+    rng = random.Random(seed)
+    edges = []
+    now = 0
+    for i in range(detents):
+        steps = CW if (i // 7) % 3 else CCW
+        now += rng.randrange(interval_us // 2, interval_us * 2)
+        levels = (1, 1)
+        for j, step in enumerate(steps):
+            if rng.random() < bounce:
+                edges.append((now, step[0], step[1]))
+                edges.append((now + 50, levels[0], levels[1]))
+                now += 100
+            edges.append((now, step[0], step[1]))
+            levels = step
+            now += interval_us // 8
+    return edges
+
+
+def turn(steps, detents, interval_us, start_us=0):
+    """Edges of detents turned at a steady rate, each completing interval_us after the last."""
+    edges = []
+    for i in range(detents):
+        end = start_us + (i + 1) * interval_us
+        for j, (clk, dt) in enumerate(steps):
+            edges.append((end - (len(steps) - 1 - j) * interval_us // 8, clk, dt))
+    return edges
+
+
+def make_rotary(**kwargs):
+    return RotaryIRQ(12, 13, **kwargs)
+
+
+def replay(rotary, edges, clock=None):
+    """
+    Feed the edges to the interrupt handler like the pins would, returning the values.
+
+    With a FakeClock the clock is moved to the time of each edge first, counted from where the
+    clock stood when the replay started.
+    """
+    clk = rotary._pin_clk
+    dt = rotary._pin_dt
+    start = clock.us if clock else 0
+    values = []
+    for t, clk_level, dt_level in edges:
+        if clock:
+            clock.us = (start + t) % TICKS_PERIOD
+        changed = clk if clk_level != clk.level else dt
+        clk.level = clk_level
+        dt.level = dt_level
+        if rotary._in_addr:
+            mem8[rotary._in_addr] = (clk_level << 4) | (dt_level << 5)
+        changed.handler(changed)
+        values.append(rotary.value())
+    return values
+
+
+def replay_reference(reference, edges):
+    return [reference.process(clk, dt) for _, clk, dt in edges]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"half_step": True},
+        {"invert": True},
+        {"reverse": True},
+        {"range_mode": Rotary.RANGE_WRAP, "min_val": 0, "max_val": 9},
+        {"range_mode": Rotary.RANGE_BOUNDED, "min_val": -3, "max_val": 5},
+        {"half_step": True, "range_mode": Rotary.RANGE_BOUNDED, "max_val": 20},
+    ],
+)
+@pytest.mark.parametrize("native", [False, True])
+def test_replay_matches_reference(options, native):
+    edges = recorded_edges(300)
+    values = replay(make_rotary(native=native, **options), edges)
+    assert values == replay_reference(ReferenceRotary(**options), edges)
+
+
+Uname = collections.namedtuple("Uname", "sysname nodename release version machine")
+
+
+def fake_uname(machine):
+    return lambda: Uname("esp32", "esp32", "1.22.0", "v1.22.0", machine)
+
+
+def test_fused_read_on_the_original_esp32(monkeypatch):
+    monkeypatch.setattr(rotary_irq_esp, "platform", "esp32")
+    monkeypatch.setattr(os, "uname", fake_uname("Generic ESP32 module with ESP32"))
+    rotary = make_rotary(fused_read=True)
+    assert rotary._in_addr == 0x3FF4403C + 1
+    edges = recorded_edges(100)
+    assert replay(rotary, edges) == replay_reference(ReferenceRotary(), edges)
+
+
+@pytest.mark.parametrize("machine", ["ESP32S3 module with ESP32S3", "ESP32C3 module with ESP32C3"])
+def test_fused_read_falls_back_on_other_chips(monkeypatch, machine):
+    monkeypatch.setattr(rotary_irq_esp, "platform", "esp32")
+    monkeypatch.setattr(os, "uname", fake_uname(machine))
+    rotary = make_rotary(fused_read=True)
+    assert rotary._in_addr == 0
+    edges = recorded_edges(100)
+    assert replay(rotary, edges) == replay_reference(ReferenceRotary(), edges)
+
+
+def test_fused_read_falls_back_for_pins_in_different_bytes(monkeypatch):
+    monkeypatch.setattr(rotary_irq_esp, "platform", "esp32")
+    monkeypatch.setattr(os, "uname", fake_uname("Generic ESP32 module with ESP32"))
+    assert RotaryIRQ(7, 8, fused_read=True)._in_addr == 0
+
+
+ACCEL = ((20000, 10), (50000, 4), (100000, 2))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return FakeClock(1000).install(monkeypatch)
+
+
+def test_accel_steps_by_detent_rate(clock):
+    rotary = make_rotary(range_mode=Rotary.RANGE_BOUNDED, max_val=1000)
+    rotary.set(value=0, accel=ACCEL)
+    for interval, step in ((200000, 1), (80000, 2), (30000, 4), (10000, 10)):
+        before = rotary.value()
+        # the first detent of each burst follows a long pause
+        clock.advance(500000)
+        replay(rotary, turn(CW, 5, interval), clock)
+        assert rotary.value() - before == 1 + 4 * step
+
+
+def test_accel_resets_on_change_of_direction(clock):
+    rotary = make_rotary(range_mode=Rotary.RANGE_BOUNDED, min_val=-1000, max_val=1000)
+    rotary.set(value=0, accel=ACCEL)
+    values = replay(rotary, turn(CW, 3, 10000) + turn(CCW, 3, 10000, 30000), clock)
+    # the value after the last edge of each detent
+    assert values[3::4] == [1, 11, 21, 20, 10, 0]
+
+
+def test_accel_is_clamped_by_the_range(clock):
+    rotary = make_rotary(range_mode=Rotary.RANGE_BOUNDED, max_val=25)
+    rotary.set(value=0, accel=ACCEL)
+    replay(rotary, turn(CW, 5, 10000), clock)
+    assert rotary.value() == 25
+
+
+def test_accel_across_ticks_wraparound(monkeypatch):
+    clock = FakeClock(TICKS_PERIOD - 25000).install(monkeypatch)
+    rotary = make_rotary(range_mode=Rotary.RANGE_UNBOUNDED)
+    rotary.set(value=0, accel=ACCEL)
+    replay(rotary, turn(CW, 5, 10000), clock)
+    assert rotary.value() == 1 + 4 * 10
+
+
+def test_without_accel_every_detent_is_one_step(clock):
+    edges = turn(CW, 20, 5000)
+    rotary = make_rotary()
+    rotary.set(value=0, accel=ACCEL)
+    rotary.set(accel=())
+    assert replay(rotary, edges, clock) == replay_reference(ReferenceRotary(), edges)
@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+import uasyncio
+
+from host import FakeClock
+from machine import I2C, SPI, Pin
+from ssd1306 import SSD1306_I2C, SSD1306_SPI
+
+FRAME_BYTES = 128 * 64 // 8
+
+
+def make_display():
+    i2c = I2C()
+    display = SSD1306_I2C(128, 64, i2c)
+    i2c.reset()
+    return i2c, display
+
+
+def data_bytes(i2c):
+    # payload of data transactions, without their control byte
+    return sum(len(data) - 1 for _, data in i2c.transactions if data[0] == 0x40)
+
+
+def test_unchanged_frame_sends_nothing():
+    i2c, display = make_display()
+    display.show()
+    assert i2c.transactions == []
+    assert display.bytes_sent == 0
+
+
+def test_only_changed_span_is_sent():
+    i2c, display = make_display()
+    display.fill_rect(40, 20, 24, 16, 1)  # e.g. a few RPM digits, on pages 2 to 4
+    display.show()
+    assert display.bytes_sent == 3 * 24
+    assert data_bytes(i2c) == 3 * 24
+    i2c.reset()
+    display.fill_rect(56, 20, 8, 8, 0)  # one digit changes
+    display.show()
+    assert display.bytes_sent == 2 * 8
+    assert data_bytes(i2c) == 2 * 8
+
+
+def test_full_refresh_sends_whole_frame():
+    i2c, display = make_display()
+    display.show(full=True)
+    assert data_bytes(i2c) == FRAME_BYTES
+
+
+def display_ram(transactions, ram=None):
+    # replay the windows and data on a model of the display RAM
+    ram = bytearray(FRAME_BYTES) if ram is None else ram
+    col0 = col1 = page0 = page1 = 0
+    for _, data in transactions:
+        if data[0] == 0x00 and data[1] == 0x21:
+            col0, col1, page0, page1 = data[2], data[3], data[5], data[6]
+        elif data[0] == 0x40:
+            # horizontal addressing fills the window a page at a time
+            width = col1 - col0 + 1
+            assert len(data) - 1 == width * (page1 - page0 + 1)
+            for page in range(page0, page1 + 1):
+                start = page * 128 + col0
+                offset = 1 + (page - page0) * width
+                ram[start : start + width] = data[offset : offset + width]
+    return ram
+
+
+def test_sent_frame_matches_buffer():
+    i2c, display = make_display()
+    for i in range(5):
+        display.text("RPM {}".format(1000 * i), 8 * i, 10 * i, 1)
+        display.show()
+    assert display_ram(i2c.transactions) == display.buffer
+
+
+def test_commands_are_batched():
+    i2c = I2C()
+    display = SSD1306_I2C(128, 64, i2c)
+    # the whole init sequence in one transaction, then the first full frame
+    assert len(i2c.transactions) == 3
+    assert i2c.transactions[0][1][0] == 0x00
+    assert len(i2c.transactions[0][1]) == 1 + 27
+    i2c.reset()
+    display.rotate(True)
+    display.contrast(128)
+    assert [data for _, data in i2c.transactions] == [b"\x00\xc8\xa1", b"\x00\x81\x80"]
+    i2c.reset()
+    display.pixel(0, 0, 1)
+    display.show()
+    assert len(i2c.transactions) == 2  # window, then data
+
+
+def test_spi_sends_command_sequences_in_one_burst():
+    dc, res, cs = Pin(), Pin(), Pin()
+    spi = SPI(watch=(cs, dc))
+    display = SSD1306_SPI(128, 64, spi, dc, res, cs)
+    # init sequence, window and frame data, each a single CS-framed write
+    assert [(len(data), levels) for data, levels in spi.writes] == [
+        (27, (0, 0)),
+        (6, (0, 0)),
+        (FRAME_BYTES, (0, 1)),
+    ]
+    spi.writes.clear()
+    display.rotate(False)
+    assert spi.writes == [(b"\xc0\xa0", (0, 0))]
+    assert cs.value() == 1
+
+
+class TimedI2C(I2C):
+    """Advances a FakeClock by the wire time of each transaction, at 400 kHz."""
+
+    def __init__(self, clock, wire_byte_us=25):
+        super().__init__()
+        self.clock = clock
+        self.wire_byte_us = wire_byte_us
+
+    def writevto(self, addr, vector, stop=True):
+        super().writevto(addr, vector, stop)
+        self.clock.advance(len(self.transactions[-1][1]) * self.wire_byte_us)
+        return 1
+
+
+def record_steps(display, monkeypatch, **kwargs):
+    """Run show_async(), returning the transactions sent in each step between yields."""
+    i2c = display.i2c
+    i2c.reset()
+    marks = [0]
+
+    async def sleep_ms(ms):
+        marks.append(len(i2c.transactions))
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(uasyncio, "sleep_ms", sleep_ms)
+    uasyncio.run(display.show_async(**kwargs))
+    marks.append(len(i2c.transactions))
+    return [i2c.transactions[a:b] for a, b in zip(marks, marks[1:])]
+
+
+def draw_frame(display):
+    for i in range(5):
+        display.text("RPM {}".format(1000 * i), 8 * i, 10 * i, 1)
+    display.fill_rect(0, 56, 128, 8, 1)
+
+
+def test_show_async_sends_one_page_per_step(monkeypatch):
+    clock = FakeClock().install(monkeypatch)
+    i2c = TimedI2C(clock)
+    display = SSD1306_I2C(128, 64, i2c)
+    draw_frame(display)
+    steps = record_steps(display, monkeypatch)
+    # a window and the data of one changed span, or nothing for an unchanged page
+    assert len(steps) == display.pages == display.steps
+    for step in steps:
+        assert len(step) in (0, 2)
+        if step:
+            assert step[0][1][1] == 0x21 and step[1][1][0] == 0x40
+    # the step durations are the wire time of what each step sent
+    for i, step in enumerate(steps):
+        assert display.step_us[i] == 25 * sum(len(data) for _, data in step)
+
+    # the display ends up showing the same frame as show() would have sent
+    twin_i2c = I2C()
+    twin = SSD1306_I2C(128, 64, twin_i2c)
+    draw_frame(twin)
+    twin.show()
+    assert display_ram(i2c.transactions) == display_ram(twin_i2c.transactions) == twin.buffer
+
+
+@pytest.mark.parametrize("budget_us, steps", [(1000, 8), (5000, 4)])
+def test_show_async_yields_once_a_step_takes_the_budget(monkeypatch, budget_us, steps):
+    clock = FakeClock().install(monkeypatch)
+    i2c = TimedI2C(clock)
+    display = SSD1306_I2C(128, 64, i2c)
+    display.fill(1)
+    sent = record_steps(display, monkeypatch, budget_us=budget_us)
+    page_us = 25 * (1 + 6 + 1 + 128)  # window and data, each with its control byte
+    assert len(sent) == display.steps == steps
+    for i, step in enumerate(sent):
+        us = display.step_us[i]
+        assert us == 25 * sum(len(data) for _, data in step)
+        # a step stops at the first page that reaches the budget
+        assert us < budget_us + page_us
+        if i < steps - 1:
+            assert us >= budget_us
+    assert display_ram(i2c.transactions) == display.buffer
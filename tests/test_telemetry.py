@@ -0,0 +1,106 @@
+import random
+
+from host import FakeClock
+from machine import UART
+from telemetry import KissTelemetry, _CRC8
+
+
+def frame(temperature=40, voltage=1200, current=150, consumption=20, erpm=21000):
+    payload = bytes(
+        (
+            temperature,
+            voltage >> 8,
+            voltage & 0xFF,
+            current >> 8,
+            current & 0xFF,
+            consumption >> 8,
+            consumption & 0xFF,
+            erpm // 100 >> 8,
+            erpm // 100 & 0xFF,
+        )
+    )
+    crc = 0
+    for byte in payload:
+        crc = _CRC8[crc ^ byte]
+    return payload + bytes((crc,))
+
+
+def make_telemetry(**kwargs):
+    uart = UART(1)
+    return uart, KissTelemetry(uart, **kwargs)
+
+
+def test_decodes_frame():
+    uart, telemetry = make_telemetry()
+    uart.feed(frame())
+    assert telemetry.poll()
+    assert telemetry.temperature == 40
+    assert telemetry.voltage == 1200
+    assert telemetry.current == 150
+    assert telemetry.consumption == 20
+    assert telemetry.erpm == 21000
+    assert telemetry.rpm == 3000
+    assert telemetry.frames == 1
+    assert not telemetry.poll()
+
+
+def test_resyncs_after_noise():
+    uart, telemetry = make_telemetry()
+    uart.feed(b"\x55\xaa\x13" + frame(erpm=7000) + frame()[:6] + frame(erpm=14000))
+    assert telemetry.poll()
+    assert telemetry.frames == 2
+    assert telemetry.rpm == 2000
+    assert telemetry.corrupt == 1
+    assert telemetry.dropped == 1
+
+
+def test_rejects_all_zero_frames():
+    uart, telemetry = make_telemetry()
+    uart.feed(bytes(40))
+    assert not telemetry.poll()
+    assert telemetry.frames == 0
+    uart.feed(bytes(10) + frame())
+    assert telemetry.poll()
+    assert telemetry.frames == 1
+    assert telemetry.rpm == 3000
+
+
+def test_random_stream_counts():
+    random.seed(1)
+    uart, telemetry = make_telemetry()
+    sent = 0
+    for _ in range(200):
+        if random.random() < 0.1:
+            uart.feed(bytes(random.randrange(256) for _ in range(random.randrange(1, 12))))
+        uart.feed(frame(erpm=100 * random.randrange(1, 600)))
+        sent += 1
+        telemetry.poll()
+    # noise can at worst take the frame after it down with it
+    assert sent - 25 <= telemetry.frames + telemetry.dropped <= sent
+
+
+def test_requests_wait_for_reply_or_timeout(monkeypatch):
+    clock = FakeClock(1000).install(monkeypatch)
+    uart, telemetry = make_telemetry()
+    assert telemetry.request(clock.us)
+    clock.advance(200)
+    assert not telemetry.request(clock.us)
+    clock.advance(800)
+    uart.feed(frame())
+    assert telemetry.poll(clock.us)
+    assert telemetry.timestamp_us == 1000  # sampled when the request went out
+    assert telemetry.latency_us == 1000
+    assert telemetry.request(clock.us)
+    clock.advance(4 * telemetry.frame_us)
+    assert telemetry.request(clock.us)
+    assert telemetry.requests == 3
+    assert telemetry.timeouts == 1
+
+
+def test_unscheduled_requests_every_time(monkeypatch):
+    clock = FakeClock(5000).install(monkeypatch)
+    uart, telemetry = make_telemetry(scheduled=False)
+    assert all(telemetry.request(clock.us) for _ in range(10))
+    uart.feed(frame())
+    assert telemetry.poll(clock.us)
+    assert telemetry.timestamp_us == 5000 - telemetry.frame_us
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import uasyncio
+
+from control import ControlLoop
+from events import EventQueue
+from machine import I2C
+from ssd1306 import SSD1306_I2C
+
+BYTE_US = 25  # I2C at 400 kHz, 9 clocks per byte plus overhead
+PERIOD_US = 2000
+
+
+def test_event_queue_put_from_two_threads(monkeypatch):
+    # the control thread gets to run in the middle of a put() from the button IRQ
+    events = EventQueue()
+    ticks_us = time.ticks_us
+    other = threading.Thread(target=events.put, args=(2,))
+
+    def preempted_ticks_us():
+        if not other.is_alive() and other.ident is None:
+            other.start()
+            other.join(0.1)
+        return ticks_us()
+
+    monkeypatch.setattr(time, "ticks_us", preempted_ticks_us)
+    events.put(1)
+    other.join()
+    assert (events._head - events._tail) % events._size == 2
+
+    async def drain():
+        return [await events.get() for _ in range(2)]
+
+    assert sorted(uasyncio.run(drain())) == [1, 2]
+
+
+def display_frames(display, frames):
+    # what update_display does, with every frame fully changed
+    async def run():
+        for i in range(frames):
+            display.fill(i & 1)
+            display.show()
+            await uasyncio.sleep_ms(0)
+
+    return run()
+
+
+def make_display():
+    return SSD1306_I2C(128, 64, I2C(byte_us=BYTE_US))
+
+
+def test_control_thread_does_not_wait_for_display():
+    display = make_display()
+    loop = ControlLoop(rate=1000000 // PERIOD_US)
+    running = True
+
+    def control_thread():
+        while running:
+            loop.wait_sync()
+
+    thread = threading.Thread(target=control_thread)
+    thread.start()
+    uasyncio.run(display_frames(display, 10))
+    running = False
+    thread.join()
+
+    frame_us = 1025 * BYTE_US
+    assert loop.steps > 10 * frame_us // PERIOD_US // 2
+    assert loop.max_period_us < frame_us // 2
+
+
+def test_control_task_waits_for_display():
+    display = make_display()
+    loop = ControlLoop(rate=1000000 // PERIOD_US)
+    running = True
+
+    async def control_task():
+        while running:
+            await loop.wait()
+
+    async def run():
+        nonlocal running
+        task = uasyncio.create_task(control_task())
+        await display_frames(display, 10)
+        running = False
+        await task
+
+    uasyncio.run(run())
+    # on the same event loop every display transfer stalls the control loop
+    assert loop.max_period_us > 1025 * BYTE_US * 9 // 10
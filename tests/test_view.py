@@ -0,0 +1,50 @@
+import framebuf
+from numfield import NumberField
+from view import View
+
+field = NumberField(40, 20, 5)
+
+
+def draw_static(fb):
+    fb.fill_rect(0, 0, 127, 14, 1)
+    fb.text("RPM:", 0, 20, 1)
+
+
+def draw_dynamic(fb, state, rotary):
+    field.draw(fb, state["rpm"])
+
+
+def make_fb():
+    buffer = bytearray(128 * 64 // 8)
+    return buffer, framebuf.FrameBuffer(buffer, 128, 64, framebuf.MONO_VLSB)
+
+
+def test_static_layer_is_rendered_once_and_shared():
+    calls = []
+
+    def draw(fb):
+        calls.append(fb)
+        draw_static(fb)
+
+    first = View(draw, draw_dynamic)
+    second = View(draw, lambda fb, state, rotary: None)
+    assert first.background() is second.background()
+    assert len(calls) == 1
+
+
+def test_partial_render_only_touches_fields():
+    buffer, fb = make_fb()
+    view = View(draw_static, draw_dynamic)
+    view.render(fb, {"rpm": 100}, None, full=True)
+    before = bytes(buffer)
+    view.render(fb, {"rpm": 250}, None)
+    page = 20 // 8
+    for i, (a, b) in enumerate(zip(before, buffer)):
+        inside = i % 128 in range(field.x, field.x + field.width) and i // 128 in (page, page + 1)
+        assert a == b or inside
+
+    # the same frame as drawing everything from scratch
+    expected, fb = make_fb()
+    draw_static(fb)
+    draw_dynamic(fb, {"rpm": 250}, None)
+    assert buffer == expected
@@ -0,0 +1,119 @@
+import pytest
+
+from control import EVENT_FAULT
+from test_control import MotorRig
+from test_pid import GAINS
+from test_telemetry import frame, make_telemetry
+from watchdog import FAULT_RPM, FAULT_TELEMETRY, FAULT_TEMPERATURE, FAULT_VOLTAGE, Watchdog
+
+
+class Telemetry:
+    """The KissTelemetry fields the watchdog reads."""
+
+    def __init__(self):
+        self.frames = 0
+        self.temperature = 40
+        self.voltage = 1200
+
+
+def ramp(ms):
+    # up to 6000 RPM at 2000 RPM/s, hold, then a step down
+    if ms < 3000:
+        return 1000 + 5000 * ms // 3000
+    if ms < 6000:
+        return 6000
+    return 1000
+
+
+# the gains in config.json follow the ramp far outside the band, but the RPM keeps moving
+@pytest.mark.parametrize("gains", [GAINS, {"Kp": 1e-5, "Ki": 1e-4, "Kd": 0}])
+def test_healthy_run_does_not_trip(gains):
+    rig = MotorRig(gains=gains)
+    assert rig.run(ramp, 9000) == (None, 0)
+
+
+@pytest.mark.parametrize("jam_ms", [1500, 3500])
+def test_jam_trips_within_the_divergence_time(jam_ms):
+    # while ramping the setpoint moves on every step, which must not keep restarting the timer
+    rig = MotorRig(Watchdog(diverge_ms=2000))
+    assert rig.run(ramp, jam_ms) == (None, 0)
+    rig.jammed = True
+    trip_ms, faults = rig.run(ramp, 9000)
+    assert faults == FAULT_RPM
+    assert trip_ms - jam_ms <= 2000 + 100
+
+
+def test_setpoint_step_restarts_the_divergence_timer():
+    watchdog = Watchdog(diverge_ms=100)
+    telemetry = Telemetry()
+    for ms in range(200):
+        telemetry.frames += 1
+        # a 1000 RPM step every 80 ms with the motor getting no closer
+        assert not watchdog.check(ms * 1000, telemetry, 2000 + 1000 * (ms // 80), 0, 0.5)
+    for ms in range(200, 400):
+        telemetry.frames += 1
+        # a slow ramp does not restart it
+        if watchdog.check(ms * 1000, telemetry, 2000 + ms, 0, 0.5):
+            break
+    assert watchdog.faults == FAULT_RPM
+    assert ms < 240 + 100 + 2
+
+
+def test_lost_telemetry_trips_after_the_timeout():
+    rig = MotorRig(Watchdog(timeout_ms=50))
+    rig.run(ramp, 4000)
+    rig.telemetry.lost = True
+    trip_ms, faults = rig.run(ramp, 9000)
+    assert faults == FAULT_TELEMETRY
+    # counted from the last frame, which came up to a frame before
+    assert 50 - rig.plant.frame_ms < trip_ms - 4000 <= 50 + 1
+
+
+@pytest.mark.parametrize(
+    "field, value, fault",
+    [("temperature", 95, FAULT_TEMPERATURE), ("voltage", 1000, FAULT_VOLTAGE)],
+)
+def test_limits_trip_after_the_filter_time(field, value, fault):
+    rig = MotorRig(Watchdog(min_voltage=1100, filter_ms=10))
+    rig.run(ramp, 4000)
+    setattr(rig.telemetry, field, value)
+    trip_ms, faults = rig.run(ramp, 9000)
+    assert faults == fault
+    # the next frame brings the value, then it has to hold for the filter time
+    assert 10 <= trip_ms - 4000 <= rig.plant.frame_ms + 10 + 1
+
+
+def test_boot_without_frames_does_not_check_the_limits():
+    # KissTelemetry holds zeros until the first frame, which would read as a low voltage
+    uart, telemetry = make_telemetry()
+    watchdog = Watchdog(min_voltage=1100, filter_ms=10, boot_timeout_ms=3000)
+    for ms in range(3000):
+        assert not watchdog.check(ms * 1000, telemetry, 0, 0, 0)
+    uart.feed(frame(voltage=1200))
+    telemetry.poll()
+    for ms in range(3000, 9000):
+        assert not watchdog.check(ms * 1000, telemetry, 0, 0, 0)
+
+
+def test_missing_esc_trips_after_the_boot_timeout():
+    _, telemetry = make_telemetry()
+    watchdog = Watchdog(min_voltage=1100, boot_timeout_ms=3000)
+    for ms in range(4000):
+        if watchdog.check(ms * 1000, telemetry, 0, 0, 0):
+            break
+    assert watchdog.faults == FAULT_TELEMETRY
+    assert ms == 3001
+
+
+def test_fault_cuts_the_throttle_until_cleared():
+    rig = MotorRig()
+    rig.run(ramp, 4000)
+    rig.telemetry.temperature = 95
+    rig.run(ramp, 9000)
+    assert rig.dshot.throttle == 0
+    assert rig.watchdog.trips == 1
+    assert rig.events == [EVENT_FAULT]
+    rig.telemetry.temperature = 40
+    rig.watchdog.clear()
+    rig.step(0)
+    assert rig.motor.faults == 0